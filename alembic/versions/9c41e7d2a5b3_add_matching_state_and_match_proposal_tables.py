@@ -0,0 +1,42 @@
+"""add matching state and match proposal tables
+
+Revision ID: 9c41e7d2a5b3
+Revises: 48d198d20ccf
+Create Date: 2026-10-18 10:12:44.318905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41e7d2a5b3'
+down_revision: Union[str, Sequence[str], None] = '48d198d20ccf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('matching_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO matching_state (id, data_version) VALUES (1, 0);")
+    op.create_table('match_proposal',
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('data_version', sa.BigInteger(), nullable=False),
+    sa.Column('proposals', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('match_proposal')
+    op.drop_table('matching_state')
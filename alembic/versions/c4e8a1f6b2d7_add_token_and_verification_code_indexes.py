@@ -0,0 +1,39 @@
+"""add token and verification code indexes
+
+Revision ID: c4e8a1f6b2d7
+Revises: 3f7b2c9e1d04
+Create Date: 2026-10-18 16:42:37.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f6b2d7'
+down_revision: Union[str, Sequence[str], None] = '3f7b2c9e1d04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_token_user_id', 'token', ['user_id']),
+    ('ix_token_expires_at', 'token', ['expires_at']),
+    ('ix_verification_code_expires_at', 'verification_code', ['expires_at']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The token table may be large by now: build without blocking logins, which
+    # CREATE INDEX CONCURRENTLY only does outside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,28 @@
+"""add updated_at to matching job
+
+Revision ID: e2b6d9a4c7f1
+Revises: c4e8a1f6b2d7
+Create Date: 2026-10-18 19:12:08.530417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b6d9a4c7f1'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1f6b2d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('matching_job', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('matching_job', 'updated_at')
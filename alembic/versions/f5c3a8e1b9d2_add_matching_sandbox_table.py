@@ -0,0 +1,40 @@
+"""add matching sandbox table
+
+Revision ID: f5c3a8e1b9d2
+Revises: e2b6d9a4c7f1
+Create Date: 2026-10-18 19:48:51.204733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c3a8e1b9d2'
+down_revision: Union[str, Sequence[str], None] = 'e2b6d9a4c7f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('matching_sandbox',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('owner_id', sa.UUID(), nullable=False),
+    sa.Column('inputs', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_matching_sandbox_owner_id', 'matching_sandbox', ['owner_id'])
+    op.create_index('ix_matching_sandbox_expires_at', 'matching_sandbox', ['expires_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_matching_sandbox_expires_at', table_name='matching_sandbox')
+    op.drop_index('ix_matching_sandbox_owner_id', table_name='matching_sandbox')
+    op.drop_table('matching_sandbox')
@@ -0,0 +1,201 @@
+"""
+Benchmarks for the matching engine on synthetic cohorts. Runs offline: no database,
+no settings, only the matching modules.
+
+    python -m benchmarks.bench_matching                      # 1k and 10k, compared to baselines
+    python -m benchmarks.bench_matching --sizes 1k,5k,10k,100k
+    python -m benchmarks.bench_matching --save               # record new baselines
+    python -m benchmarks.bench_matching --check              # exit 1 on a regression
+    python -m benchmarks.bench_matching --sizes 5k --departments 1   # one big department
+
+Each case reports the best wall time over --repeat runs, the peak Python memory of
+a separate traced run (tracemalloc slows the code down, so it is never timed), and
+pairs/s: the intern x supervisor pairs of the same department, i.e. the work a
+brute-force matcher would do, divided by the wall time.
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+from src.matching import IdfWeights, SkillIndex, matcher, partition_by_department, run_matching, top_supervisors
+from src.matching_assignment import DEFAULT_TOP_K
+
+from .synthetic import SIZES, CohortSpec, SyntheticCohort
+
+BASELINES = Path(__file__).with_name("baselines.json")
+CAPACITY = 12  # interns per supervisor for the assignment strategy, ~20% spare room
+
+
+@dataclass
+class CaseResult:
+    case: str
+    interns: int
+    supervisors: int
+    pairs: int
+    seconds: float
+    peak_mb: float
+    pairs_per_second: float
+
+
+def _candidates(partitions: dict, method: str) -> None:
+    """The top_k candidate edges the assignment and stable strategies start from."""
+    for supervisors, interns in partitions.values():
+        if not supervisors:
+            continue
+        index = SkillIndex(supervisors)
+        weights = IdfWeights(supervisors + interns) if method == "idf" else None
+        for intern in interns:
+            top_supervisors(intern, index, method, DEFAULT_TOP_K, weights=weights)
+
+
+def _cases(cohort: SyntheticCohort) -> dict[str, Callable[[], object]]:
+    supervisors, interns = cohort.supervisors, cohort.interns
+    orm_supervisors, orm_interns = cohort.orm_objects()
+    partitions = partition_by_department(supervisors, interns)
+    return {
+        "candidates[jaccard]": lambda: _candidates(partitions, "jaccard"),
+        "candidates[idf]": lambda: _candidates(partitions, "idf"),
+        "run_matching[greedy]": lambda: run_matching(supervisors, interns),
+        "run_matching[greedy,idf]": lambda: run_matching(supervisors, interns, method="idf"),
+        "run_matching[assignment]": lambda: run_matching(
+            supervisors, interns, strategy="assignment", capacity=CAPACITY
+        ),
+        "matcher[greedy]": lambda: matcher(orm_supervisors, orm_interns),
+    }
+
+
+def _best_time(run: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_memory_mb(run: Callable[[], object]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def run_size(size: str, repeat: int, seed: int, departments: int | None = None) -> list[CaseResult]:
+    overrides = {"departments": departments} if departments else {}
+    cohort = SyntheticCohort(CohortSpec.from_size(size, seed=seed, **overrides))
+    label = f"{size}-{departments}dept" if departments else size
+    pairs = cohort.department_pairs()
+    results = []
+    for name, run in _cases(cohort).items():
+        seconds = _best_time(run, repeat)
+        results.append(
+            CaseResult(
+                case=f"{name}@{label}",
+                interns=len(cohort.interns),
+                supervisors=len(cohort.supervisors),
+                pairs=pairs,
+                seconds=seconds,
+                peak_mb=_peak_memory_mb(run),
+                pairs_per_second=pairs / seconds,
+            )
+        )
+    return results
+
+
+def _load_baselines() -> dict:
+    if not BASELINES.exists():
+        return {}
+    return json.loads(BASELINES.read_text())["cases"]
+
+
+def _rounded(result: dict) -> dict:
+    # Keeps baseline diffs readable; the noise between runs is far above these digits
+    return {
+        **result,
+        "seconds": round(result["seconds"], 4),
+        "peak_mb": round(result["peak_mb"], 2),
+        "pairs_per_second": round(result["pairs_per_second"]),
+    }
+
+
+def _save_baselines(results: list[CaseResult]) -> None:
+    cases = _load_baselines()
+    cases.update({result.case: _rounded(asdict(result)) for result in results})
+    BASELINES.write_text(
+        json.dumps(
+            {
+                "machine": f"{platform.processor() or platform.machine()}, Python {platform.python_version()}",
+                "cases": dict(sorted(cases.items())),
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+
+
+def _change(current: float, baseline: float) -> str:
+    return f"{(current / baseline - 1) * 100:+.0f}%"
+
+
+def report(results: list[CaseResult], baselines: dict, tolerance: float) -> list[str]:
+    """Prints the results next to the baselines, returns the regressed cases."""
+    regressions = []
+    print(f"{'case':<36}{'seconds':>10}{'vs base':>9}{'peak MB':>10}{'vs base':>9}{'pairs/s':>14}")
+    for result in results:
+        baseline = baselines.get(result.case)
+        time_change = memory_change = ""
+        if baseline:
+            time_change = _change(result.seconds, baseline["seconds"])
+            memory_change = _change(result.peak_mb, baseline["peak_mb"])
+            if (
+                result.seconds > baseline["seconds"] * (1 + tolerance)
+                or result.peak_mb > baseline["peak_mb"] * (1 + tolerance)
+            ):
+                regressions.append(result.case)
+        print(
+            f"{result.case:<36}{result.seconds:>10.3f}{time_change:>9}"
+            f"{result.peak_mb:>10.1f}{memory_change:>9}{result.pairs_per_second:>14,.0f}"
+        )
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1k,10k", help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--departments", type=int, help="spread the cohort over fewer departments (default: all)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before --check fails")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--check", action="store_true", help="exit with 1 when a case regressed")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes.split(","):
+        results.extend(run_size(size.strip(), args.repeat, args.seed, args.departments))
+
+    regressions = report(results, _load_baselines(), args.tolerance)
+    if args.save:
+        _save_baselines(results)
+        print(f"Baselines saved to {BASELINES}")
+    if regressions:
+        print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1 if args.check else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Deterministic synthetic cohorts for the matching benchmarks.
+
+Skill popularity follows a Zipf law (a few skills like "python" or "excel" are on
+most profiles, most skills are rare), which is what drives the size of the
+candidate sets the matchers have to score. Everything derives from the seed, so
+the same size and seed always give the same cohort.
+"""
+
+import random
+from dataclasses import dataclass
+from itertools import accumulate
+from uuid import UUID
+
+from src.common import DepartmentEnum
+from src.models.app_models import Intern, Skill, Supervisor, User
+
+SIZES = {"1k": 1_000, "5k": 5_000, "10k": 10_000, "100k": 100_000}
+
+
+@dataclass(frozen=True)
+class CohortSpec:
+    interns: int
+    supervisors_per_intern: float = 0.1
+    departments: int = len(DepartmentEnum)
+    vocabulary: int = 2_000
+    zipf_exponent: float = 1.1
+    min_skills: int = 2
+    max_skills: int = 12
+    seed: int = 42
+
+    @classmethod
+    def from_size(cls, size: str, **overrides) -> "CohortSpec":
+        return cls(interns=SIZES[size], **overrides)
+
+    @property
+    def supervisors(self) -> int:
+        return max(1, round(self.interns * self.supervisors_per_intern))
+
+
+class SyntheticCohort:
+    """Matching input dicts (as produced by `to_matching_details`) for a CohortSpec."""
+
+    def __init__(self, spec: CohortSpec):
+        self.spec = spec
+        self._rng = random.Random(spec.seed)
+        self.skills = [f"skill-{rank}" for rank in range(spec.vocabulary)]
+        self._cum_weights = list(
+            accumulate(1 / rank ** spec.zipf_exponent for rank in range(1, spec.vocabulary + 1))
+        )
+        self.departments = [d.name for d in list(DepartmentEnum)[: spec.departments]]
+        self.supervisors = [self._person("s", i) for i in range(spec.supervisors)]
+        self.interns = [self._person("i", i) for i in range(spec.interns)]
+
+    def _person(self, prefix: str, number: int) -> dict:
+        k = self._rng.randint(self.spec.min_skills, self.spec.max_skills)
+        # Draw with replacement and drop repeats: popular skills collapse, so profiles
+        # end up a little shorter than k, like real ones
+        skills = list(dict.fromkeys(self._rng.choices(self.skills, cum_weights=self._cum_weights, k=k)))
+        person = {
+            "id": f"{prefix}-{number}",
+            "firstname": prefix,
+            "lastname": str(number),
+            "department": self._rng.choice(self.departments),
+            "skills": skills,
+        }
+        if prefix == "s":
+            person["intern_count"] = 0
+        return person
+
+    def department_pairs(self) -> int:
+        """intern x supervisor pairs a brute-force matcher would score."""
+        supervisors_per_dept: dict[str, int] = {}
+        for supervisor in self.supervisors:
+            supervisors_per_dept[supervisor["department"]] = supervisors_per_dept.get(supervisor["department"], 0) + 1
+        return sum(supervisors_per_dept.get(intern["department"], 0) for intern in self.interns)
+
+    def orm_objects(self) -> tuple[list[Supervisor], list[Intern]]:
+        """Transient (never persisted) ORM objects, for timing `matcher` without a database."""
+        skills = {name: Skill(id=UUID(int=rank + 1), name=name) for rank, name in enumerate(self.skills)}
+
+        def user(person: dict) -> User:
+            return User(
+                firstname=person["firstname"],
+                lastname=person["lastname"],
+                department_id=DepartmentEnum[person["department"]].value,
+                skills=[skills[name] for name in person["skills"]],
+            )
+
+        supervisors = [
+            Supervisor(id=UUID(int=number + 1), user=user(person), interns=[])
+            for number, person in enumerate(self.supervisors)
+        ]
+        interns = [
+            Intern(id=UUID(int=(1 << 64) + number), user=user(person))
+            for number, person in enumerate(self.interns)
+        ]
+        return supervisors, interns
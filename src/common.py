@@ -27,5 +27,12 @@ class UserType(StrEnum):
     INTERN = "intern"
     ADMIN = "admin"
 
+
+class JobStatus(StrEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 InternMatchDetail = namedtuple("InternMatchDetail", ["intern_id", "similarity"])
 
@@ -0,0 +1,161 @@
+"""
+Picks Argon2 parameters for this host from measured hashing times.
+
+    python -m src.infra.argon2_calibration --target-ms 250 --max-memory-mib 64 --logins-per-second 20
+
+Memory is what makes Argon2 expensive to attack, so it gets priority: the largest
+memory_cost up to --max-memory-mib whose single pass fits the target, then the
+largest time_cost (passes) that still fits. One hash with `parallelism` lanes keeps
+that many cores busy for its duration, so a --logins-per-second target lowers the
+latency target to what the host's cores can sustain. Unless --parallelism fixes it,
+every lane count from 1 up to the cores (8 at most) is calibrated against its own
+target and the one costing an attacker most (memory x passes) is kept. Prints the
+settings to put in the environment; users still on older parameters get rehashed on
+their next login.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from typing import Callable, NamedTuple
+
+from argon2 import PasswordHasher
+
+from ..settings import settings
+
+_MIN_MEMORY_KIB = 8 * 1024
+_MAX_TIME_COST = 16
+_MAX_PARALLELISM = 8
+
+
+class Argon2Parameters(NamedTuple):
+    time_cost: int
+    memory_cost: int  # KiB
+    parallelism: int
+    seconds: float  # measured per hash
+
+
+def measure_hash_seconds(time_cost: int, memory_cost: int, parallelism: int, samples: int = 3) -> float:
+    """Median time of one hash with these parameters on this host."""
+    hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.hash("calibration password")
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def latency_target(target_seconds: float, parallelism: int, logins_per_second: float | None, cores: int) -> float:
+    """The target, lowered when the login rate would otherwise need more cores than there are."""
+    if not logins_per_second:
+        return target_seconds
+    return min(target_seconds, cores / (logins_per_second * parallelism))
+
+
+def calibrate(
+    target_seconds: float,
+    max_memory_kib: int,
+    parallelism: int,
+    measure: Callable[[int, int, int], float] = measure_hash_seconds,
+    report: Callable[[Argon2Parameters], None] | None = None,
+) -> Argon2Parameters:
+    """The most expensive parameters measured within `target_seconds`, or the cheapest ones tried."""
+    memory_cost = max(max_memory_kib, _MIN_MEMORY_KIB)
+    while True:
+        tried = Argon2Parameters(1, memory_cost, parallelism, measure(1, memory_cost, parallelism))
+        if report:
+            report(tried)
+        if tried.seconds <= target_seconds or memory_cost <= _MIN_MEMORY_KIB:
+            break
+        memory_cost = max(memory_cost // 2, _MIN_MEMORY_KIB)
+
+    best = tried
+    for time_cost in range(2, _MAX_TIME_COST + 1):
+        # Time grows about linearly with the passes: stop before measuring a certain miss
+        if best.seconds * time_cost / best.time_cost > target_seconds * 1.25:
+            break
+        candidate = Argon2Parameters(time_cost, memory_cost, parallelism, measure(time_cost, memory_cost, parallelism))
+        if report:
+            report(candidate)
+        if candidate.seconds > target_seconds:
+            break
+        best = candidate
+    return best
+
+
+def parallelism_candidates(cores: int) -> list[int]:
+    """1, 2, 4, ... up to the cores, and _MAX_PARALLELISM lanes at most."""
+    candidates = [1]
+    while candidates[-1] * 2 <= min(cores, _MAX_PARALLELISM):
+        candidates.append(candidates[-1] * 2)
+    return candidates
+
+
+def calibrate_parallelism(
+    target_seconds: float,
+    max_memory_kib: int,
+    cores: int,
+    logins_per_second: float | None = None,
+    parallelisms: list[int] | None = None,
+    measure: Callable[[int, int, int], float] = measure_hash_seconds,
+    report: Callable[[Argon2Parameters], None] | None = None,
+) -> Argon2Parameters:
+    """
+    `calibrate` for every lane count, each against its own latency target: more lanes
+    finish a hash sooner, but take that many cores from the logins running alongside.
+    The parameters within their target with the most memory x passes win, the fewest
+    lanes on ties; when none fits, the fastest ones tried.
+    """
+    ranked = []
+    for parallelism in parallelisms or parallelism_candidates(cores):
+        target = latency_target(target_seconds, parallelism, logins_per_second, cores)
+        chosen = calibrate(target, max_memory_kib, parallelism, measure, report)
+        fits = chosen.seconds <= target
+        work = chosen.memory_cost * chosen.time_cost if fits else -chosen.seconds
+        ranked.append(((fits, work, -parallelism), chosen))
+    return max(ranked, key=lambda entry: entry[0])[1]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target-ms", type=float, default=250, help="hashing latency to aim for")
+    parser.add_argument("--max-memory-mib", type=int, default=64)
+    parser.add_argument("--parallelism", type=int, help="lanes per hash, measured when left out")
+    parser.add_argument("--logins-per-second", type=float, help="sustained login rate the host must absorb")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    parallelisms = [args.parallelism] if args.parallelism else parallelism_candidates(cores)
+    print(f"Target {args.target_ms:.0f} ms per hash on {cores} cores, lanes tried: {parallelisms}")
+    print(f"{'time_cost':>10}{'memory_mib':>12}{'parallelism':>13}{'ms':>9}")
+
+    def report(parameters: Argon2Parameters) -> None:
+        print(
+            f"{parameters.time_cost:>10}{parameters.memory_cost // 1024:>12}"
+            f"{parameters.parallelism:>13}{parameters.seconds * 1000:>9.1f}"
+        )
+
+    chosen = calibrate_parallelism(
+        args.target_ms / 1000,
+        args.max_memory_mib * 1024,
+        cores,
+        args.logins_per_second,
+        parallelisms,
+        report=report,
+    )
+    target = latency_target(args.target_ms / 1000, chosen.parallelism, args.logins_per_second, cores)
+    if chosen.seconds > target:
+        print("Even the cheapest parameters tried miss the target; using them anyway")
+    current = (settings.ARGON2_TIME_COST, settings.ARGON2_MEMORY_COST, settings.ARGON2_PARALLELISM)
+    print(f"\nCurrent: time_cost={current[0]} memory_cost={current[1]} parallelism={current[2]}")
+    print(f"ARGON2_TIME_COST={chosen.time_cost}")
+    print(f"ARGON2_MEMORY_COST={chosen.memory_cost}")
+    print(f"ARGON2_PARALLELISM={chosen.parallelism}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
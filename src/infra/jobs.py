@@ -0,0 +1,34 @@
+import asyncio
+from typing import Coroutine
+
+from ..logger import logger
+
+
+class JobRunner:
+    """
+    Runs jobs as tasks of this process, no broker needed. CPU-heavy work inside a
+    job still goes to the matching process pool. Tasks are referenced until they
+    finish, and cancelled on shutdown so jobs can record that they were interrupted.
+    """
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, job: Coroutine, name: str | None = None) -> asyncio.Task:
+        task = asyncio.create_task(job, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+        return task
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and (exc := task.exception()) is not None:
+            logger.error(f"Job {task.get_name()} crashed: {exc}")
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+job_runner = JobRunner()
@@ -0,0 +1,57 @@
+"""
+Periodic cleanup of rows nothing reads once expired: revocable tokens,
+verification codes and matching sandboxes. Deletes go in batches, each in its own short transaction, so
+a backlog of expired rows never holds many locks at once or stalls logins.
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from ..db import SessionLocal
+from ..logger import logger
+from ..repositories.matching_sandbox_repo import MatchingSandboxRepository
+from ..repositories.verification_code_repo import VerificationCodeRepository
+from .token import delete_expired_tokens
+
+type DeleteBatch = Callable[[AsyncSession, int], Awaitable[int]]
+
+
+def _purges() -> dict[str, DeleteBatch]:
+    return {
+        "token": delete_expired_tokens,
+        "verification_code": VerificationCodeRepository().delete_expired,
+        "matching_sandbox": MatchingSandboxRepository().delete_expired,
+    }
+
+
+async def purge_expired(
+    batch_size: int,
+    session_factory: async_sessionmaker = SessionLocal,
+    purges: dict[str, DeleteBatch] | None = None,
+) -> dict[str, int]:
+    """Deletes every expired row, `batch_size` at a time. Returns the count per table."""
+    deleted = {}
+    for table, delete_batch in (purges or _purges()).items():
+        deleted[table] = 0
+        while True:
+            async with session_factory() as session, session.begin():
+                count = await delete_batch(session, batch_size)
+            deleted[table] += count
+            if count < batch_size:
+                break
+            await asyncio.sleep(0)  # lets requests in between batches
+    return deleted
+
+
+async def purge_periodically(interval: float, batch_size: int) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            deleted = await purge_expired(batch_size)
+        except Exception as exc:
+            logger.error(f"Purging expired rows failed: {exc}")
+            continue
+        if any(deleted.values()):
+            logger.info(f"Purged expired rows: {deleted}")
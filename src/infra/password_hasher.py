@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+import argon2
+from argon2 import PasswordHasher
+
+from ..logger import logger
+from ..settings import settings
+
+
+class PasswordHashingBusy(Exception):
+    """Too much hashing work queued, or it waited longer than the timeout."""
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class PasswordHashingService:
+    """
+    Runs Argon2 off the event loop, in its own executor of `workers` threads (argon2
+    releases the GIL while hashing), so a burst of logins only delays other logins.
+    At most `queue_limit` calls wait for a thread, more are refused at once, and a call
+    not answered within `timeout` seconds is given up (dropped if still queued). Both
+    surface as PasswordHashingBusy.
+    """
+
+    def __init__(self, hasher: PasswordHasher, workers: int, queue_limit: int, timeout: float):
+        self.hasher = hasher
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted and not finished, running or queued
+        self._running = 0
+        self._peak_queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._waits: deque[float] = deque(maxlen=1024)  # seconds queued, latest calls
+        self._durations: deque[float] = deque(maxlen=1024)  # seconds hashing
+
+    def _timed[T](self, submitted: float, fn: Callable[..., T], *args) -> T:
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._waits.append(started - submitted)
+                self._durations.append(finished - started)
+
+    def _finished(self, _) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def _run[T](self, fn: Callable[..., T], *args) -> T:
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                self._rejected += 1
+                raise PasswordHashingBusy("Password hashing queue is full")
+            self._pending += 1
+            self._peak_queued = max(self._peak_queued, self._pending - self.workers)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+
+        future = self._executor.submit(self._timed, time.perf_counter(), fn, *args)
+        # Counted until the thread is done, even when the caller stopped waiting
+        future.add_done_callback(self._finished)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except TimeoutError:
+            # Cancels it if still queued; a hash already running completes unobserved
+            future.cancel()
+            with self._lock:
+                self._timed_out += 1
+            raise PasswordHashingBusy("Password hashing timed out")
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.hasher.hash, password)
+
+    def _verify(self, password_hash: str, password: str) -> bool:
+        try:
+            return self.hasher.verify(password_hash, password)
+        except argon2.exceptions.VerifyMismatchError as e:
+            logger.error(f"Invalid Password: {e}")
+            return False
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        return await self._run(self._verify, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether the hash was made with other parameters than the current ones. Only parses it."""
+        return self.hasher.check_needs_rehash(password_hash)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            waits, durations = list(self._waits), list(self._durations)
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "running": self._running,
+                "queued": max(self._pending - self._running, 0),
+                "peak_queued": self._peak_queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "wait_ms": {
+                    "p50": _percentile(waits, 0.5) * 1000,
+                    "p95": _percentile(waits, 0.95) * 1000,
+                },
+                "hash_ms": {
+                    "p50": _percentile(durations, 0.5) * 1000,
+                    "p95": _percentile(durations, 0.95) * 1000,
+                },
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHashingService(
+    PasswordHasher(
+        time_cost=settings.ARGON2_TIME_COST,
+        memory_cost=settings.ARGON2_MEMORY_COST,
+        parallelism=settings.ARGON2_PARALLELISM,
+    ),
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_limit=settings.PASSWORD_HASH_QUEUE_LIMIT,
+    timeout=settings.PASSWORD_HASH_TIMEOUT_SECONDS,
+)
@@ -1,10 +1,13 @@
+import heapq
+import time
 from abc import ABC
+from collections import OrderedDict
 from datetime import UTC, datetime, timedelta
 from enum import StrEnum
 from uuid import UUID, uuid4
 
 from jwt import PyJWTError, decode, encode
-from sqlalchemy import exists, delete, Delete
+from sqlalchemy import delete, insert, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..common import UserType
@@ -89,24 +92,18 @@ class BaseToken[DecodedType](ABC):
 
 # noinspection PyMethodOverriding
 class RevocableToken[DecodedType](BaseToken[DecodedType]):
-    @classmethod
-    async def _create_token_in_db(
-        cls, conn: AsyncSession, user_id: UUID, expires_at: datetime
-    ) -> Token:
-        new_token = Token(user_id=user_id, expires_at=expires_at)
-        conn.add(new_token)
-        await conn.flush()
-        await conn.refresh(new_token)
-        return new_token
-
-    @classmethod
-    async def _delete_all_user_tokens_in_db(cls, conn: AsyncSession, user_id: UUID | str):
-        if isinstance(user_id, str):
-            user_id = UUID(user_id)
+    """
+    Tokens valid once, and only while their row exists. A user holds one at a time:
+    issuing removes the user's other rows in the same statement, and decoding deletes
+    the row it checks, so two requests can never both use the same token.
+    """
 
-        stmt: Delete = delete(Token).where(Token.user_id == user_id)
-        await conn.execute(stmt)
-        await conn.flush()
+    @staticmethod
+    def _user_uuid(sub: str | UUID) -> UUID:
+        try:
+            return sub if isinstance(sub, UUID) else UUID(sub)
+        except (TypeError, ValueError):
+            raise InvalidTokenError
 
     @classmethod
     async def new(
@@ -116,45 +113,160 @@ class RevocableToken[DecodedType](BaseToken[DecodedType]):
         data: dict | None = None,
         jti: str | None = None,
     ) -> str:
+        user_id = cls._user_uuid(sub)
         now = datetime.now(UTC)
         expires_at = now + cls.token_type.lifetime
-        await cls._delete_all_user_tokens_in_db(user_id=sub, conn=conn)
-        token_in_db = await cls._create_token_in_db(conn=conn, user_id=sub, expires_at=expires_at)
-
-        return await super().new(
-            sub=sub, data=data, jti=str(token_in_db.jti), now=now, expires_at=expires_at
+        jti = UUID(jti) if jti else uuid4()
+        # WITH revoked AS (DELETE ... WHERE user_id = ...) INSERT ...: one round trip
+        revoked = delete(Token).where(Token.user_id == user_id).cte("revoked")
+        await conn.execute(
+            insert(Token).values(jti=jti, user_id=user_id, expires_at=expires_at).add_cte(revoked)
         )
 
+        return await super().new(sub=sub, data=data, jti=str(jti), now=now, expires_at=expires_at)
+
     @classmethod
-    async def _ensure_token_in_db(cls, conn: AsyncSession, jti: UUID) -> None:
-        token_exists = await conn.scalar(exists(Token).where(Token.jti == jti).select())
-        if not token_exists:
+    async def _verified_claims(cls, token: str) -> tuple[dict, UUID, UUID]:
+        claims = await super().decode(token=token)
+        if not (jti := claims.get("jti")):
+            raise InvalidTokenError
+        try:
+            jti = UUID(jti)
+        except (TypeError, ValueError):
             raise InvalidTokenError
+        return claims, jti, cls._user_uuid(claims.get("sub"))
 
     @classmethod
     async def decode(cls, conn: AsyncSession, token: str) -> dict:
-        claims = await super().decode(token=token)
-        # Ensuring the token is in the database
-        if jti := claims.get("jti"):
-            if isinstance(jti, str):
-                jti = UUID(jti)
-            await cls._ensure_token_in_db(conn=conn, jti=jti)
-            await cls._revoke(conn=conn, jti=jti)
-        else:
+        claims, jti, user_id = await cls._verified_claims(token)
+        # Checks and revokes at once: of concurrent uses, only one gets the row back
+        revoked = await conn.scalar(
+            delete(Token).where(Token.jti == jti, Token.user_id == user_id).returning(Token.jti)
+        )
+        if revoked is None:
             raise InvalidTokenError
         return claims
 
     @classmethod
-    async def _revoke(cls, conn: AsyncSession, jti: UUID) -> None:
-        stmt = delete(Token).where(Token.jti == jti)
-        await conn.execute(stmt)
+    async def rotate(
+        cls, conn: AsyncSession, token: str, data: dict | None = None
+    ) -> tuple[dict, str]:
+        """
+        Decodes a token and issues its replacement in a single statement: the new row is
+        only inserted if the old one was there to delete. Returns the old claims and the
+        new token.
+        """
+        claims, old_jti, user_id = await cls._verified_claims(token)
+        now = datetime.now(UTC)
+        expires_at = now + cls.token_type.lifetime
+        new_jti = uuid4()
+
+        used = (
+            delete(Token)
+            .where(Token.jti == old_jti, Token.user_id == user_id)
+            .returning(Token.user_id)
+            .cte("used")
+        )
+        # The user's other rows; the used one is left to `used`, as a row deleted twice
+        # in one statement is only deleted by one of them
+        revoked = (
+            delete(Token)
+            .where(Token.user_id.in_(select(used.c.user_id)), Token.jti != old_jti)
+            .cte("revoked")
+        )
+        issue = (
+            insert(Token)
+            .from_select(
+                ["jti", "user_id", "expires_at"],
+                select(
+                    literal(new_jti, Token.jti.type),
+                    used.c.user_id,
+                    literal(expires_at, Token.expires_at.type),
+                ),
+            )
+            .add_cte(revoked)
+            .returning(Token.jti)
+        )
+        if await conn.scalar(issue) is None:
+            raise InvalidTokenError
+
+        new_token = await super().new(
+            sub=claims["sub"], data=data, jti=str(new_jti), now=now, expires_at=expires_at
+        )
+        return claims, new_token
+
+
+async def delete_expired_tokens(conn: AsyncSession, batch_size: int) -> int:
+    """Deletes up to `batch_size` expired revocable tokens, returns how many."""
+    expired = (
+        select(Token.jti)
+        .where(Token.expires_at <= datetime.now(UTC))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)  # other workers purge other rows
+    )
+    result = await conn.execute(delete(Token).where(Token.jti.in_(expired)))
+    return result.rowcount
+
+
+class VerifiedTokenCache:
+    """
+    Users of already verified access tokens, by token string. Least recently used
+    entries go first past `size`, and every entry goes at its token's expiry, so a
+    token is never served past its "exp" however often it is polled.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._users: OrderedDict[str, tuple[float, UserOutModel]] = OrderedDict()
+        self._expiries: list[tuple[float, str]] = []  # min-heap, may hold entries already gone
+
+    def _evict_expired(self, now: float) -> None:
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, token = heapq.heappop(self._expiries)
+            if (entry := self._users.get(token)) is not None and entry[0] == expires_at:
+                del self._users[token]
+
+    def get(self, token: str) -> UserOutModel | None:
+        if (entry := self._users.get(token)) is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.time():
+            self._evict_expired(time.time())
+            return None
+        self._users.move_to_end(token)
+        return user.model_copy(deep=True)  # callers may modify their copy, nested fields included
+
+    def put(self, token: str, user: UserOutModel, expires_at: float) -> None:
+        if not self.size:
+            return
+        now = time.time()
+        self._evict_expired(now)
+        if expires_at <= now:
+            return
+        self._users[token] = (expires_at, user.model_copy(deep=True))
+        self._users.move_to_end(token)
+        heapq.heappush(self._expiries, (expires_at, token))
+        while len(self._users) > self.size:
+            self._users.popitem(last=False)
+        if len(self._expiries) > 2 * self.size:
+            # Drop the expiries of entries pushed out by size
+            self._expiries = [(at, token) for at, token in self._expiries if token in self._users]
+            heapq.heapify(self._expiries)
+
+    def clear(self) -> None:
+        self._users.clear()
+        self._expiries.clear()
+
+
+verified_access_tokens = VerifiedTokenCache(settings.ACCESS_TOKEN_CACHE_SIZE)
 
 
 class AccessToken(BaseToken[UserOutModel]):
     """
     Access token factory class.
 
-    Decoding returns a UserOutModel.
+    Decoding returns a UserOutModel. Verified tokens are cached until they expire, so
+    a client polling with the same token pays the signature check and validation once.
     """
 
     token_type = TokenType.ACCESS
@@ -167,17 +279,23 @@ class AccessToken(BaseToken[UserOutModel]):
 
     @classmethod
     async def decode(cls, token: str) -> UserOutModel:
+        if (user := verified_access_tokens.get(token)) is not None:
+            return user
+
         claims = await super().decode(token=token)
         data = claims["data"]
         data["user_id"] = claims["sub"]
         data["type"] = UserType(data["type"])
         match data["type"]:
             case UserType.SUPERVISOR:
-                return SupervisorOutModel.model_validate(data)
+                user = SupervisorOutModel.model_validate(data)
             case UserType.INTERN:
-                return InternOutModel.model_validate(data)
+                user = InternOutModel.model_validate(data)
             case _:
-                return UserOutModel.model_validate(data)
+                user = UserOutModel.model_validate(data)
+
+        verified_access_tokens.put(token, user, claims["exp"])
+        return user
 
 
 class RefreshToken[str](RevocableToken[str]):
@@ -200,6 +318,13 @@ class RefreshToken[str](RevocableToken[str]):
         user_id = claims["sub"]
         return user_id
 
+    # noinspection PyMethodOverriding
+    @classmethod
+    async def rotate(cls, conn: AsyncSession, token: str) -> tuple[str, str]:
+        """Returns the user_id and the refresh token replacing this one."""
+        claims, new_token = await super().rotate(conn=conn, token=token)
+        return claims["sub"], new_token
+
 
 class PasswordResetToken[str](RevocableToken[str]):
     """
@@ -1,4 +1,6 @@
+import asyncio
 import time
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
 from slowapi.errors import RateLimitExceeded
@@ -16,10 +18,48 @@ from .routers.project_router import router as project_router
 from .routers.matching_router import router as matching_router
 from .routers.admin_router import router as admin_router
 
+from .infra.jobs import job_runner
+from .infra.maintenance import purge_periodically
+from .infra.password_hasher import password_hasher
 from .logger import logger
+from .matching_incremental import load_snapshot, reconcile_periodically
+from .matching_pool import shutdown_pool
+from .matching_shared import publish_periodically
+from .services.matching_job_service import fail_stale_jobs
+from .settings import settings
 from .utils import limiter
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    reconciler = purger = None
+    await fail_stale_jobs()
+    if settings.MATCHING_SNAPSHOT == "shared":
+        reconciler = asyncio.create_task(publish_periodically(
+            settings.MATCHING_SNAPSHOT_PATH,
+            settings.MATCHING_SNAPSHOT_REFRESH_SECONDS,
+            settings.MATCHING_RECONCILE_SECONDS,
+        ))
+    elif settings.INCREMENTAL_MATCHING:
+        await load_snapshot()
+        if settings.MATCHING_RECONCILE_SECONDS:
+            reconciler = asyncio.create_task(reconcile_periodically(settings.MATCHING_RECONCILE_SECONDS))
+    if settings.EXPIRED_ROWS_PURGE_SECONDS:
+        purger = asyncio.create_task(purge_periodically(
+            settings.EXPIRED_ROWS_PURGE_SECONDS, settings.EXPIRED_ROWS_PURGE_BATCH_SIZE
+        ))
+    yield
+    for task in (reconciler, purger):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await job_runner.shutdown()
+    shutdown_pool()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
 
@@ -1,30 +1,18 @@
+import heapq
+import math
+import time
 from collections import defaultdict
+from dataclasses import dataclass
+from typing import NamedTuple
 
 from dotenv import load_dotenv
-from icecream import ic
-# import numpy as np
-# from sentence_transformers import util
 
-from .common import InternMatchDetail
+from .common import DepartmentEnum, InternMatchDetail
 from .models.app_models import Intern, Supervisor
-# from .matching_ml_model import get_model
-from .settings import settings
 
 load_dotenv()
 
-# def embed_skills(skills: list[str]):
-#     if not skills:
-#         return np.zeros(get_model().get_sentence_embedding_dimension())
-#     embeddings = get_model().encode(skills, convert_to_tensor=True)
-#     return embeddings.mean(dim=0)  # average embedding of skills
-#
-# def ml_similarity(
-#         intern_vec: np.ndarray = None, supervisor_vec: np.ndarray = None
-# ):
-#     """
-#     The core of calculating matches.
-#     """
-#     return util.cos_sim(intern_vec, supervisor_vec).item()
+# Embedding similarity (settings.USE_ML_MATCHING) lives in matching_embeddings.py
 
 def skills_similarity(intern_skills: list, supervisor_skills: list, method: str = "jaccard"):
     intern_set = set(intern_skills)
@@ -41,62 +29,631 @@ def skills_similarity(intern_skills: list, supervisor_skills: list, method: str
     else:  # default to Jaccard
         return overlap / len(intern_set | supervisor_set)
 
-def match_interns_to_supervisors(supervisors_list: list, interns_list: list):
-    matches_ = defaultdict(list)  # supervisor_id -> list of intern_ids
 
-    # if settings.USE_ML_MATCHING:
-    #     supervisor_skill_embedding_dict = {
-    #         supervisor["id"]: embed_skills(supervisor["skills"])
-    #         for supervisor in supervisors_list
-    #     }
-    #     intern_skill_embedding_dict = {
-    #         intern["id"]: embed_skills(intern["skills"])
-    #         for intern in interns_list
-    #     }
+class SkillVocabulary:
+    """
+    Interns skill keys (names or ids) to stable bit positions so that a person's
+    skills can be held as a single integer bitmask.
+    """
+
+    __slots__ = ("_positions",)
+
+    def __init__(self):
+        self._positions: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def position(self, skill) -> int:
+        return self._positions.setdefault(skill, len(self._positions))
+
+    def skills(self) -> list:
+        """The interned keys, in bit position order."""
+        return list(self._positions)
+
+    def encode(self, skills) -> int:
+        bits = 0
+        for skill in skills:
+            bits |= 1 << self.position(skill)
+        return bits
+
+
+class EncodedProfile(NamedTuple):
+    id: str
+    bits: int
+    size: int
+
+
+def encode_profiles(people: list[dict], vocabulary: SkillVocabulary) -> list[EncodedProfile]:
+    encoded = []
+    for person in people:
+        bits = vocabulary.encode(person["skills"])
+        encoded.append(EncodedProfile(person["id"], bits, bits.bit_count()))
+    return encoded
+
+
+def bitset_similarity(
+    intern_bits: int, intern_size: int, supervisor_bits: int, supervisor_size: int, method: str = "jaccard"
+):
+    """Same scores as `skills_similarity`, computed with AND + popcount on encoded skills."""
+    if not intern_size or not supervisor_size:
+        return 0
+
+    overlap = (intern_bits & supervisor_bits).bit_count()
+    if method == "intern_ratio":
+        return overlap / intern_size
+    elif method == "supervisor_ratio":
+        return overlap / supervisor_size
+    else:  # default to Jaccard
+        return overlap / (intern_size + supervisor_size - overlap)
+
+
+def iter_bits(bits: int):
+    """Yields the positions of the set bits, lowest first."""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def overlap_score(overlap: int, intern_size: int, supervisor_size: int, method: str = "jaccard") -> float:
+    if method == "intern_ratio":
+        return overlap / intern_size
+    elif method == "supervisor_ratio":
+        return overlap / supervisor_size
+    else:  # default to Jaccard
+        return overlap / (intern_size + supervisor_size - overlap)
+
+
+def score_upper_bound(overlap: int, intern_size: int, method: str = "jaccard") -> float:
+    """Best score any supervisor sharing `overlap` skills with the intern can reach."""
+    if method == "supervisor_ratio":
+        return 1.0
+    return overlap / intern_size  # Jaccard peaks when the supervisor has nothing else
+
+
+class SkillIndex:
+    """
+    Inverted index of a department's supervisors: skill bit position -> bitmask
+    of the positions of the supervisors that have that skill.
+    """
+
+    __slots__ = ("supervisors", "size_buckets", "_postings", "_sizes", "_everyone")
+
+    def __init__(self, supervisors: list[EncodedProfile]):
+        self.supervisors = supervisors
+        self._postings: dict[int, int] = defaultdict(int)
+        self._sizes: dict[int, int] = defaultdict(int)
+        for position, supervisor in enumerate(supervisors):
+            self._add(position, supervisor)
+        self._everyone = (1 << len(supervisors)) - 1
+        # (skill count, bitmask of positions), smallest first. For a fixed overlap every
+        # score is non-increasing in the supervisor's skill count, so walking these
+        # buckets visits supervisors best-first without scoring them one by one.
+        self.size_buckets: list[tuple[int, int]] = sorted(self._sizes.items())
+
+    def _add(self, position: int, supervisor: EncodedProfile) -> None:
+        bit = 1 << position
+        self._sizes[supervisor.size] |= bit
+        for skill in iter_bits(supervisor.bits):
+            self._postings[skill] |= bit
+
+    def put(self, position: int, supervisor: EncodedProfile) -> None:
+        """Replaces the supervisor at `position`, or appends it when position == len(supervisors)."""
+        bit = 1 << position
+        if position < len(self.supervisors):
+            previous = self.supervisors[position]
+            self._sizes[previous.size] &= ~bit
+            for skill in iter_bits(previous.bits):
+                self._postings[skill] &= ~bit
+            self.supervisors[position] = supervisor
+        else:
+            self.supervisors.append(supervisor)
+            self._everyone |= bit
+        self._add(position, supervisor)
+        self.size_buckets = sorted((size, mask) for size, mask in self._sizes.items() if mask)
+
+    def posting(self, skill: int) -> int:
+        """Bitmask of the positions of the supervisors that have `skill`."""
+        return self._postings.get(skill, 0)
+
+    def candidate_mask(self, skill_bits: int) -> int:
+        mask = 0
+        postings = self._postings
+        for skill in iter_bits(skill_bits):
+            mask |= postings.get(skill, 0)
+        return mask
+
+    def candidates(self, skill_bits: int) -> list[EncodedProfile]:
+        """Supervisors sharing at least one skill, in their original order."""
+        supervisors = self.supervisors
+        return [supervisors[position] for position in iter_bits(self.candidate_mask(skill_bits))]
+
+    def overlap_levels(self, skill_bits: int) -> list[int]:
+        """
+        Bit-sliced overlap counters: bit `p` of levels[k] is bit k of the number of skills
+        supervisor `p` shares with `skill_bits`. Every posting is added to all supervisors
+        at once with a ripple-carry over the levels, so the cost depends on the number of
+        skills, not on the number of supervisors.
+        """
+        levels: list[int] = []
+        postings = self._postings
+        for skill in iter_bits(skill_bits):
+            carry = postings.get(skill, 0)
+            for k, level in enumerate(levels):
+                levels[k] = level ^ carry
+                carry &= level
+                if not carry:
+                    break
+            if carry:
+                levels.append(carry)
+        return levels
+
+    def overlap_groups(self, skill_bits: int):
+        """Yields (overlap, bitmask of supervisor positions) from the largest overlap down to 1."""
+        levels = self.overlap_levels(skill_bits)
+        for overlap in range((1 << len(levels)) - 1, 0, -1):
+            mask = self._everyone
+            for k, level in enumerate(levels):
+                mask &= level if overlap >> k & 1 else ~level
+                if not mask:
+                    break
+            if mask:
+                yield overlap, mask
+
+
+class IdfWeights:
+    """
+    Inverse document frequency of every skill among the people of one department, so
+    that sharing a skill most of the department has ("communication") counts for
+    little and sharing a rare one ("kubernetes") for a lot. Built once per matching run.
+
+    The "idf" method is the weighted Jaccard: weight of the shared skills over the
+    weight of all skills of the pair.
+    """
+
+    __slots__ = ("weights", "_unseen", "_totals", "_ranking")
+
+    def __init__(self, profiles: list[EncodedProfile]):
+        counts: dict[int, int] = defaultdict(int)
+        for profile in profiles:
+            for skill in iter_bits(profile.bits):
+                counts[skill] += 1
+        people = len(profiles)
+        self.weights: dict[int, float] = {
+            skill: math.log((1 + people) / (1 + count)) + 1 for skill, count in counts.items()
+        }
+        self._unseen = math.log(1 + people) + 1
+        self._totals: dict[int, float] = {}
+        self._ranking: tuple[SkillIndex, TotalRanking] | None = None
+
+    def weight(self, skill: int) -> float:
+        return self.weights.get(skill, self._unseen)
+
+    def total(self, bits: int) -> float:
+        if (total := self._totals.get(bits)) is None:
+            # Always summed lowest bit first, so equal sets get bit-identical totals
+            weights, unseen = self.weights, self._unseen
+            total = 0.0
+            remaining = bits
+            while remaining:
+                lowest = remaining & -remaining
+                total += weights.get(lowest.bit_length() - 1, unseen)
+                remaining ^= lowest
+            self._totals[bits] = total
+        return total
+
+    def similarity(self, intern_bits: int, supervisor_bits: int):
+        overlap = intern_bits & supervisor_bits
+        if not overlap:
+            return 0
+        shared = self.total(overlap)
+        return shared / (self.total(intern_bits) + self.total(supervisor_bits) - shared)
+
+    def ranking(self, index: SkillIndex) -> "TotalRanking":
+        """`index`'s supervisors ranked by total weight, built on first use."""
+        if self._ranking is None or self._ranking[0] is not index:
+            self._ranking = (index, TotalRanking(index.supervisors, self))
+        return self._ranking[1]
+
+    def ranked_groups(self, skill_bits: int, index: SkillIndex):
+        """
+        Yields (shared weight bound, bitmask of supervisor ranks, see `ranking`) for the
+        supervisors sharing a skill with `skill_bits`, grouped by their heaviest shared
+        skill, heaviest first. A supervisor whose heaviest shared skill is the j-th can
+        share the j-th and lighter skills at most, so that tail weighs at least as much
+        as anything it shares.
+        """
+        skills = sorted(iter_bits(skill_bits), key=lambda skill: (-self.weight(skill), skill))
+        tails = [0.0] * len(skills)
+        tail = 0.0
+        for k in range(len(skills) - 1, -1, -1):
+            tail += self.weight(skills[k])
+            tails[k] = tail
+
+        postings = self.ranking(index).postings
+        seen = 0
+        for skill, tail in zip(skills, tails):
+            group = postings.get(skill, 0) & ~seen
+            if group:
+                seen |= group
+                yield tail, group
+
+
+class TotalRanking:
+    """
+    A department's supervisors ranked by the total weight of their skills, lightest
+    first and earliest first on ties, with the skill postings over those ranks. For a
+    given shared weight the weighted Jaccard only falls as the supervisor gets heavier,
+    so walking a group of ranks lowest bit first visits it best-first: what the size
+    buckets of the `SkillIndex` do for the other methods. The weights are rebuilt
+    whenever the department changes, and the ranking with them.
+    """
+
+    __slots__ = ("positions", "totals", "postings")
+
+    def __init__(self, supervisors: list[EncodedProfile], weights: IdfWeights):
+        by_position = [weights.total(supervisor.bits) for supervisor in supervisors]
+        self.positions = sorted(range(len(supervisors)), key=lambda position: (by_position[position], position))
+        self.totals = [by_position[position] for position in self.positions]
+        self.postings: dict[int, int] = defaultdict(int)
+        for rank, position in enumerate(self.positions):
+            bit = 1 << rank
+            for skill in iter_bits(supervisors[position].bits):
+                self.postings[skill] |= bit
+
+
+def idf_reach(shared_bound: float, intern_total: float, supervisor_total: float | None = None) -> float:
+    """
+    Best "idf" score of a supervisor sharing at most `shared_bound` with the intern and
+    weighing `supervisor_total` or more (or anything). Everything it doesn't share adds
+    to the denominator, so the score never rises with the total.
+    """
+    if supervisor_total is None:
+        supervisor_total = shared_bound  # it has nothing else
+    # Slack for the different summation order of the bound and the scores
+    return shared_bound / (intern_total + supervisor_total - shared_bound) * (1 + 1e-9)
 
-    for intern in interns_list:
-        best_supervisor = None
-        best_score = -1
-        for supervisor in supervisors_list:
-            score = skills_similarity(intern["skills"], supervisor["skills"])
 
+def profile_similarity(
+    intern: EncodedProfile, supervisor: EncodedProfile, method: str = "jaccard", weights: IdfWeights | None = None
+):
+    if method == "idf":
+        return weights.similarity(intern.bits, supervisor.bits)
+    return bitset_similarity(intern.bits, intern.size, supervisor.bits, supervisor.size, method)
 
-            if score > best_score:
-                best_score = score
-                best_supervisor = supervisor["id"]
 
-        if best_supervisor is not None:
-            matches_[best_supervisor].append(InternMatchDetail(intern_id=intern["id"], similarity=best_score))
+def _best_supervisor_idf(intern: EncodedProfile, index: SkillIndex, weights: IdfWeights):
+    supervisors = index.supervisors
+    ranking = weights.ranking(index)
+    positions, totals = ranking.positions, ranking.totals
+    total = weights.total
+    intern_bits = intern.bits
+    intern_total = total(intern_bits)
+    best_position, best_score = -1, -1
+    for shared_bound, group in weights.ranked_groups(intern_bits, index):
+        if best_score > idf_reach(shared_bound, intern_total):
+            break
+        while group:  # iter_bits inlined, this is the hot loop
+            lowest = group & -group
+            group ^= lowest
+            rank = lowest.bit_length() - 1
+            supervisor_total = totals[rank]
+            if best_score > idf_reach(shared_bound, intern_total, supervisor_total):
+                break  # heavier supervisors of this group score lower still
+            position = positions[rank]
+            shared = total(intern_bits & supervisors[position].bits)  # > 0, every group member shares a skill
+            score = shared / (intern_total + supervisor_total - shared)
+            if score > best_score or (score == best_score and position < best_position):
+                best_position, best_score = position, score
+
+    if best_position < 0:
+        return supervisors[0].id, 0
+    return supervisors[best_position].id, best_score
+
+
+def best_supervisor(
+    intern: EncodedProfile, index: SkillIndex, method: str, weights: IdfWeights | None = None
+):
+    """
+    Greedy argmax for one intern over the supervisors that share a skill with it,
+    visited from the largest overlap down until no smaller overlap can reach the best
+    score. Ties go to the earliest supervisor, and when nobody shares a skill the first
+    supervisor wins with 0, exactly like the original full nested loop.
+
+    The "idf" method needs the department's `weights`; its supervisors are visited by
+    heaviest shared skill, then lightest first, with the same ties and fallback.
+    """
+    if method == "idf":
+        return _best_supervisor_idf(intern, index, weights)
+
+    supervisors = index.supervisors
+    best_position, best_score = -1, -1
+    for overlap, mask in index.overlap_groups(intern.bits):
+        if best_score > score_upper_bound(overlap, intern.size, method):
+            break
+        for size, size_mask in index.size_buckets:
+            members = mask if method == "intern_ratio" else mask & size_mask
+            if not members:
+                continue
+            # Within an overlap group the smallest supervisors score best (all score
+            # the same for intern_ratio), and the lowest bit is the earliest of them
+            score = overlap_score(overlap, intern.size, size, method)
+            position = (members & -members).bit_length() - 1
+            if score > best_score or (score == best_score and position < best_position):
+                best_position, best_score = position, score
+            break
+
+    if best_position < 0:
+        first = supervisors[0]
+        return first.id, bitset_similarity(intern.bits, intern.size, first.bits, first.size, method)
+
+    return supervisors[best_position].id, best_score
+
+
+def _top_supervisors_idf(
+    intern: EncodedProfile, index: SkillIndex, weights: IdfWeights, k: int, allowed: int
+) -> list[tuple[float, int]]:
+    supervisors = index.supervisors
+    ranking = weights.ranking(index)
+    positions, totals = ranking.positions, ranking.totals
+    total = weights.total
+    intern_bits = intern.bits
+    intern_total = total(intern_bits)
+    best: list[tuple[float, int]] = []
+    for shared_bound, group in weights.ranked_groups(intern_bits, index):
+        if len(best) == k and best[0][0] >= idf_reach(shared_bound, intern_total):
+            break
+        while group:  # iter_bits inlined, this is the hot loop
+            lowest = group & -group
+            group ^= lowest
+            rank = lowest.bit_length() - 1
+            supervisor_total = totals[rank]
+            if len(best) == k and best[0][0] >= idf_reach(shared_bound, intern_total, supervisor_total):
+                break  # heavier supervisors of this group score no higher
+            position = positions[rank]
+            if not allowed >> position & 1:
+                continue
+            shared = total(intern_bits & supervisors[position].bits)
+            score = shared / (intern_total + supervisor_total - shared)
+            if len(best) < k:
+                heapq.heappush(best, (score, position))
+            elif score > best[0][0]:
+                heapq.heapreplace(best, (score, position))
+    return best
+
+
+def top_supervisors(
+    intern: EncodedProfile,
+    index: SkillIndex,
+    method: str,
+    k: int,
+    allowed: int = -1,
+    weights: IdfWeights | None = None,
+) -> list[tuple[float, int]]:
+    """
+    Min-heap of the k best (similarity, supervisor position) among the supervisors
+    sharing a skill with the intern, optionally restricted to the `allowed` positions
+    bitmask. Walks the overlap groups and size buckets best-first and stops as soon as
+    nothing left can enter the heap. The "idf" method needs the department's `weights`
+    and walks by heaviest shared skill, then by supervisor weight, with the same stop.
+    """
+    if method == "idf":
+        return _top_supervisors_idf(intern, index, weights, k, allowed)
+
+    best: list[tuple[float, int]] = []
+    for overlap, group in index.overlap_groups(intern.bits):
+        if len(best) == k and best[0][0] >= score_upper_bound(overlap, intern.size, method):
+            break
+        group &= allowed
+        for size, size_mask in index.size_buckets:
+            members = group & size_mask
+            if not members:
+                continue
+            score = overlap_score(overlap, intern.size, size, method)
+            if len(best) == k and score <= best[0][0]:
+                break  # larger supervisors in this group score no higher
+            for position in iter_bits(members):
+                if len(best) < k:
+                    heapq.heappush(best, (score, position))
+                elif score > best[0][0]:
+                    heapq.heapreplace(best, (score, position))
+                else:
+                    break
+    return best
+
+
+def match_encoded(
+    supervisors: list[EncodedProfile],
+    interns: list[EncodedProfile],
+    method: str = "jaccard",
+    index: SkillIndex | None = None,
+    weights: IdfWeights | None = None,
+) -> dict[str, list[InternMatchDetail]]:
+    matches_ = defaultdict(list)  # supervisor_id -> list of intern_ids
+    if not supervisors:
+        return {}
+
+    index = index or SkillIndex(supervisors)
+    if method == "idf" and weights is None:
+        weights = IdfWeights(supervisors + interns)
+    for intern in interns:
+        supervisor_id, best_score = best_supervisor(intern, index, method, weights)
+        matches_[supervisor_id].append(InternMatchDetail(intern_id=intern.id, similarity=best_score))
 
     return dict(matches_)
 
 
-def run_matching(all_supervisors, all_interns):
-    results = {}
-    # collating all department as a union set of all departments
-    departments = set(
-        [s["department"] for s in all_supervisors]
-        + [i["department"] for i in all_interns]
+def match_interns_to_supervisors(supervisors_list: list, interns_list: list, method: str = "jaccard"):
+    vocabulary = SkillVocabulary()
+    return match_encoded(
+        encode_profiles(supervisors_list, vocabulary),
+        encode_profiles(interns_list, vocabulary),
+        method,
+    )
+
+
+@dataclass
+class SolverStats:
+    department: str
+    strategy: str
+    interns: int = 0
+    supervisors: int = 0
+    candidate_pairs: int = 0
+    iterations: int = 0
+    phases: int = 0
+    duration_ms: float = 0.0
+    total_similarity: float = 0.0
+    unassigned: int = 0
+    timed_out: bool = False
+
+
+def partition_by_department(
+    all_supervisors, all_interns
+) -> dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]]:
+    # Skills are encoded once for everybody, then partitioned by department to ensure
+    # only people of the same department gets matched
+    vocabulary = SkillVocabulary()
+    supervisors_by_dept: dict[str, list[EncodedProfile]] = defaultdict(list)
+    interns_by_dept: dict[str, list[EncodedProfile]] = defaultdict(list)
+
+    for supervisor in all_supervisors:
+        bits = vocabulary.encode(supervisor["skills"])
+        supervisors_by_dept[supervisor["department"]].append(
+            EncodedProfile(supervisor["id"], bits, bits.bit_count())
+        )
+    for intern in all_interns:
+        bits = vocabulary.encode(intern["skills"])
+        interns_by_dept[intern["department"]].append(
+            EncodedProfile(intern["id"], bits, bits.bit_count())
+        )
+
+    return {
+        dept: (supervisors_by_dept[dept], interns_by_dept[dept])
+        for dept in supervisors_by_dept.keys() | interns_by_dept.keys()
+    }
+
+
+CAPACITATED_STRATEGIES = ("assignment", "stable")
+
+
+def supervisor_capacities(all_supervisors, strategy: str, capacity: int | None) -> dict[str, int] | None:
+    """Free slots of every supervisor for the capacitated strategies, None for the others."""
+    if strategy not in CAPACITATED_STRATEGIES:
+        return None
+    if capacity is None:
+        raise ValueError(f"The {strategy} strategy needs a supervisor capacity")
+    return {s["id"]: capacity - s.get("intern_count", 0) for s in all_supervisors}
+
+
+def match_department(
+    dept: str,
+    supervisors: list[EncodedProfile],
+    interns: list[EncodedProfile],
+    method: str = "jaccard",
+    strategy: str = "greedy",
+    capacities: dict[str, int] | None = None,
+) -> tuple[dict[str, list[InternMatchDetail]], SolverStats]:
+    """Matches one department. Takes and returns only plain picklable data."""
+    dept_stats = SolverStats(
+        department=dept, strategy=strategy, interns=len(interns), supervisors=len(supervisors)
+    )
+    start = time.perf_counter()
+
+    index = SkillIndex(supervisors)  # only supervisors sharing a skill get scored
+    weights = IdfWeights(supervisors + interns) if method == "idf" else None
+    if strategy == "assignment":
+        # Solvers live in their own modules and build on the primitives above
+        from .matching_assignment import assign_with_capacity
+
+        matches_ = assign_with_capacity(
+            supervisors, interns, capacities, method, index, stats=dept_stats, weights=weights
+        )
+    elif strategy == "stable":
+        from .matching_stable import stable_match
+
+        matches_ = stable_match(
+            supervisors, interns, capacities, method, index, stats=dept_stats, weights=weights
+        )
+    elif strategy == "lsh":
+        from .matching_lsh import match_lsh
+
+        matches_ = match_lsh(supervisors, interns, method, index=index, weights=weights)
+    else:
+        matches_ = match_encoded(supervisors, interns, method, index, weights)
+
+    dept_stats.duration_ms = (time.perf_counter() - start) * 1000
+    dept_stats.total_similarity = sum(
+        match.similarity for department_matches in matches_.values() for match in department_matches
     )
+    return matches_, dept_stats
+
 
-    for dept in departments:
-        # Performing matching by department to ensure only people of the same department gets matched
-        supervisors_ = [s for s in all_supervisors if s["department"] == dept]
-        interns_ = [i for i in all_interns if i["department"] == dept]
-        results[dept] = match_interns_to_supervisors(supervisors_, interns_)
+def run_matching(
+    all_supervisors,
+    all_interns,
+    method: str = "jaccard",
+    strategy: str = "greedy",
+    capacity: int | None = None,
+    stats: list[SolverStats] | None = None,
+):
+    """
+    Matches interns to supervisors department by department.
+
+    method is "jaccard", "intern_ratio", "supervisor_ratio" or "idf", the Jaccard
+    weighted by each skill's inverse document frequency within the department.
+    strategy="greedy" gives every intern its best supervisor regardless of load.
+    strategy="lsh" does the same over MinHash/LSH candidates only (approximate).
+    strategy="assignment" caps every supervisor at `capacity` interns (minus the ones
+    it already has, from "intern_count") and maximises total similarity instead.
+    strategy="stable" caps them the same way and returns the intern-optimal stable
+    matching (deferred acceptance) over both sides' similarity rankings.
+    Per-department SolverStats are appended to `stats` when a list is passed.
+    """
+    return match_partitions(
+        partition_by_department(all_supervisors, all_interns),
+        method,
+        strategy,
+        supervisor_capacities(all_supervisors, strategy, capacity),
+        stats,
+    )
+
+
+def match_partitions(
+    partitions: dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]],
+    method: str = "jaccard",
+    strategy: str = "greedy",
+    capacities: dict[str, int] | None = None,
+    stats: list[SolverStats] | None = None,
+):
+    """run_matching over already encoded department partitions."""
+    results = {}
+    for dept, (supervisors_, interns_) in partitions.items():
+        results[dept], dept_stats = match_department(
+            dept, supervisors_, interns_, method, strategy, capacities
+        )
+        if stats is not None:
+            stats.append(dept_stats)
 
     return results
 
 
-def matcher(supervisors: list[Supervisor], interns: list[Intern]):
+def department_key(department_id: int) -> str:
+    return DepartmentEnum(department_id).name
+
+
+def to_matching_details(
+    supervisors: list[Supervisor], interns: list[Intern]
+) -> tuple[list[dict], list[dict]]:
     # Expected data structure for matching
     supervisors_details: list[dict[str, int | str | list[str]]] = [
         {
             "id": str(supervisor.id),
             "firstname": supervisor.user.firstname,
             "lastname": supervisor.user.lastname,
-            "department": supervisor.user.department.name,
+            "department": department_key(supervisor.user.department_id),
             "skills": [skill.name for skill in supervisor.skills],
+            "intern_count": len(supervisor.interns),
         }
         for supervisor in supervisors
     ]
@@ -106,12 +663,50 @@ def matcher(supervisors: list[Supervisor], interns: list[Intern]):
             "id": str(intern.id),
             "firstname": intern.user.firstname,
             "lastname": intern.user.lastname,
-            "department": intern.user.department.name,
+            "department": department_key(intern.user.department_id),
             "skills": [skill.name for skill in intern.skills],
         }
         for intern in interns
     ]
 
-    matches = run_matching(supervisors_details, interns_details)
-    ic(matches)
+    return supervisors_details, interns_details
+
+
+def rows_to_matching_details(supervisor_rows, intern_rows) -> tuple[list[dict], list[dict]]:
+    """
+    Matching input from the compact (id, department_id, skill_ids[, intern_count])
+    repository rows. Skill ids stand in for names: both are unique per skill.
+    """
+    supervisors_details = [
+        {
+            "id": str(row.id),
+            "department": department_key(row.department_id),
+            "skills": row.skill_ids or (),
+            "intern_count": row.intern_count,
+        }
+        for row in supervisor_rows
+    ]
+    interns_details = [
+        {
+            "id": str(row.id),
+            "department": department_key(row.department_id),
+            "skills": row.skill_ids or (),
+        }
+        for row in intern_rows
+    ]
+    return supervisors_details, interns_details
+
+
+def matcher(
+    supervisors: list[Supervisor],
+    interns: list[Intern],
+    strategy: str = "greedy",
+    capacity: int | None = None,
+    stats: list[SolverStats] | None = None,
+):
+    supervisors_details, interns_details = to_matching_details(supervisors, interns)
+
+    matches = run_matching(
+        supervisors_details, interns_details, strategy=strategy, capacity=capacity, stats=stats
+    )
     return matches
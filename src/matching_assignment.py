@@ -0,0 +1,243 @@
+"""
+Capacity-aware global assignment of interns to supervisors.
+
+Unlike the greedy argmax in `matching.py`, which can pile every intern on the
+supervisor with the broadest skill list, this solves the transportation problem
+"maximise total similarity subject to each supervisor taking at most its
+capacity" with an auction algorithm (Bertsekas, similar-objects variant):
+
+    - each supervisor is a set of `capacity` slots, kept as a min-heap of prices,
+    - an unassigned intern bids for the supervisor with the best value - price,
+      raising the cheapest slot's price by (best - second best) + eps,
+    - the outbid holder of that slot goes back to the queue,
+    - staying unmatched is always an option with value 0, so over-subscribed
+      departments terminate.
+
+Candidate edges come from the department's `SkillIndex` and are truncated to the
+`top_k` best per intern, which keeps the problem sparse. The result of a completed
+phase is within `interns * eps` of the optimum over those edges. Every intern gets
+its edges; the time budget starts after them and covers the auction and the fill
+pass. When it runs out, the last completed phase is kept and the fill pass stops
+scanning every supervisor, which `SolverStats.timed_out` reports.
+"""
+
+import heapq
+import time
+from collections import defaultdict, deque
+
+from .common import InternMatchDetail
+from .matching import (
+    EncodedProfile,
+    IdfWeights,
+    SkillIndex,
+    SolverStats,
+    profile_similarity,
+    top_supervisors,
+)
+
+DEFAULT_TOP_K = 16
+DEFAULT_TIME_BUDGET = 0.5  # seconds per department for the auction and the fill pass
+EPSILON_SCHEDULE = (0.01, 0.002)  # a quick coarse answer, then a finer one if the budget allows
+
+_NO_HOLDER = -1
+
+
+def _candidate_edges(
+    supervisors: list[EncodedProfile],
+    interns: list[EncodedProfile],
+    capacity: list[int],
+    index: SkillIndex,
+    method: str,
+    top_k: int,
+    weights: IdfWeights | None = None,
+) -> list[list[tuple[float, int]]]:
+    """(similarity, supervisor position) for the top_k overlapping supervisors of every intern."""
+    with_room = rooms_mask(capacity)
+    return [
+        intern_candidate_edges(intern, supervisors, with_room, index, method, top_k, weights)
+        for intern in interns
+    ]
+
+
+def rooms_mask(capacity: list[int]) -> int:
+    """Bitmask of the positions of the supervisors with at least one slot."""
+    with_room = 0
+    for position, slots in enumerate(capacity):
+        if slots:
+            with_room |= 1 << position
+    return with_room
+
+
+def intern_candidate_edges(
+    intern: EncodedProfile,
+    supervisors: list[EncodedProfile],
+    with_room: int,
+    index: SkillIndex,
+    method: str,
+    top_k: int,
+    weights: IdfWeights | None = None,
+) -> list[tuple[float, int]]:
+    """Min-heap of (similarity, supervisor position) for the intern's top_k overlapping supervisors with room."""
+    return top_supervisors(intern, index, method, top_k, with_room, weights)
+
+
+def _auction_phase(
+    edges: list[list[tuple[float, int]]],
+    slots: list[list[tuple[float, int]]],
+    eps: float,
+    deadline: float,
+) -> tuple[list[int], int, bool]:
+    """
+    One auction pass at a fixed eps. `slots` holds the (price, holder) min-heap of every
+    supervisor. Returns the supervisor position of each intern (or -1), the number of
+    bids and whether the deadline was hit.
+    """
+    holder = [_NO_HOLDER] * len(edges)
+    queue = deque(i for i, intern_edges in enumerate(edges) if intern_edges)
+    bids = 0
+
+    while queue:
+        if not bids % 256 and time.perf_counter() > deadline:
+            return holder, bids, True
+
+        intern = queue.popleft()
+        best_net, second_net = 0.0, 0.0  # staying unmatched is always worth 0
+        best_position, best_value = _NO_HOLDER, 0.0
+        for value, position in edges[intern]:
+            net = value - slots[position][0][0]
+            if net > best_net:
+                second_net, best_net = best_net, net
+                best_position, best_value = position, value
+            elif net > second_net:
+                second_net = net
+
+        if best_position == _NO_HOLDER:
+            continue  # prices only go up, so this intern stays unmatched for the phase
+
+        heap = slots[best_position]
+        if len(heap) > 1:  # the next slot of the same supervisor is also an alternative
+            next_price = heap[1][0] if len(heap) == 2 else min(heap[1][0], heap[2][0])
+            second_net = max(second_net, best_value - next_price)
+
+        bid = heap[0][0] + (best_net - second_net) + eps
+        _, evicted = heapq.heapreplace(heap, (bid, intern))
+        holder[intern] = best_position
+        if evicted != _NO_HOLDER:
+            holder[evicted] = _NO_HOLDER
+            queue.append(evicted)
+        bids += 1
+
+    return holder, bids, False
+
+
+def assign_with_capacity(
+    supervisors: list[EncodedProfile],
+    interns: list[EncodedProfile],
+    capacities: dict[str, int],
+    method: str = "jaccard",
+    index: SkillIndex | None = None,
+    top_k: int = DEFAULT_TOP_K,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    stats: SolverStats | None = None,
+    weights: IdfWeights | None = None,
+) -> dict[str, list[InternMatchDetail]]:
+    """
+    Assigns interns so that no supervisor exceeds `capacities[supervisor_id]` (missing
+    supervisors have no capacity) and total similarity is maximised. Interns left over
+    by the auction are placed on the best supervisor that still has room, so everybody
+    is matched whenever the department has enough capacity.
+    """
+    if not supervisors or not interns:
+        return {}
+
+    index = index or SkillIndex(supervisors)
+    if method == "idf" and weights is None:
+        weights = IdfWeights(supervisors + interns)
+    capacity = [max(capacities.get(supervisor.id, 0), 0) for supervisor in supervisors]
+    edges = _candidate_edges(supervisors, interns, capacity, index, method, top_k, weights)
+    # The budget is for the solve: a slow similarity method must not eat the auction
+    deadline = time.perf_counter() + time_budget
+
+    holder = [_NO_HOLDER] * len(interns)
+    total_bids, phases, timed_out = 0, 0, False
+    for eps in EPSILON_SCHEDULE:
+        # Every phase starts from zero prices: slots left empty must stay at the lowest
+        # price for the forward auction to be optimal when capacity exceeds demand.
+        slots = [[(0.0, _NO_HOLDER)] * c for c in capacity]
+        phase_holder, bids, timed_out = _auction_phase(edges, slots, eps, deadline)
+        total_bids += bids
+        if timed_out:
+            break
+        holder = phase_holder  # only a completed phase replaces the previous answer
+        phases += 1
+
+    if timed_out and not phases:
+        holder = phase_holder  # partial, but better than nothing; the fill pass completes it
+
+    matches_: dict[str, list[InternMatchDetail]] = defaultdict(list)
+    remaining = capacity[:]
+    for intern_position, supervisor_position in enumerate(holder):
+        if supervisor_position != _NO_HOLDER:
+            remaining[supervisor_position] -= 1
+
+    unassigned = 0
+    cursor = 0  # first supervisor that may have room, for the fill past the deadline
+    for intern_position, intern in enumerate(interns):
+        supervisor_position = holder[intern_position]
+        if supervisor_position == _NO_HOLDER:
+            supervisor_position = best_with_room(edges[intern_position], remaining)
+            if supervisor_position == _NO_HOLDER and time.perf_counter() < deadline:
+                supervisor_position = first_with_room(intern, supervisors, remaining, method, weights)
+            elif supervisor_position == _NO_HOLDER:
+                # Out of time: any room will do, remaining only goes down
+                while cursor < len(remaining) and remaining[cursor] <= 0:
+                    cursor += 1
+                if cursor < len(remaining):
+                    supervisor_position = cursor
+                    timed_out = True
+            if supervisor_position == _NO_HOLDER:
+                unassigned += 1
+                continue
+            remaining[supervisor_position] -= 1
+
+        supervisor = supervisors[supervisor_position]
+        matches_[supervisor.id].append(
+            InternMatchDetail(
+                intern_id=intern.id,
+                similarity=profile_similarity(intern, supervisor, method, weights),
+            )
+        )
+
+    if stats is not None:
+        stats.candidate_pairs = sum(len(intern_edges) for intern_edges in edges)
+        stats.iterations = total_bids
+        stats.phases = phases
+        stats.timed_out = timed_out
+        stats.unassigned = unassigned
+
+    return dict(matches_)
+
+
+def best_with_room(intern_edges: list[tuple[float, int]], remaining: list[int]) -> int:
+    for _, position in sorted(intern_edges, reverse=True):
+        if remaining[position] > 0:
+            return position
+    return _NO_HOLDER
+
+
+def first_with_room(
+    intern: EncodedProfile,
+    supervisors: list[EncodedProfile],
+    remaining: list[int],
+    method: str,
+    weights: IdfWeights | None = None,
+) -> int:
+    """Best supervisor with room among all of them, for interns whose edges are all full."""
+    best_position, best_score = _NO_HOLDER, -1
+    for position, supervisor in enumerate(supervisors):
+        if remaining[position] <= 0:
+            continue
+        score = profile_similarity(intern, supervisor, method, weights)
+        if score > best_score:
+            best_position, best_score = position, score
+    return best_position
@@ -0,0 +1,209 @@
+"""
+Skill-embedding similarity, the ML matching path.
+
+Every skill is embedded once by a backend and kept in a `SkillVectorCache` keyed by
+skill id, in memory and in a dbm file per backend, so restarts and the other workers
+reuse the vectors and a model only ever runs on skills it has not seen. A profile is
+the normalised sum of its skill vectors, so the cosine of two profiles is a plain dot
+product. Vectors are stored packed as float32; a department's supervisor rows are
+unpacked once into tuples and scored with `math.sumprod`, which runs about five times
+faster over tuples than over a buffer it has to box element by element.
+
+Backends:
+
+    hashing                 signed feature hashing of words and character trigrams,
+                            deterministic and offline, similar spellings get close
+    sentence_transformers   a SentenceTransformer model (optional dependency),
+                            loaded on the first skill that needs embedding
+"""
+
+import dbm.sqlite3
+import hashlib
+import math
+import os
+import struct
+import threading
+from array import array
+from collections import defaultdict
+from itertools import repeat
+from typing import Iterable, Protocol
+
+from .common import InternMatchDetail
+from .settings import settings
+
+
+class EmbeddingBackend(Protocol):
+    name: str  # distinguishes the cache files, so vectors of different backends never mix
+
+    def embed(self, texts: list[str]) -> list[array]: ...
+
+
+def _normalised(vector: array) -> array:
+    norm = math.sqrt(math.sumprod(vector, vector))
+    if norm:
+        for position, value in enumerate(vector):
+            vector[position] = value / norm
+    return vector
+
+
+class HashingBackend:
+    __slots__ = ("name", "_dimension")
+
+    def __init__(self, dimension: int = 256):
+        self.name = f"hashing-{dimension}"
+        self._dimension = dimension
+
+    @staticmethod
+    def _features(text: str):
+        text = " ".join(text.lower().split())
+        for word in text.split():
+            yield f"w:{word}"
+        padded = f" {text} "
+        for start in range(len(padded) - 2):
+            yield f"c:{padded[start:start + 3]}"
+
+    def embed(self, texts: list[str]) -> list[array]:
+        vectors = []
+        for text in texts:
+            vector = array("f", bytes(4 * self._dimension))
+            for feature in self._features(text):
+                hashed = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                # The top bit signs the feature, so collisions cancel out instead of piling up
+                vector[hashed % self._dimension] += -1.0 if hashed >> 63 else 1.0
+            vectors.append(_normalised(vector))
+        return vectors
+
+
+class SentenceTransformerBackend:
+    __slots__ = ("name",)
+
+    def __init__(self, model_name: str):
+        self.name = f"sentence-transformers-{model_name.replace('/', '-')}"
+
+    def embed(self, texts: list[str]) -> list[array]:
+        from .matching_ml_model import get_model
+
+        encoded = get_model().encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return [array("f", vector.astype("float32").tobytes()) for vector in encoded]
+
+
+class SkillVectorCache:
+    """
+    Vectors by skill id. Lookups only read the file for ids not in memory yet; thread
+    safe, as embedding runs off the event loop. `dimension` is read off the vectors
+    themselves, so the web process never loads a model just to learn it.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, path: str | None = None):
+        self.backend = backend
+        self.path = path and f"{path}.{backend.name}"
+        self.vectors: dict[str, array] = {}
+        self.dimension: int | None = None  # None until a vector is known
+        self._lock = threading.Lock()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        return dbm.sqlite3.open(self.path, "c")
+
+    def missing(self, skill_ids: Iterable[str]) -> set[str]:
+        """Ids without a vector, after loading the stored ones into memory."""
+        with self._lock:
+            missing = {skill_id for skill_id in skill_ids if skill_id not in self.vectors}
+            if missing and self.path:
+                with self._open() as db:
+                    for skill_id in list(missing):
+                        if (stored := db.get(skill_id)) is not None:
+                            vector = self.vectors[skill_id] = array("f", stored)
+                            self.dimension = len(vector)
+                            missing.discard(skill_id)
+            return missing
+
+    def add(self, names: dict[str, str]) -> None:
+        """Embeds skills (id -> name) in one batch and stores their vectors."""
+        if not names:
+            return
+        skill_ids = list(names)
+        self.store(dict(zip(skill_ids, self.backend.embed([names[skill_id] for skill_id in skill_ids]))))
+
+    def store(self, vectors: dict[str, array]) -> None:
+        """Keeps vectors embedded elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self.vectors.update(vectors)
+            if vectors:
+                self.dimension = len(next(iter(vectors.values())))
+            if self.path:
+                with self._open() as db:
+                    for skill_id, vector in vectors.items():
+                        db[skill_id] = vector.tobytes()
+
+
+def profile_vector(skill_ids: Iterable, vectors: dict[str, array], dimension: int) -> array:
+    """Normalised sum of the skills' vectors, all zeros without any known skill."""
+    total = [0.0] * dimension  # summed in double precision, stored in single
+    for skill_id in skill_ids:
+        if (vector := vectors.get(str(skill_id))) is not None:
+            for position, value in enumerate(vector):
+                total[position] += value
+    return _normalised(array("f", total))
+
+
+def unpack_rows(matrix: array | bytes, dimension: int) -> list[tuple[float, ...]]:
+    """The rows of a packed float32 matrix, to be scored many times."""
+    return list(struct.iter_unpack(f"={dimension}f", matrix))
+
+
+def cosine_scores(query: tuple[float, ...], rows: list[tuple[float, ...]]) -> list[float]:
+    """Cosine of a normalised vector with every (normalised) row."""
+    return list(map(math.sumprod, repeat(query, len(rows)), rows))
+
+
+def match_by_embeddings(
+    supervisors_details: list[dict], interns_details: list[dict], vectors: dict[str, array], dimension: int
+) -> dict[str, dict[str, list[InternMatchDetail]]]:
+    """
+    Greedy matching by profile cosine, department by department: every intern gets
+    the supervisor closest to it, the earliest on ties. Same input and output as
+    `run_matching`, with skill ids as skills.
+    """
+    by_dept: dict[str, tuple[list[dict], list[dict]]] = defaultdict(lambda: ([], []))
+    for supervisor in supervisors_details:
+        by_dept[supervisor["department"]][0].append(supervisor)
+    for intern in interns_details:
+        by_dept[intern["department"]][1].append(intern)
+
+    results = {}
+    for dept, (supervisors, interns) in by_dept.items():
+        matches_ = results[dept] = defaultdict(list)
+        if not supervisors:
+            continue
+        matrix = array("f")
+        for supervisor in supervisors:
+            matrix.extend(profile_vector(supervisor["skills"], vectors, dimension))
+        rows = unpack_rows(matrix, dimension)
+
+        best_by_skills: dict[frozenset, tuple[str, float]] = {}  # interns with the same skills score alike
+        for intern in interns:
+            skills = frozenset(map(str, intern["skills"]))
+            if (best := best_by_skills.get(skills)) is None:
+                scores = cosine_scores(tuple(profile_vector(skills, vectors, dimension)), rows)
+                position = max(range(len(scores)), key=scores.__getitem__)
+                best = best_by_skills[skills] = (supervisors[position]["id"], scores[position])
+            supervisor_id, score = best
+            matches_[supervisor_id].append(InternMatchDetail(intern_id=intern["id"], similarity=score))
+
+    return {dept: dict(matches_) for dept, matches_ in results.items()}
+
+
+_skill_vectors: SkillVectorCache | None = None
+
+
+def get_skill_vectors() -> SkillVectorCache:
+    """The process's cache for the configured backend, created on first use."""
+    global _skill_vectors
+    if _skill_vectors is None:
+        if settings.EMBEDDING_BACKEND == "sentence_transformers":
+            backend = SentenceTransformerBackend(settings.EMBEDDING_MODEL)
+        else:
+            backend = HashingBackend(settings.EMBEDDING_DIMENSION)
+        _skill_vectors = SkillVectorCache(backend, settings.EMBEDDING_CACHE_PATH or None)
+    return _skill_vectors
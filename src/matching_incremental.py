@@ -0,0 +1,401 @@
+"""
+Warm matching snapshot and incremental greedy matching.
+
+The snapshot holds every supervisor and verified unmatched intern as an encoded
+profile (id, skill bitset) per department, plus the supervisors' intern counts, so
+matching and recommendations run without loading people from the database.
+
+Per department it also keeps every unmatched intern's best supervisor and score so
+that a change only touches the affected row or column of the score table:
+
+    - an intern registers / changes skills / gets unmatched  -> rescore that intern, O(supervisors)
+    - an intern gets matched                                  -> drop its row, O(1)
+    - a supervisor registers / changes skills                 -> rescore that column, O(interns)
+
+Services apply their change right after they commit, tagged with the data version
+their transaction bumped to. The snapshot is per process: a version it skipped
+means another process changed something, and the next sync reloads it. A
+reconciliation job compares it with the database every MATCHING_RECONCILE_SECONDS.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .common import InternMatchDetail, UserType
+from .db import SessionLocal
+from .logger import logger
+from .matching import (
+    EncodedProfile,
+    IdfWeights,
+    SkillIndex,
+    SkillVocabulary,
+    best_supervisor,
+    bitset_similarity,
+    department_key,
+    match_encoded,
+    rows_to_matching_details,
+    top_supervisors,
+)
+from .models.app_models import User
+from .repositories.intern_repo import InternRepository
+from .repositories.matching_repo import MatchingRepository
+from .repositories.supervisor_repo import SupervisorRepository
+from .settings import settings
+
+
+class DepartmentScoreTable:
+    """
+    Cached greedy result of one department: the best (supervisor position, score) of
+    every intern. IDF weights move with every profile of the department, so with the
+    "idf" method nothing is cached per row: the weights are rebuilt on the first use
+    after a change and `matches` solves the department afresh.
+    """
+
+    __slots__ = ("method", "index", "positions", "interns", "best", "_weights")
+
+    def __init__(self, method: str = "jaccard", supervisors: list[EncodedProfile] | None = None):
+        self.method = method
+        self.index = SkillIndex(supervisors or [])
+        self.positions: dict[str, int] = {s.id: position for position, s in enumerate(self.index.supervisors)}
+        self.interns: dict[str, EncodedProfile] = {}
+        self.best: dict[str, tuple[int, float]] = {}
+        self._weights: IdfWeights | None = None
+
+    @property
+    def supervisors(self) -> list[EncodedProfile]:
+        return self.index.supervisors
+
+    @property
+    def weights(self) -> IdfWeights | None:
+        if self.method == "idf" and self._weights is None:
+            self._weights = IdfWeights(self.supervisors + list(self.interns.values()))
+        return self._weights
+
+    def _rescore_row(self, intern: EncodedProfile) -> None:
+        self._weights = None
+        if not self.supervisors or self.method == "idf":
+            return
+        supervisor_id, score = best_supervisor(intern, self.index, self.method)
+        self.best[intern.id] = (self.positions[supervisor_id], score)
+
+    def upsert_intern(self, intern: EncodedProfile) -> None:
+        self.interns[intern.id] = intern
+        self._rescore_row(intern)
+
+    def remove_intern(self, intern_id: str) -> None:
+        self.interns.pop(intern_id, None)
+        self.best.pop(intern_id, None)
+        self._weights = None
+
+    def upsert_supervisor(self, supervisor: EncodedProfile) -> None:
+        position = self.positions.setdefault(supervisor.id, len(self.supervisors))
+        self.index.put(position, supervisor)
+        self._weights = None
+        if self.method == "idf":
+            return
+
+        for intern_id, intern in self.interns.items():
+            current = self.best.get(intern_id)
+            if current is None or current[0] == position:
+                # No supervisor before, or this one was the best and its score may have dropped
+                self._rescore_row(intern)
+                continue
+            score = bitset_similarity(intern.bits, intern.size, supervisor.bits, supervisor.size, self.method)
+            if score > current[1] or (score == current[1] and position < current[0]):
+                self.best[intern_id] = (position, score)
+
+    def remove_supervisor(self, supervisor_id: str) -> None:
+        if supervisor_id not in self.positions:
+            return
+        # Rare (department moves); positions shift, so rebuild the whole table
+        self.index = SkillIndex([s for s in self.supervisors if s.id != supervisor_id])
+        self.positions = {s.id: position for position, s in enumerate(self.supervisors)}
+        self.best.clear()
+        self._weights = None
+        for intern in self.interns.values():
+            self._rescore_row(intern)
+
+    def matches(self) -> dict[str, list[InternMatchDetail]]:
+        if self.method == "idf":
+            return match_encoded(self.supervisors, list(self.interns.values()), "idf", self.index, self.weights)
+        matches_ = defaultdict(list)
+        for intern_id in self.interns:
+            if (best := self.best.get(intern_id)) is not None:
+                position, score = best
+                matches_[self.supervisors[position].id].append(
+                    InternMatchDetail(intern_id=intern_id, similarity=score)
+                )
+        return dict(matches_)
+
+
+class IncrementalMatcher:
+    __slots__ = (
+        "method",
+        "vocabulary",
+        "departments",
+        "intern_counts",
+        "loaded",
+        "data_version",
+        "_intern_departments",
+        "_supervisor_departments",
+        "_lock",
+    )
+
+    def __init__(self, method: str = "jaccard"):
+        self.method = method
+        self.vocabulary = SkillVocabulary()
+        self.departments: dict[str, DepartmentScoreTable] = defaultdict(
+            lambda: DepartmentScoreTable(self.method)
+        )
+        self.intern_counts: dict[str, int] = {}
+        self.loaded = False
+        self.data_version: int | None = None
+        self._intern_departments: dict[str, str] = {}
+        self._supervisor_departments: dict[str, str] = {}
+        self._lock = asyncio.Lock()
+
+    def _encode(self, person: dict) -> EncodedProfile:
+        bits = self.vocabulary.encode(person["skills"])
+        return EncodedProfile(person["id"], bits, bits.bit_count())
+
+    def _advance(self, data_version: int | None) -> bool:
+        """
+        Whether a change committed at `data_version` should be applied. None applies
+        unconditionally (in-memory use). A version already covered by the last load is
+        skipped, a gap means a change was missed and drops the snapshot until the next sync.
+        """
+        if not self.loaded:
+            return False
+        if data_version is None:
+            return True
+        if data_version <= self.data_version:
+            return False
+        if data_version != self.data_version + 1:
+            logger.info(
+                f"Matching snapshot at version {self.data_version} missed changes up to {data_version}, reloading"
+            )
+            self.loaded = False
+            return False
+        self.data_version = data_version
+        return True
+
+    def apply_users(self, users: Iterable[User], data_version: int | None = None) -> None:
+        """Registration or skill changes of `users`, loaded with `UserRepository.get_users_for_matching`."""
+        if self._advance(data_version):
+            for user in users:
+                self._apply_user(user)
+
+    def interns_matched(self, assignments: Iterable[tuple[str, str]], data_version: int | None = None) -> None:
+        """(intern id, supervisor id) pairs that got matched."""
+        if self._advance(data_version):
+            for intern_id, supervisor_id in assignments:
+                self._remove_intern(str(intern_id))
+                supervisor_id = str(supervisor_id)
+                self.intern_counts[supervisor_id] = self.intern_counts.get(supervisor_id, 0) + 1
+
+    def intern_unmatched(self, intern: dict, supervisor_id: str, data_version: int | None = None) -> None:
+        if self._advance(data_version):
+            supervisor_id = str(supervisor_id)
+            self.intern_counts[supervisor_id] = max(self.intern_counts.get(supervisor_id, 0) - 1, 0)
+            self.upsert_intern(intern)
+
+    def _remove_intern(self, intern_id: str) -> None:
+        if (dept := self._intern_departments.pop(intern_id, None)) is not None:
+            self.departments[dept].remove_intern(intern_id)
+
+    def upsert_intern(self, intern: dict) -> None:
+        self._remove_intern(intern["id"])
+        self._intern_departments[intern["id"]] = intern["department"]
+        self.departments[intern["department"]].upsert_intern(self._encode(intern))
+
+    def upsert_supervisor(self, supervisor: dict) -> None:
+        previous = self._supervisor_departments.get(supervisor["id"])
+        if previous is not None and previous != supervisor["department"]:
+            self.departments[previous].remove_supervisor(supervisor["id"])
+        self._supervisor_departments[supervisor["id"]] = supervisor["department"]
+        self.intern_counts.setdefault(supervisor["id"], supervisor.get("intern_count", 0))
+        self.departments[supervisor["department"]].upsert_supervisor(self._encode(supervisor))
+
+    def load(
+        self, supervisors_details: list[dict], interns_details: list[dict], data_version: int | None = None
+    ) -> None:
+        self.vocabulary = SkillVocabulary()
+        self.departments.clear()
+        self.intern_counts.clear()
+        self._intern_departments.clear()
+        self._supervisor_departments.clear()
+
+        # Supervisors first so every intern is scored once, against the full column set
+        supervisors_by_dept: dict[str, list[EncodedProfile]] = defaultdict(list)
+        for supervisor in supervisors_details:
+            self._supervisor_departments[supervisor["id"]] = supervisor["department"]
+            self.intern_counts[supervisor["id"]] = supervisor.get("intern_count", 0)
+            supervisors_by_dept[supervisor["department"]].append(self._encode(supervisor))
+        for dept, supervisors in supervisors_by_dept.items():
+            self.departments[dept] = DepartmentScoreTable(self.method, supervisors)
+
+        for intern in interns_details:
+            self.upsert_intern(intern)
+        self.data_version = data_version
+        self.loaded = True
+
+    def _apply_user(self, user: User) -> None:
+        dept = department_key(user.department_id)
+        skills = [skill.id for skill in user.skills]  # the same keys as the matching rows
+        if user.type == UserType.SUPERVISOR and user.supervisor:
+            self.upsert_supervisor({"id": str(user.supervisor.id), "department": dept, "skills": skills})
+        elif user.type == UserType.INTERN and user.intern:
+            intern_id = str(user.intern.id)
+            if user.verified and user.intern.supervisor_id is None:
+                self.upsert_intern({"id": intern_id, "department": dept, "skills": skills})
+            else:
+                self._remove_intern(intern_id)
+
+    async def _load_rows(
+        self, conn: AsyncSession, supervisor_repo: SupervisorRepository, intern_repo: InternRepository
+    ) -> tuple[list[dict], list[dict]]:
+        supervisor_rows = await supervisor_repo.get_supervisor_matching_rows(conn=conn)
+        intern_rows = await intern_repo.get_unmatched_intern_matching_rows(conn=conn)
+        return rows_to_matching_details(supervisor_rows, intern_rows)
+
+    async def sync(
+        self,
+        conn: AsyncSession,
+        supervisor_repo: SupervisorRepository,
+        intern_repo: InternRepository,
+        matching_repo: MatchingRepository,
+    ) -> None:
+        """Reloads the snapshot unless it is at the current data version (a single key lookup)."""
+        async with self._lock:
+            # Read before the rows: rows newer than the version only cause one more reload
+            data_version = await matching_repo.get_data_version(conn=conn)
+            if self.loaded and data_version == self.data_version:
+                return
+            self.load(*await self._load_rows(conn, supervisor_repo, intern_repo), data_version=data_version)
+
+    def _fingerprint(self) -> dict[tuple[str, str], tuple]:
+        fingerprint = {}
+        for dept, table in self.departments.items():
+            for supervisor in table.supervisors:
+                fingerprint["supervisor", supervisor.id] = (dept, supervisor.bits, self.intern_counts.get(supervisor.id, 0))
+            for intern in table.interns.values():
+                fingerprint["intern", intern.id] = (dept, intern.bits)
+        return fingerprint
+
+    async def reconcile(
+        self,
+        conn: AsyncSession,
+        supervisor_repo: SupervisorRepository,
+        intern_repo: InternRepository,
+        matching_repo: MatchingRepository,
+    ) -> int:
+        """
+        Compares the snapshot with the database and reloads it on any difference.
+        Returns how many supervisors and interns had drifted although no change was
+        missed, which points at a write path that does not report its changes.
+        """
+        async with self._lock:
+            data_version = await matching_repo.get_data_version(conn=conn)
+            supervisors_details, interns_details = await self._load_rows(conn, supervisor_repo, intern_repo)
+            if await matching_repo.get_data_version(conn=conn) != data_version:
+                return 0  # changed while reading, the next sync or round catches up
+
+            if not self.loaded or data_version != self.data_version:
+                self.load(supervisors_details, interns_details, data_version=data_version)
+                return 0
+
+            expected = {
+                ("supervisor", s["id"]): (s["department"], self.vocabulary.encode(s["skills"]), s["intern_count"])
+                for s in supervisors_details
+            }
+            expected.update(
+                (("intern", i["id"]), (i["department"], self.vocabulary.encode(i["skills"])))
+                for i in interns_details
+            )
+            actual = self._fingerprint()
+            drifted = len(expected.keys() ^ actual.keys()) + sum(
+                1 for key in expected.keys() & actual.keys() if expected[key] != actual[key]
+            )
+            if drifted:
+                self.load(supervisors_details, interns_details, data_version=data_version)
+            return drifted
+
+    def partitions(self) -> dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]]:
+        """The snapshot as `partition_by_department` would encode it, for the other strategies."""
+        return {
+            dept: (list(table.supervisors), list(table.interns.values()))
+            for dept, table in self.departments.items()
+            if table.supervisors or table.interns
+        }
+
+    def loads(self) -> dict[str, int]:
+        """Interns every supervisor already has."""
+        return {
+            supervisor_id: self.intern_counts.get(supervisor_id, 0)
+            for supervisor_id in self._supervisor_departments
+        }
+
+    def capacities(self, capacity: int) -> dict[str, int]:
+        """Free slots of every supervisor, as `supervisor_capacities` computes them."""
+        return {supervisor_id: capacity - load for supervisor_id, load in self.loads().items()}
+
+    def cached_intern(self, intern_id: str) -> tuple[str, EncodedProfile] | None:
+        """(department, profile) of an intern waiting for a match, None for anyone else."""
+        if (dept := self._intern_departments.get(intern_id)) is None:
+            return None
+        return dept, self.departments[dept].interns[intern_id]
+
+    def encode_intern(self, intern_id: str, skills: list) -> EncodedProfile:
+        return self._encode({"id": intern_id, "skills": skills})
+
+    def recommend(self, department: str, intern: EncodedProfile, k: int) -> list[tuple[str, float]]:
+        """The k best (supervisor id, similarity) of the department, best first, off the warm index."""
+        table = self.departments.get(department)
+        if table is None or not table.supervisors:
+            return []
+        best = top_supervisors(intern, table.index, self.method, k, weights=table.weights)
+        best.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [(table.supervisors[position].id, score) for score, position in best]
+
+    def matches(self) -> dict[str, dict[str, list[InternMatchDetail]]]:
+        return {
+            dept: table.matches()
+            for dept, table in self.departments.items()
+            if table.interns
+        }
+
+
+incremental_matcher = IncrementalMatcher(settings.MATCHING_METHOD)
+
+
+def _repositories() -> dict:
+    return {
+        "supervisor_repo": SupervisorRepository(),
+        "intern_repo": InternRepository(),
+        "matching_repo": MatchingRepository(),
+    }
+
+
+async def load_snapshot() -> None:
+    """Warms the snapshot at startup. A failure is only logged, the first matching call loads it then."""
+    try:
+        async with SessionLocal() as session, session.begin():
+            await incremental_matcher.sync(conn=session, **_repositories())
+    except Exception as exc:
+        logger.error(f"Could not load the matching snapshot: {exc}")
+
+
+async def reconcile_periodically(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with SessionLocal() as session, session.begin():
+                drifted = await incremental_matcher.reconcile(conn=session, **_repositories())
+        except Exception as exc:
+            logger.error(f"Matching snapshot reconciliation failed: {exc}")
+            continue
+        if drifted:
+            logger.warning(f"Matching snapshot had drifted on {drifted} people and was reloaded")
@@ -0,0 +1,199 @@
+"""
+Approximate candidate generation with MinHash and locality-sensitive hashing.
+
+Every skill bitset gets a MinHash signature of `bands * rows` values: the probability
+that two signatures agree on a value equals the Jaccard similarity of the two sets.
+Supervisors are bucketed on every band (a slice of `rows` values), and an intern's
+candidates are the supervisors sharing at least one whole band with it. A pair with
+Jaccard s shares a given band with probability s**rows, so the number of bands a
+supervisor shares with the intern estimates their similarity. Candidates are
+rescored exactly, the ones sharing the most bands first, `rescore` of them or so:
+more bands sharpen the estimate, a larger `rescore` raises recall, and both cost
+latency. `benchmarks/bench_lsh_recall.py` measures the trade-off; the defaults are
+the cheapest setting measured above 95% recall on the 10k and 100k synthetic cohorts.
+
+Signatures are built without hashing per person: every skill position gets its
+vector of hash values once per process (skill positions come from one vocabulary for
+every department), and a signature is the element-wise min over the vectors of the
+person's skills. Band collisions are counted for all supervisors at once with the
+same bit-sliced counters as `SkillIndex.overlap_levels`. Candidates sharing as many
+bands are rescored together, so `rescore` is a floor, not a cap.
+"""
+
+import heapq
+import random
+from collections import defaultdict
+from functools import lru_cache
+
+from .common import InternMatchDetail
+from .matching import EncodedProfile, IdfWeights, SkillIndex, best_supervisor, iter_bits, profile_similarity
+
+DEFAULT_BANDS = 32
+DEFAULT_ROWS = 1
+DEFAULT_RESCORE = 16
+_PRIME = (1 << 61) - 1
+
+
+class MinHasher:
+    __slots__ = ("bands", "rows", "_coefficients", "_vectors")
+
+    def __init__(self, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS, seed: int = 1):
+        self.bands = bands
+        self.rows = rows
+        rng = random.Random(seed)
+        self._coefficients = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(bands * rows)
+        ]
+        self._vectors: dict[int, tuple[int, ...]] = {}
+
+    def _vector(self, skill: int) -> tuple[int, ...]:
+        if (vector := self._vectors.get(skill)) is None:
+            vector = self._vectors[skill] = tuple((a * skill + b) % _PRIME for a, b in self._coefficients)
+        return vector
+
+    def signature(self, skill_bits: int) -> tuple[int, ...] | None:
+        """None for an empty skill set, which has no meaningful signature."""
+        vectors = [self._vector(skill) for skill in iter_bits(skill_bits)]
+        if not vectors:
+            return None
+        if len(vectors) == 1:
+            return vectors[0]
+        return tuple(map(min, *vectors))
+
+    def band_keys(self, signature: tuple[int, ...]):
+        """One bucket key per band, in band order."""
+        rows = self.rows
+        if rows == 1:
+            return signature
+        return [signature[start:start + rows] for start in range(0, len(signature), rows)]
+
+
+@lru_cache(maxsize=8)
+def shared_hasher(bands: int, rows: int) -> MinHasher:
+    """One hasher per setting and process, so the skill vectors are hashed only once."""
+    return MinHasher(bands, rows)
+
+
+class LshIndex:
+    """Band buckets of a department's supervisors: per band, band key -> bitmask of positions."""
+
+    __slots__ = ("supervisors", "hasher", "_buckets", "_everyone")
+
+    def __init__(self, supervisors: list[EncodedProfile], hasher: MinHasher | None = None):
+        self.supervisors = supervisors
+        self.hasher = hasher or shared_hasher(DEFAULT_BANDS, DEFAULT_ROWS)
+        self._buckets: list[dict] = [defaultdict(int) for _ in range(self.hasher.bands)]
+        self._everyone = (1 << len(supervisors)) - 1
+        for position, supervisor in enumerate(supervisors):
+            if (signature := self.hasher.signature(supervisor.bits)) is not None:
+                bit = 1 << position
+                for buckets, key in zip(self._buckets, self.hasher.band_keys(signature)):
+                    buckets[key] |= bit
+
+    def candidate_mask(self, skill_bits: int) -> int:
+        mask = 0
+        if (signature := self.hasher.signature(skill_bits)) is not None:
+            for buckets, key in zip(self._buckets, self.hasher.band_keys(signature)):
+                mask |= buckets.get(key, 0)
+        return mask
+
+    def ranked_candidates(self, skill_bits: int):
+        """Yields (bands shared, bitmask of supervisor positions), from the most bands down to 1."""
+        if (signature := self.hasher.signature(skill_bits)) is None:
+            return
+        levels: list[int] = []
+        for buckets, key in zip(self._buckets, self.hasher.band_keys(signature)):
+            carry = buckets.get(key, 0)
+            for k, level in enumerate(levels):
+                levels[k] = level ^ carry
+                carry &= level
+                if not carry:
+                    break
+            if carry:
+                levels.append(carry)
+
+        for shared in range(min((1 << len(levels)) - 1, self.hasher.bands), 0, -1):
+            mask = self._everyone
+            for k, level in enumerate(levels):
+                mask &= level if shared >> k & 1 else ~level
+                if not mask:
+                    break
+            if mask:
+                yield shared, mask
+
+    def rescore_mask(self, skill_bits: int, rescore: int = DEFAULT_RESCORE) -> int:
+        """Bitmask of the candidates sharing the most bands, whole groups until there are `rescore` of them."""
+        mask = 0
+        for _, group in self.ranked_candidates(skill_bits):
+            mask |= group
+            if mask.bit_count() >= rescore:
+                break
+        return mask
+
+    def top_candidates(
+        self,
+        intern: EncodedProfile,
+        k: int,
+        method: str = "jaccard",
+        weights: IdfWeights | None = None,
+        rescore: int = DEFAULT_RESCORE,
+    ) -> list[tuple[float, int]]:
+        """The k best (exact similarity, supervisor position) among the rescored candidates, earliest first on ties."""
+        supervisors = self.supervisors
+        scored = [
+            (profile_similarity(intern, supervisors[position], method, weights), -position)
+            for position in iter_bits(self.rescore_mask(intern.bits, max(rescore, k)))
+        ]
+        return [(score, -negated) for score, negated in heapq.nlargest(k, scored)]
+
+    def best_candidate(
+        self,
+        intern: EncodedProfile,
+        method: str = "jaccard",
+        weights: IdfWeights | None = None,
+        rescore: int = DEFAULT_RESCORE,
+    ) -> tuple[int, float]:
+        """top_candidates(intern, 1) without the heap, this runs once per intern. (-1, -1) without candidates."""
+        supervisors = self.supervisors
+        mask = self.rescore_mask(intern.bits, rescore)
+        best_position, best_score = -1, -1
+        while mask:  # lowest position first, so only a strictly better score replaces the best
+            lowest = mask & -mask
+            mask ^= lowest
+            position = lowest.bit_length() - 1
+            score = profile_similarity(intern, supervisors[position], method, weights)
+            if score > best_score:
+                best_position, best_score = position, score
+        return best_position, best_score
+
+
+def match_lsh(
+    supervisors: list[EncodedProfile],
+    interns: list[EncodedProfile],
+    method: str = "jaccard",
+    bands: int = DEFAULT_BANDS,
+    rows: int = DEFAULT_ROWS,
+    rescore: int = DEFAULT_RESCORE,
+    index: SkillIndex | None = None,
+    weights: IdfWeights | None = None,
+) -> dict[str, list[InternMatchDetail]]:
+    """
+    Approximate greedy matching: every intern gets the best of its LSH candidates,
+    scored exactly. Interns without any candidate (nothing similar enough, or no
+    skills) fall back to the exact search, so nobody is left out.
+    """
+    if not supervisors:
+        return {}
+
+    lsh = LshIndex(supervisors, shared_hasher(bands, rows))
+    matches_ = defaultdict(list)
+    for intern in interns:
+        position, score = lsh.best_candidate(intern, method, weights, rescore)
+        if position >= 0:
+            supervisor_id = supervisors[position].id
+        else:
+            index = index or SkillIndex(supervisors)
+            supervisor_id, score = best_supervisor(intern, index, method, weights)
+        matches_[supervisor_id].append(InternMatchDetail(intern_id=intern.id, similarity=score))
+
+    return dict(matches_)
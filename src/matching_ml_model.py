@@ -1,10 +1,13 @@
-# from sentence_transformers import SentenceTransformer
+from .settings import settings
 
-# _model = None
+_model = None
 
-# def get_model():
-#     global _model
-#     if _model is None:
-#         # Loads once at runtime, not during deployment
-#         _model = SentenceTransformer("all-MiniLM-L6-v2")
-#     return _model
+
+def get_model():
+    global _model
+    if _model is None:
+        # Loads once at runtime, not during deployment; sentence-transformers is optional
+        from sentence_transformers import SentenceTransformer
+
+        _model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    return _model
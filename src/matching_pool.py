@@ -0,0 +1,165 @@
+"""
+Runs department matching in a process pool so the CPU-bound solvers neither block
+the event loop nor stay on one core.
+
+Only the encoded department partitions (ids and skill bitsets) and the results
+(supervisor id -> InternMatchDetail list) cross the process boundary; ORM objects
+never leave the request's process. Matching by skill embeddings goes the same way,
+with each department sent only the vectors of its own skills.
+"""
+
+import asyncio
+import os
+import threading
+from array import array
+from collections import defaultdict
+from typing import Awaitable, Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from .common import InternMatchDetail
+from .logger import logger
+from .matching import (
+    EncodedProfile,
+    SolverStats,
+    match_department,
+    match_partitions,
+)
+from .matching_embeddings import EmbeddingBackend, match_by_embeddings
+from .settings import settings
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def pool_size() -> int:
+    return settings.MATCHING_WORKERS or os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the parent runs an event loop and DB connections
+            _pool = ProcessPoolExecutor(
+                max_workers=pool_size(),
+                mp_context=get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _discard_broken_pool(broken: ProcessPoolExecutor) -> None:
+    """
+    Drops `broken` so the next call starts a fresh pool. Concurrent callers that saw
+    the same failure find it already swapped out and leave the pool that replaced it
+    alone; the broken one is shut down once, without waiting on the event loop.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not broken:
+            return
+        _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_partitions_in_pool(
+    partitions: dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]],
+    method: str = "jaccard",
+    strategy: str = "greedy",
+    capacities: dict[str, int] | None = None,
+    stats: list[SolverStats] | None = None,
+    on_department: Callable[[SolverStats], Awaitable[None]] | None = None,
+):
+    """
+    `match_partitions` with every department solved in its own worker process.
+    `on_department` is awaited with each department's stats as soon as it is solved.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pool()
+
+    async def solve(dept, supervisors_, interns_):
+        result = await loop.run_in_executor(
+            pool,
+            match_department,
+            dept,
+            supervisors_,
+            interns_,
+            method,
+            strategy,
+            capacities and {s.id: capacities[s.id] for s in supervisors_},
+        )
+        if on_department is not None:
+            await on_department(result[1])
+        return result
+
+    try:
+        department_results = await asyncio.gather(*(
+            solve(dept, supervisors_, interns_) for dept, (supervisors_, interns_) in partitions.items()
+        ))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM killed); replace the pool and still answer the request
+        logger.error("Matching process pool is broken, running this matching in a thread")
+        _discard_broken_pool(pool)
+        thread_stats: list[SolverStats] = []
+        results = await asyncio.to_thread(
+            match_partitions, partitions, method, strategy, capacities, thread_stats
+        )
+        for dept_stats in thread_stats:
+            if stats is not None:
+                stats.append(dept_stats)
+            if on_department is not None:
+                await on_department(dept_stats)
+        return results
+
+    results = {}
+    for dept, (matches_, dept_stats) in zip(partitions, department_results):
+        results[dept] = matches_
+        if stats is not None:
+            stats.append(dept_stats)
+    return results
+
+
+async def _run_in_pool(fn: Callable, *args):
+    """`fn(*args)` in a worker process, or in a thread once the pool is broken."""
+    pool = get_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        logger.error("Matching process pool is broken, running this call in a thread")
+        _discard_broken_pool(pool)
+        return await asyncio.to_thread(fn, *args)
+
+
+async def embed_in_pool(backend: EmbeddingBackend, texts: list[str]) -> list[array]:
+    """The backend's embeddings of `texts`, computed in a worker process (a model loads there once)."""
+    return await _run_in_pool(backend.embed, texts)
+
+
+async def match_by_embeddings_in_pool(
+    supervisors_details: list[dict], interns_details: list[dict], vectors: dict[str, array], dimension: int
+) -> dict[str, dict[str, list[InternMatchDetail]]]:
+    """`match_by_embeddings` with every department solved in its own worker process."""
+    by_dept: dict[str, tuple[list[dict], list[dict]]] = defaultdict(lambda: ([], []))
+    for supervisor in supervisors_details:
+        by_dept[supervisor["department"]][0].append(supervisor)
+    for intern in interns_details:
+        by_dept[intern["department"]][1].append(intern)
+
+    async def solve(supervisors_: list[dict], interns_: list[dict]):
+        skill_ids = {str(skill) for person in supervisors_ + interns_ for skill in person["skills"]}
+        department_vectors = {skill_id: vectors[skill_id] for skill_id in skill_ids if skill_id in vectors}
+        return await _run_in_pool(match_by_embeddings, supervisors_, interns_, department_vectors, dimension)
+
+    results = {}
+    for department_results in await asyncio.gather(*(solve(*people) for people in by_dept.values())):
+        results.update(department_results)
+    return results
@@ -0,0 +1,300 @@
+"""
+What-if matching over a frozen copy of the matching inputs.
+
+A sandbox takes the encoded department partitions and supervisor loads once.
+A scenario (another method, a capacity cap, per-supervisor caps, supervisors
+moving department or leaving, interns leaving) is an overlay: only the departments
+it touches get new partitions, every other department keeps sharing the baseline's
+and its solved result is reused from a memo. Trying a scenario therefore only
+solves what changed, entirely in memory, and it is reported as a diff against the
+baseline. `plan` and `settle` split a run around the solving, so the caller can
+solve the departments left in a process pool; `run` solves them in place.
+
+A sandbox is persisted as `dump()` and rebuilt with `load()`, so any worker can run
+the scenarios of a sandbox another one created; rebuilding does not solve the
+baseline again.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import NamedTuple
+
+from .common import InternMatchDetail
+from .matching import EncodedProfile, match_department
+
+Partition = tuple[tuple[EncodedProfile, ...], tuple[EncodedProfile, ...]]
+
+_MEMO_LIMIT = 1024
+
+
+class ScenarioPlan(NamedTuple):
+    results: dict[str, dict[str, list[InternMatchDetail]]]  # departments found in the memo
+    unsolved: dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]]
+    capacities: dict[str, int] | None  # of the unsolved departments' supervisors
+    memo_keys: dict[str, tuple]  # unsolved departments whose result is worth memoising
+
+
+@dataclass(frozen=True)
+class Scenario:
+    method: str = "jaccard"
+    capacity: int | None = None  # None is the greedy strategy, any cap the capacity strategy
+    capacity_strategy: str = "assignment"
+    supervisor_capacities: dict[str, int] = field(default_factory=dict)  # overrides capacity
+    moves: dict[str, str] = field(default_factory=dict)  # supervisor id -> department
+    removed_supervisors: frozenset[str] = frozenset()
+    removed_interns: frozenset[str] = frozenset()
+
+    @property
+    def strategy(self) -> str:
+        return "greedy" if self.capacity is None else self.capacity_strategy
+
+
+class MatchingSandbox:
+    __slots__ = ("partitions", "loads", "baseline_scenario", "baseline", "_supervisor_departments",
+                 "_intern_departments", "_memo")
+
+    def __init__(
+        self,
+        partitions: dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]],
+        loads: dict[str, int],
+        baseline_scenario: Scenario,
+        baseline: dict[str, dict[str, list[InternMatchDetail]]] | None = None,
+        solve: bool = True,
+    ):
+        self.partitions: dict[str, Partition] = {
+            dept: (tuple(supervisors), tuple(interns)) for dept, (supervisors, interns) in partitions.items()
+        }
+        self.loads = dict(loads)
+        self._supervisor_departments = {
+            s.id: dept for dept, (supervisors, _) in self.partitions.items() for s in supervisors
+        }
+        self._intern_departments = {
+            i.id: dept for dept, (_, interns) in self.partitions.items() for i in interns
+        }
+        self._memo: dict[tuple, dict[str, list[InternMatchDetail]]] = {}
+        self.baseline_scenario = baseline_scenario
+        if baseline is not None:
+            # Already solved: the baseline departments are where later scenarios hit the memo
+            for dept, (supervisors, _) in self.partitions.items():
+                capacities = self._capacities(baseline_scenario, supervisors)
+                self._memo[self._memo_key(dept, baseline_scenario, capacities)] = baseline.get(dept, {})
+        elif solve:
+            baseline = self.run(baseline_scenario)
+        # Without solving, the caller settles a plan of the baseline scenario and sets it
+        self.baseline = baseline or {}
+
+    def dump(self) -> dict:
+        """The sandbox as JSON types, skill bitsets as hex."""
+        return {
+            "partitions": {
+                dept: [[[p.id, format(p.bits, "x"), p.size] for p in people] for people in partition]
+                for dept, partition in self.partitions.items()
+            },
+            "loads": self.loads,
+            "baseline_scenario": {
+                **asdict(self.baseline_scenario),
+                "removed_supervisors": sorted(self.baseline_scenario.removed_supervisors),
+                "removed_interns": sorted(self.baseline_scenario.removed_interns),
+            },
+            "baseline": {
+                dept: {
+                    s_id: [[match.intern_id, match.similarity] for match in intern_matches]
+                    for s_id, intern_matches in department_matches.items()
+                }
+                for dept, department_matches in self.baseline.items()
+            },
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> "MatchingSandbox":
+        scenario = data["baseline_scenario"]
+        return cls(
+            {
+                dept: tuple(
+                    [EncodedProfile(p_id, int(bits, 16), size) for p_id, bits, size in people]
+                    for people in partition
+                )
+                for dept, partition in data["partitions"].items()
+            },
+            data["loads"],
+            Scenario(**{
+                **scenario,
+                "removed_supervisors": frozenset(scenario["removed_supervisors"]),
+                "removed_interns": frozenset(scenario["removed_interns"]),
+            }),
+            {
+                dept: {
+                    s_id: [InternMatchDetail(i_id, similarity) for i_id, similarity in intern_matches]
+                    for s_id, intern_matches in department_matches.items()
+                }
+                for dept, department_matches in data["baseline"].items()
+            },
+        )
+
+    def _overlay(self, scenario: Scenario) -> dict[str, Partition]:
+        """The baseline partitions with the scenario's edits; untouched departments are the same objects."""
+        unknown = (scenario.moves.keys() | scenario.removed_supervisors | scenario.supervisor_capacities.keys()) - (
+            self._supervisor_departments.keys()
+        )
+        unknown |= scenario.removed_interns - self._intern_departments.keys()
+        if unknown:
+            raise ValueError(f"Not in the sandbox: {', '.join(sorted(unknown))}")
+
+        # A move to its own department changes nothing, the supervisor keeps its position
+        moves = {
+            s_id: dept for s_id, dept in scenario.moves.items() if dept != self._supervisor_departments[s_id]
+        }
+        leaving = moves.keys() | scenario.removed_supervisors
+        touched = {self._supervisor_departments[s_id] for s_id in leaving}
+        touched |= {self._intern_departments[i_id] for i_id in scenario.removed_interns}
+        touched |= {dept for s_id, dept in moves.items() if s_id not in scenario.removed_supervisors}
+        if not touched:
+            return self.partitions
+
+        arriving: dict[str, list[EncodedProfile]] = {}
+        for s_id, dept in moves.items():
+            if s_id not in scenario.removed_supervisors:
+                supervisors, _ = self.partitions[self._supervisor_departments[s_id]]
+                arriving.setdefault(dept, []).extend(s for s in supervisors if s.id == s_id)
+
+        partitions = dict(self.partitions)
+        for dept in touched:
+            supervisors, interns = self.partitions.get(dept, ((), ()))
+            partitions[dept] = (
+                tuple(s for s in supervisors if s.id not in leaving) + tuple(arriving.get(dept, ())),
+                tuple(i for i in interns if i.id not in scenario.removed_interns),
+            )
+        return partitions
+
+    def _capacities(self, scenario: Scenario, supervisors: tuple[EncodedProfile, ...]) -> dict[str, int] | None:
+        if scenario.capacity is None:
+            if scenario.supervisor_capacities:
+                raise ValueError("Supervisor capacities need a capacity for the others")
+            return None
+        return {
+            s.id: scenario.supervisor_capacities.get(s.id, scenario.capacity) - self.loads.get(s.id, 0)
+            for s in supervisors
+        }
+
+    @staticmethod
+    def _memo_key(dept: str, scenario: Scenario, capacities: dict[str, int] | None) -> tuple:
+        return dept, scenario.method, scenario.strategy, capacities and tuple(capacities.values())
+
+    def plan(self, scenario: Scenario) -> ScenarioPlan:
+        """What the memo already answers for the scenario, and the departments left to solve."""
+        plan = ScenarioPlan({}, {}, None if scenario.capacity is None else {}, {})
+        for dept, partition in self._overlay(scenario).items():
+            supervisors, interns = partition
+            capacities = self._capacities(scenario, supervisors)
+            key = self._memo_key(dept, scenario, capacities)
+            # Only baseline partitions are memoised: overlay ones are new objects every run
+            shared = self.partitions.get(dept) is partition
+            if shared and key in self._memo:
+                plan.results[dept] = self._memo[key]
+                continue
+            if shared:
+                plan.memo_keys[dept] = key
+            plan.unsolved[dept] = (list(supervisors), list(interns))
+            if capacities is not None:
+                plan.capacities.update(capacities)
+        return plan
+
+    def settle(
+        self, plan: ScenarioPlan, solved: dict[str, dict[str, list[InternMatchDetail]]]
+    ) -> dict[str, dict[str, list[InternMatchDetail]]]:
+        """The scenario's results, from the plan and its unsolved departments' matches."""
+        for dept, matches_ in solved.items():
+            if dept in plan.memo_keys and len(self._memo) < _MEMO_LIMIT:
+                self._memo[plan.memo_keys[dept]] = matches_
+        return {dept: matches_ for dept, matches_ in (plan.results | solved).items() if matches_}
+
+    def run(self, scenario: Scenario) -> dict[str, dict[str, list[InternMatchDetail]]]:
+        plan = self.plan(scenario)
+        solved = {}
+        for dept, (supervisors, interns) in plan.unsolved.items():
+            capacities = plan.capacities and {s.id: plan.capacities[s.id] for s in supervisors}
+            solved[dept], _ = match_department(
+                dept, supervisors, interns, scenario.method, scenario.strategy, capacities
+            )
+        return self.settle(plan, solved)
+
+    def try_scenario(self, scenario: Scenario) -> dict:
+        start = time.perf_counter()
+        diff = diff_matches(self.baseline, self.run(scenario))
+        diff["duration_ms"] = (time.perf_counter() - start) * 1000
+        return diff
+
+
+def _placements(results: dict) -> dict[str, tuple[str, str, float]]:
+    """intern id -> (department, supervisor id, similarity)"""
+    return {
+        match.intern_id: (dept, supervisor_id, match.similarity)
+        for dept, department_matches in results.items()
+        for supervisor_id, intern_matches in department_matches.items()
+        for match in intern_matches
+    }
+
+
+def diff_matches(baseline: dict, scenario: dict) -> dict:
+    """Interns placed differently in `scenario` than in `baseline`, with totals per department."""
+    before, after = _placements(baseline), _placements(scenario)
+    changes, departments = [], {}
+    for intern_id in before.keys() | after.keys():
+        old, new = before.get(intern_id), after.get(intern_id)
+        dept = (new or old)[0]
+        summary = departments.setdefault(dept, {"changed": 0, "similarity_before": 0.0, "similarity_after": 0.0})
+        summary["similarity_before"] += old[2] if old else 0.0
+        summary["similarity_after"] += new[2] if new else 0.0
+        if old is None or new is None or old[1] != new[1]:
+            summary["changed"] += 1
+            changes.append({
+                "intern_id": intern_id,
+                "department": dept,
+                "before": old and {"supervisor_id": old[1], "similarity": old[2]},
+                "after": new and {"supervisor_id": new[1], "similarity": new[2]},
+            })
+
+    changes.sort(key=lambda change: (change["department"], change["intern_id"]))
+    return {
+        "matched_before": len(before),
+        "matched_after": len(after),
+        "similarity_before": sum(old[2] for old in before.values()),
+        "similarity_after": sum(new[2] for new in after.values()),
+        "changes": changes,
+        "departments": {dept: summary for dept, summary in sorted(departments.items()) if summary["changed"]},
+    }
+
+
+class SandboxRegistry:
+    """
+    The sandboxes this process built or loaded, least recently used dropped first, each
+    kept `ttl` seconds. Only a cache: the persisted sandbox is the one that counts.
+    """
+
+    def __init__(self, size: int = 8, ttl: float = 1800):
+        self.size = size
+        self.ttl = ttl
+        self._sandboxes: OrderedDict[str, tuple[float, MatchingSandbox]] = OrderedDict()
+
+    def add(self, sandbox_id: str, sandbox: MatchingSandbox) -> None:
+        self._sandboxes[sandbox_id] = (time.monotonic() + self.ttl, sandbox)
+        self._sandboxes.move_to_end(sandbox_id)
+        while len(self._sandboxes) > self.size:
+            self._sandboxes.popitem(last=False)
+
+    def get(self, sandbox_id: str) -> MatchingSandbox | None:
+        if (entry := self._sandboxes.get(sandbox_id)) is None:
+            return None
+        expires_at, sandbox = entry
+        if expires_at < time.monotonic():
+            del self._sandboxes[sandbox_id]
+            return None
+        self._sandboxes.move_to_end(sandbox_id)
+        return sandbox
+
+    def remove(self, sandbox_id: str) -> bool:
+        return self._sandboxes.pop(sandbox_id, None) is not None
+
+
+sandboxes = SandboxRegistry()
@@ -0,0 +1,341 @@
+"""
+Matching snapshot shared by all the uvicorn workers of a host.
+
+One worker, whichever holds the lock file, builds the snapshot from the database and
+publishes it as a single file (under /dev/shm by default, so it never touches a disk):
+
+    header    magic, data version, metadata length
+    metadata  JSON: departments with their supervisor / intern ranges, skill keys,
+              bitset width and the offsets of the sections below
+    sections  id_offsets (uint32[n + 1]), ids (utf-8), intern_counts (uint32[supervisors]),
+              bits (n fixed-width little-endian skill bitsets, supervisors then interns),
+              intern_order (uint32[interns], the interns' positions sorted by id)
+
+Every worker maps it read-only, so its pages sit once in the page cache however many
+workers there are. A refresh writes a new file next to it and renames it over the
+old one: readers see either snapshot in full, and keep the one they mapped until they
+pick up the new inode. Bitsets are only turned into ints for the department or call
+that needs them. Interns are looked up by bisecting intern_order, and a department's
+SkillIndex is built on its first recommendation after every swap.
+"""
+
+import asyncio
+import fcntl
+import glob
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import suppress
+from itertools import accumulate
+
+from .db import SessionLocal
+from .logger import logger
+from .matching import (
+    EncodedProfile,
+    IdfWeights,
+    SkillIndex,
+    SkillVocabulary,
+    rows_to_matching_details,
+    top_supervisors,
+)
+from .repositories.intern_repo import InternRepository
+from .repositories.matching_repo import MatchingRepository
+from .repositories.supervisor_repo import SupervisorRepository
+from .settings import settings
+
+MAGIC = b"ICMSNAP2"
+_HEADER = struct.Struct("<8sqI")  # magic, data version, metadata length
+_ALIGNMENT = 8
+
+
+def _padded(length: int) -> int:
+    return -(-length // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_snapshot(path: str, supervisors_details: list[dict], interns_details: list[dict], data_version: int) -> None:
+    """Publishes matching details (as from `rows_to_matching_details`) at `path`, atomically."""
+    by_dept: dict[str, tuple[list[dict], list[dict]]] = defaultdict(lambda: ([], []))
+    for supervisor in supervisors_details:
+        by_dept[supervisor["department"]][0].append(supervisor)
+    for intern in interns_details:
+        by_dept[intern["department"]][1].append(intern)
+
+    # Department by department, so every department is one contiguous range of each kind
+    supervisors, interns, departments = [], [], []
+    for dept, (dept_supervisors, dept_interns) in by_dept.items():
+        departments.append([
+            dept,
+            len(supervisors), len(supervisors) + len(dept_supervisors),
+            len(interns), len(interns) + len(dept_interns),
+        ])
+        supervisors.extend(dept_supervisors)
+        interns.extend(dept_interns)
+
+    vocabulary = SkillVocabulary()
+    people = supervisors + interns
+    bitsets = [vocabulary.encode(person["skills"]) for person in people]
+    width = max(1, -(-len(vocabulary) // 64)) * 8
+
+    ids = [str(person["id"]).encode() for person in people]
+    intern_positions = range(len(supervisors), len(people))
+    sections = {
+        "id_offsets": array("I", accumulate((len(id_) for id_ in ids), initial=0)).tobytes(),
+        "ids": b"".join(ids),
+        "intern_counts": array("I", (s.get("intern_count", 0) for s in supervisors)).tobytes(),
+        "bits": b"".join(bits.to_bytes(width, "little") for bits in bitsets),
+        "intern_order": array("I", sorted(intern_positions, key=ids.__getitem__)).tobytes(),
+    }
+    layout, offset = {}, 0
+    for name, data in sections.items():
+        layout[name] = [offset, len(data)]
+        offset += _padded(len(data))
+
+    metadata = json.dumps({
+        "departments": departments,
+        "supervisors": len(supervisors),
+        "interns": len(interns),
+        "width": width,
+        "skills": [str(skill) for skill in vocabulary.skills()],
+        "sections": layout,
+    }).encode()
+    header = _HEADER.pack(MAGIC, data_version, len(metadata)) + metadata
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            file.write(header.ljust(_padded(len(header)), b"\0"))
+            for data in sections.values():
+                file.write(data.ljust(_padded(len(data)), b"\0"))
+        os.replace(temporary, path)
+    except BaseException:
+        with suppress(FileNotFoundError):
+            os.remove(temporary)
+        raise
+
+
+def remove_stale_temporaries(path: str) -> None:
+    """Drops the temporary files of publishers that died before renaming them. Only for the lock holder."""
+    for temporary in glob.glob(f"{glob.escape(path)}.*.tmp"):
+        with suppress(FileNotFoundError):
+            os.remove(temporary)
+
+
+class SharedSnapshot:
+    """
+    A mapped snapshot. Offers what the services use of `IncrementalMatcher`:
+    partitions, loads, capacities, cached_intern, encode_intern and recommend.
+    """
+
+    __slots__ = (
+        "data_version",
+        "method",
+        "_map",
+        "_departments",
+        "_supervisors",
+        "_interns",
+        "_width",
+        "_skills",
+        "_skill_positions",
+        "_id_offsets",
+        "_ids",
+        "_intern_counts",
+        "_bits",
+        "_intern_order",
+        "_indexes",
+    )
+
+    def __init__(self, map_: mmap.mmap, method: str = "jaccard"):
+        magic, self.data_version, metadata_length = _HEADER.unpack_from(map_)
+        if magic != MAGIC:
+            raise ValueError("Not a matching snapshot")
+        metadata = json.loads(map_[_HEADER.size:_HEADER.size + metadata_length])
+        body = _padded(_HEADER.size + metadata_length)
+        view = memoryview(map_)
+
+        def section(name: str) -> memoryview:
+            offset, length = metadata["sections"][name]
+            return view[body + offset:body + offset + length]
+
+        self.method = method
+        self._map = map_
+        self._supervisors = metadata["supervisors"]
+        self._interns = metadata["interns"]
+        # dept -> (first supervisor, end, first intern, end), all as positions into the tables
+        self._departments = {
+            dept: (s_first, s_end, self._supervisors + i_first, self._supervisors + i_end)
+            for dept, s_first, s_end, i_first, i_end in metadata["departments"]
+        }
+        self._width = metadata["width"]
+        self._skills: list[str] = metadata["skills"]
+        self._skill_positions: dict[str, int] | None = None
+        self._id_offsets = section("id_offsets").cast("I")
+        self._ids = section("ids")
+        self._intern_counts = section("intern_counts").cast("I")
+        self._bits = section("bits")
+        self._intern_order = section("intern_order").cast("I")
+        self._indexes: dict[str, tuple[SkillIndex, IdfWeights | None]] = {}
+
+    def _id_bytes(self, position: int) -> bytes:
+        return bytes(self._ids[self._id_offsets[position]:self._id_offsets[position + 1]])
+
+    def _id(self, position: int) -> str:
+        return str(self._ids[self._id_offsets[position]:self._id_offsets[position + 1]], "utf-8")
+
+    def _profile(self, position: int) -> EncodedProfile:
+        width = self._width
+        bits = int.from_bytes(self._bits[position * width:(position + 1) * width], "little")
+        return EncodedProfile(self._id(position), bits, bits.bit_count())
+
+    def partitions(self) -> dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]]:
+        return {
+            dept: (
+                [self._profile(position) for position in range(s_first, s_end)],
+                [self._profile(position) for position in range(i_first, i_end)],
+            )
+            for dept, (s_first, s_end, i_first, i_end) in self._departments.items()
+        }
+
+    def loads(self) -> dict[str, int]:
+        return {self._id(position): self._intern_counts[position] for position in range(self._supervisors)}
+
+    def capacities(self, capacity: int) -> dict[str, int]:
+        return {supervisor_id: capacity - load for supervisor_id, load in self.loads().items()}
+
+    def _find_intern(self, intern_id: str) -> int:
+        """Position of the intern, -1 if absent. Bisects the mapped ids in place."""
+        needle = intern_id.encode()
+        order = self._intern_order
+        at = bisect_left(order, needle, key=self._id_bytes)
+        if at < len(order) and self._id_bytes(order[at]) == needle:
+            return order[at]
+        return -1
+
+    def cached_intern(self, intern_id: str) -> tuple[str, EncodedProfile] | None:
+        position = self._find_intern(intern_id)
+        if position < 0:
+            return None
+        dept = next(
+            dept for dept, (_, _, i_first, i_end) in self._departments.items() if i_first <= position < i_end
+        )
+        return dept, self._profile(position)
+
+    def encode_intern(self, intern_id: str, skills: list) -> EncodedProfile:
+        if self._skill_positions is None:
+            self._skill_positions = {skill: position for position, skill in enumerate(self._skills)}
+        bits, unknown = 0, len(self._skills)
+        for skill in skills:
+            # Skills nobody in the snapshot has still count towards the intern's size
+            if (position := self._skill_positions.get(str(skill))) is None:
+                position, unknown = unknown, unknown + 1
+            bits |= 1 << position
+        return EncodedProfile(intern_id, bits, bits.bit_count())
+
+    def _department_index(self, department: str) -> tuple[SkillIndex, IdfWeights | None]:
+        """The department's SkillIndex (and IDF weights), built on first use for this snapshot."""
+        if (built := self._indexes.get(department)) is None:
+            s_first, s_end, i_first, i_end = self._departments[department]
+            supervisors = [self._profile(position) for position in range(s_first, s_end)]
+            weights = None
+            if self.method == "idf":
+                interns = [self._profile(position) for position in range(i_first, i_end)]
+                weights = IdfWeights(supervisors + interns)
+            built = self._indexes[department] = (SkillIndex(supervisors), weights)
+        return built
+
+    def recommend(self, department: str, intern: EncodedProfile, k: int) -> list[tuple[str, float]]:
+        """
+        The k best (supervisor id, similarity) among the department's supervisors sharing
+        a skill with the intern, best first, earliest first on ties.
+        """
+        if department not in self._departments:
+            return []
+        index, weights = self._department_index(department)
+        if not index.supervisors:
+            return []
+        best = top_supervisors(intern, index, self.method, k, weights=weights)
+        best.sort(key=lambda entry: (-entry[0], entry[1]))
+        return [(index.supervisors[position].id, score) for score, position in best]
+
+
+class SharedSnapshotReader:
+    """Maps the published snapshot, and maps it again once a newer one replaced it."""
+
+    __slots__ = ("path", "method", "_snapshot", "_file_id")
+
+    def __init__(self, path: str, method: str = "jaccard"):
+        self.path = path
+        self.method = method
+        self._snapshot: SharedSnapshot | None = None
+        self._file_id: tuple[int, int] | None = None
+
+    def current(self) -> SharedSnapshot | None:
+        """The latest published snapshot, None before the first one."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if (stat.st_dev, stat.st_ino) != self._file_id:
+            with open(self.path, "rb") as file:
+                # The inode of what was opened, the path may have been swapped since the stat
+                opened = os.fstat(file.fileno())
+                map_ = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            # The previous map is unmapped once no call uses its snapshot any more
+            self._snapshot = SharedSnapshot(map_, self.method)
+            self._file_id = (opened.st_dev, opened.st_ino)
+        return self._snapshot
+
+
+def _try_lock(path: str):
+    handle = open(path, "a+b")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+async def publish_periodically(path: str, interval: float, rebuild_every: float = 0) -> None:
+    """
+    Runs in every worker. The one holding the lock publishes a snapshot whenever the
+    data version moved, and every `rebuild_every` seconds regardless to reconcile
+    changes made without a version bump; the others retry the lock, to take over if
+    it exits.
+    """
+    lock, published, published_at = None, None, 0.0
+    try:
+        while True:
+            try:
+                if lock is None:
+                    lock = _try_lock(f"{path}.lock")
+                    if lock is not None:
+                        remove_stale_temporaries(path)
+                if lock is not None:
+                    details = None
+                    async with SessionLocal() as session, session.begin():
+                        # Read before the rows: rows newer than the version only cause one more publish
+                        data_version = await MatchingRepository().get_data_version(conn=session)
+                        due = rebuild_every and time.monotonic() - published_at >= rebuild_every
+                        if due or data_version != published or not os.path.exists(path):
+                            details = rows_to_matching_details(
+                                await SupervisorRepository().get_supervisor_matching_rows(conn=session),
+                                await InternRepository().get_unmatched_intern_matching_rows(conn=session),
+                            )
+                    if details is not None:
+                        await asyncio.to_thread(write_snapshot, path, *details, data_version)
+                        published, published_at = data_version, time.monotonic()
+                        logger.info(f"Published matching snapshot version {data_version}")
+            except Exception as exc:
+                logger.error(f"Could not publish the matching snapshot: {exc}")
+            await asyncio.sleep(interval)
+    finally:
+        if lock is not None:
+            lock.close()
+
+
+shared_snapshot = SharedSnapshotReader(settings.MATCHING_SNAPSHOT_PATH, settings.MATCHING_METHOD)
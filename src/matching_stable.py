@@ -0,0 +1,146 @@
+"""
+Stable matching of interns to capacitated supervisors.
+
+Both sides rank each other by skill similarity: an intern prefers the supervisors it
+scores best with (earliest first on ties), a supervisor prefers the interns it scores
+best with (earliest first on ties). Intern-proposing deferred acceptance (Gale-Shapley,
+hospitals/residents variant) then yields the intern-optimal stable matching: no intern
+and supervisor would both rather be together than with what they got.
+
+    - a free intern proposes to the next supervisor on its list,
+    - a supervisor holds its `capacity` best proposals so far in a min-heap, and
+      rejects the proposal it likes least once it is full,
+    - a rejected intern becomes free again.
+
+Every intern's preference list is built first, from the department's `SkillIndex`,
+and truncated to its `top_k` best overlapping supervisors with room. Supervisors
+never materialise a list: they compare proposals as they come. Stability therefore
+holds over those truncated lists. Interns rejected by their whole list (or still free
+when the time budget runs out) are placed afterwards on the best supervisor that still
+has room, like the assignment strategy. As there, the budget starts once the lists are
+built, and a solve that runs past it is reported in `SolverStats.timed_out`.
+"""
+
+import heapq
+import time
+from collections import defaultdict, deque
+
+from .common import InternMatchDetail
+from .matching import EncodedProfile, IdfWeights, SkillIndex, SolverStats, profile_similarity
+from .matching_assignment import (
+    DEFAULT_TIME_BUDGET,
+    DEFAULT_TOP_K,
+    best_with_room,
+    first_with_room,
+    intern_candidate_edges,
+    rooms_mask,
+)
+
+_NO_HOLDER = -1
+
+
+def _preference_list(edges: list[tuple[float, int]]) -> list[tuple[float, int]]:
+    """Least preferred first, so the next choice is popped off the end; earliest supervisor first on ties."""
+    return sorted(edges, key=lambda edge: (edge[0], -edge[1]))
+
+
+def stable_match(
+    supervisors: list[EncodedProfile],
+    interns: list[EncodedProfile],
+    capacities: dict[str, int],
+    method: str = "jaccard",
+    index: SkillIndex | None = None,
+    top_k: int = DEFAULT_TOP_K,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    stats: SolverStats | None = None,
+    weights: IdfWeights | None = None,
+) -> dict[str, list[InternMatchDetail]]:
+    """
+    Stable matching where no supervisor exceeds `capacities[supervisor_id]` (missing
+    supervisors have no capacity). Everybody is matched whenever the department has
+    enough capacity.
+    """
+    if not supervisors or not interns:
+        return {}
+
+    index = index or SkillIndex(supervisors)
+    if method == "idf" and weights is None:
+        weights = IdfWeights(supervisors + interns)
+    capacity = [max(capacities.get(supervisor.id, 0), 0) for supervisor in supervisors]
+    with_room = rooms_mask(capacity)
+    preferences = [
+        _preference_list(intern_candidate_edges(intern, supervisors, with_room, index, method, top_k, weights))
+        for intern in interns
+    ]
+    candidate_pairs = sum(len(choices) for choices in preferences)
+    # The budget is for the solve: a slow similarity method must not eat the proposals
+    deadline = time.perf_counter() + time_budget
+
+    # Per supervisor, (similarity, -intern position): the root is the held intern it likes least
+    held: list[list[tuple[float, int]]] = [[] for _ in supervisors]
+    holder = [_NO_HOLDER] * len(interns)
+    free = deque(range(len(interns)))
+    proposals, timed_out = 0, False
+
+    while free:
+        if not proposals % 256 and time.perf_counter() > deadline:
+            timed_out = True
+            break
+
+        intern = free.popleft()
+        choices = preferences[intern]
+        if not choices:
+            continue  # rejected by its whole list, left to the fill pass
+
+        score, position = choices.pop()
+        proposals += 1
+        slots, proposal = held[position], (score, -intern)
+        if len(slots) < capacity[position]:
+            heapq.heappush(slots, proposal)
+        elif proposal > slots[0]:
+            _, rejected = heapq.heapreplace(slots, proposal)
+            holder[-rejected] = _NO_HOLDER
+            free.append(-rejected)
+        else:
+            free.appendleft(intern)  # proposes again straight away, further down its list
+            continue
+        holder[intern] = position
+
+    matches_: dict[str, list[InternMatchDetail]] = defaultdict(list)
+    remaining = [slots - len(held_) for slots, held_ in zip(capacity, held)]
+    unassigned = 0
+    cursor = 0  # first supervisor that may have room, for the fill past the deadline
+    for intern_position, intern in enumerate(interns):
+        supervisor_position = holder[intern_position]
+        if supervisor_position == _NO_HOLDER:
+            supervisor_position = best_with_room(preferences[intern_position], remaining)
+            if supervisor_position == _NO_HOLDER and time.perf_counter() < deadline:
+                supervisor_position = first_with_room(intern, supervisors, remaining, method, weights)
+            elif supervisor_position == _NO_HOLDER:
+                # Out of time: any room will do, remaining only goes down
+                while cursor < len(remaining) and remaining[cursor] <= 0:
+                    cursor += 1
+                if cursor < len(remaining):
+                    supervisor_position = cursor
+                    timed_out = True
+            if supervisor_position == _NO_HOLDER:
+                unassigned += 1
+                continue
+            remaining[supervisor_position] -= 1
+
+        supervisor = supervisors[supervisor_position]
+        matches_[supervisor.id].append(
+            InternMatchDetail(
+                intern_id=intern.id,
+                similarity=profile_similarity(intern, supervisor, method, weights),
+            )
+        )
+
+    if stats is not None:
+        stats.candidate_pairs = candidate_pairs
+        stats.iterations = proposals
+        stats.phases = 0 if timed_out else 1
+        stats.timed_out = timed_out
+        stats.unassigned = unassigned
+
+    return dict(matches_)
@@ -5,12 +5,12 @@ from typing import Optional, List
 from uuid import uuid4
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import Boolean, String, Text, Date, DateTime, ForeignKey, Index, Enum
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import BigInteger, Boolean, String, Text, Date, DateTime, ForeignKey, Index, Enum
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship, Mapped, mapped_column, DeclarativeBase
 
-from ..common import UserType
+from ..common import JobStatus, UserType
 
 
 class ReprMixin:
@@ -399,8 +399,14 @@ class Note(Base):
     task: Mapped[Optional[Task]] = relationship("Task", back_populates="notes")
 
 
+VERIFICATION_CODE_LIFETIME = timedelta(minutes=10)  # also renewed with every new code
+
+
 class VerificationCode(Base):
     __tablename__ = "verification_code"
+    __table_args__ = (
+        Index("ix_verification_code_expires_at", "expires_at"),  # for purging expired codes
+    )
 
     id: Mapped[UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid4
@@ -417,7 +423,7 @@ class VerificationCode(Base):
     )
     expires_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
-        default=lambda: datetime.now(ZoneInfo("UTC")) + timedelta(minutes=10),
+        default=lambda: datetime.now(ZoneInfo("UTC")) + VERIFICATION_CODE_LIFETIME,
     )
 
     user: Mapped[User] = relationship("User", back_populates="verification_code")
@@ -453,9 +459,77 @@ class Todo(Base):
 
 class Token(Base):
     __tablename__ = "token"
+    __table_args__ = (
+        Index("ix_token_user_id", "user_id"),  # every login replaces the user's tokens
+        Index("ix_token_expires_at", "expires_at"),  # for purging expired tokens
+    )
 
     jti: Mapped[UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid4
     )
     user_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True))
     expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class MatchingState(Base):
+    """Single row; data_version moves whenever a matching input (users, skills, matches) changes."""
+    __tablename__ = "matching_state"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    data_version: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class MatchProposal(Base):
+    __tablename__ = "match_proposal"
+    __repr_attrs__ = ("key", "data_version")
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)  # strategy and capacity
+    data_version: Mapped[int] = mapped_column(BigInteger)
+    proposals: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(tz=ZoneInfo("UTC"))
+    )
+
+
+class MatchingJob(Base):
+    """A bulk matching run in the background, polled by the admin."""
+    __tablename__ = "matching_job"
+    __repr_attrs__ = ("id", "status")
+
+    id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid4
+    )
+    status: Mapped[str] = mapped_column(String(20), default=JobStatus.PENDING)
+    capacity: Mapped[Optional[int]] = mapped_column(nullable=True)
+    # phase and per-department solver stats, updated as the job goes
+    progress: Mapped[dict] = mapped_column(JSONB, default=dict)
+    result: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(tz=ZoneInfo("UTC"))
+    )
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # bumped by every progress write and a heartbeat while running, a stale one means the worker died
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class MatchingSandboxSnapshot(Base):
+    """A what-if matching sandbox, persisted so every worker can run its scenarios."""
+    __tablename__ = "matching_sandbox"
+    __table_args__ = (
+        Index("ix_matching_sandbox_owner_id", "owner_id"),  # sandboxes are per user
+        Index("ix_matching_sandbox_expires_at", "expires_at"),  # for purging expired sandboxes
+    )
+    __repr_attrs__ = ("id", "owner_id")
+
+    id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid4
+    )
+    owner_id: Mapped[UUID] = mapped_column(UUID(as_uuid=True))
+    # MatchingSandbox.dump(): encoded partitions, loads, baseline scenario and its matches
+    inputs: Mapped[dict] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(tz=ZoneInfo("UTC"))
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -89,6 +89,19 @@ class UserRepository:
         result = await conn.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_users_for_matching(self, conn: AsyncSession, user_ids: list[UUID]) -> list[User]:
+        stmt = (
+            select(self.table)
+            .where(self.table.id.in_(user_ids))
+            .options(
+                selectinload(User.skills),
+                selectinload(User.intern),
+                selectinload(User.supervisor),
+            )
+        )
+        result = await conn.execute(stmt)
+        return result.scalars().all()
+
     async def list_all(self, conn: AsyncSession):
         stmt = select(self.table)
         result = await conn.execute(stmt)
@@ -3,11 +3,12 @@ import uuid
 from uuid import UUID
 
 import sqlalchemy.exc
-from sqlalchemy import Select, select, Result, and_, update
+from sqlalchemy import Select, select, Result, and_, update, func, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from ..models.app_models import Intern, User, Supervisor
+from ..models.app_models import Intern, User, Supervisor, UserSkill
 from ..schemas.intern_schemas import InternInModel
 
 
@@ -96,6 +97,25 @@ class InternRepository:
 
         return result.scalars().all()
 
+    async def get_unmatched_intern_matching_rows(self, conn: AsyncSession):
+        """(id, department_id, skill_ids) of every verified unmatched intern, without ORM hydration"""
+        stmt: Select = (
+            select(
+                self.table.id,
+                User.department_id,
+                func.array_agg(UserSkill.skill_id)
+                .filter(UserSkill.skill_id.is_not(None))
+                .label("skill_ids"),
+            )
+            .join(User, User.id == self.table.user_id)
+            .outerjoin(UserSkill, UserSkill.user_id == User.id)
+            .where(and_(Intern.supervisor_id == None, User.verified))
+            .group_by(self.table.id, User.department_id)
+        )
+
+        result: Result = await conn.execute(stmt)
+        return result.all()
+
     async def assign_supervisor_to_intern(
         self, conn: AsyncSession, supervisor_id: UUID, intern_id: UUID
     ):
@@ -124,6 +144,40 @@ class InternRepository:
 
         return intern_result
 
+    async def bulk_assign_supervisors(
+        self, conn: AsyncSession, pairs: list[tuple[UUID, UUID]]
+    ) -> set[UUID]:
+        """
+        Assigns every (intern_id, supervisor_id) pair in one UPDATE, skipping interns that
+        no longer exist or already have a supervisor. Returns the ids actually assigned.
+        """
+        if not pairs:
+            return set()
+
+        # Two array parameters whatever the cohort size, instead of a VALUES list
+        # that would run into the driver's bind parameter limit
+        uuid_array = ARRAY(PG_UUID(as_uuid=True))
+        assignments = func.unnest(
+            bindparam("intern_ids", [intern_id for intern_id, _ in pairs], type_=uuid_array),
+            bindparam("supervisor_ids", [supervisor_id for _, supervisor_id in pairs], type_=uuid_array),
+        ).table_valued("intern_id", "supervisor_id").render_derived(name="assignments")
+
+        stmt = (
+            update(self.table)
+            .where(
+                and_(
+                    self.table.id == assignments.c.intern_id,
+                    self.table.supervisor_id == None,
+                )
+            )
+            .values(supervisor_id=assignments.c.supervisor_id)
+            .returning(self.table.id)
+            .execution_options(synchronize_session=False)
+        )
+
+        result: Result = await conn.execute(stmt)
+        return set(result.scalars().all())
+
     async def get_intern_supervisor(self, conn: AsyncSession, intern_id: UUID):
         stmt: Select = (
             select(self.table)
@@ -0,0 +1,41 @@
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..common import JobStatus
+from ..models.app_models import MatchingJob
+
+
+class MatchingJobRepository:
+    def __init__(self):
+        self.table = MatchingJob
+
+    async def create(self, conn: AsyncSession, capacity: int | None) -> MatchingJob:
+        job = self.table(capacity=capacity, progress={})
+        conn.add(job)
+        await conn.flush()
+        return job
+
+    async def get(self, conn: AsyncSession, job_id: UUID) -> MatchingJob | None:
+        return await conn.get(self.table, job_id)
+
+    async def update(self, conn: AsyncSession, job_id: UUID, values: dict) -> None:
+        stmt = update(self.table).where(self.table.id == job_id).values(**values)
+        await conn.execute(stmt)
+
+    async def fail_stale(
+        self, conn: AsyncSession, stale_before: datetime, error: str, job_id: UUID | None = None
+    ) -> int:
+        """Fails the unfinished jobs last heard of before `stale_before`, all of them or just `job_id`."""
+        last_seen = func.coalesce(self.table.updated_at, self.table.created_at)
+        stmt = (
+            update(self.table)
+            .where(self.table.status.in_((JobStatus.PENDING, JobStatus.RUNNING)), last_seen < stale_before)
+            .values(status=JobStatus.FAILED, error=error, finished_at=func.now(), updated_at=func.now())
+        )
+        if job_id is not None:
+            stmt = stmt.where(self.table.id == job_id)
+        result = await conn.execute(stmt)
+        return result.rowcount
@@ -0,0 +1,61 @@
+from sqlalchemy import Select, select, Result, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.app_models import MatchingState, MatchProposal
+
+_STATE_ID = 1
+# First key of the bulk matching advisory locks, the department id is the second
+_DEPARTMENT_LOCKS = 7301
+
+
+class MatchingRepository:
+    def __init__(self):
+        self.table = MatchProposal
+
+    async def get_data_version(self, conn: AsyncSession) -> int:
+        stmt: Select = select(MatchingState.data_version).where(MatchingState.id == _STATE_ID)
+        result: Result = await conn.execute(stmt)
+        return result.scalar_one_or_none() or 0
+
+    async def bump_data_version(self, conn: AsyncSession) -> int:
+        """Call in the transaction that changes matching inputs, so the bump commits with it. Returns the new version."""
+        stmt = (
+            insert(MatchingState)
+            .values(id=_STATE_ID, data_version=1)
+            .on_conflict_do_update(
+                index_elements=[MatchingState.id],
+                set_={"data_version": MatchingState.data_version + 1},
+            )
+            .returning(MatchingState.data_version)
+        )
+        result: Result = await conn.execute(stmt)
+        return result.scalar_one()
+
+    async def try_lock_department(self, conn: AsyncSession, department_id: int) -> bool:
+        """
+        Claims a department for bulk matching until the transaction ends, or until its
+        connection drops. False while another transaction holds it; never waits.
+        """
+        stmt: Select = select(func.pg_try_advisory_xact_lock(_DEPARTMENT_LOCKS, department_id))
+        result: Result = await conn.execute(stmt)
+        return result.scalar_one()
+
+    async def get_proposal(self, conn: AsyncSession, key: str) -> MatchProposal | None:
+        return await conn.get(self.table, key)
+
+    async def save_proposal(
+        self, conn: AsyncSession, key: str, data_version: int, proposals: dict
+    ) -> None:
+        stmt = insert(self.table).values(key=key, data_version=data_version, proposals=proposals)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.key],
+            set_={
+                "data_version": stmt.excluded.data_version,
+                "proposals": stmt.excluded.proposals,
+                "created_at": stmt.excluded.created_at,
+            },
+            # A slower request must not overwrite a snapshot of newer data
+            where=self.table.data_version <= stmt.excluded.data_version,
+        )
+        await conn.execute(stmt)
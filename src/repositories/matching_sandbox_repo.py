@@ -0,0 +1,70 @@
+from datetime import UTC, datetime
+from uuid import UUID
+
+from sqlalchemy import Result, Select, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.app_models import MatchingSandboxSnapshot
+
+
+class MatchingSandboxRepository:
+    """Sandboxes are only ever found through their owner, and only until they expire."""
+
+    def __init__(self):
+        self.table = MatchingSandboxSnapshot
+
+    def _owned(self, sandbox_id: UUID, owner_id: UUID):
+        return (
+            self.table.id == sandbox_id,
+            self.table.owner_id == owner_id,
+            self.table.expires_at > datetime.now(UTC),
+        )
+
+    async def create(
+        self, conn: AsyncSession, owner_id: UUID, inputs: dict, expires_at: datetime
+    ) -> MatchingSandboxSnapshot:
+        sandbox = self.table(owner_id=owner_id, inputs=inputs, expires_at=expires_at)
+        conn.add(sandbox)
+        await conn.flush()
+        return sandbox
+
+    async def exists(self, conn: AsyncSession, sandbox_id: UUID, owner_id: UUID) -> bool:
+        stmt: Select = select(self.table.id).where(*self._owned(sandbox_id, owner_id))
+        result: Result = await conn.execute(stmt)
+        return result.scalar_one_or_none() is not None
+
+    async def get_inputs(self, conn: AsyncSession, sandbox_id: UUID, owner_id: UUID) -> dict | None:
+        stmt: Select = select(self.table.inputs).where(*self._owned(sandbox_id, owner_id))
+        result: Result = await conn.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def delete(self, conn: AsyncSession, sandbox_id: UUID, owner_id: UUID) -> bool:
+        result = await conn.execute(delete(self.table).where(*self._owned(sandbox_id, owner_id)))
+        return result.rowcount > 0
+
+    async def delete_all_but_newest(self, conn: AsyncSession, owner_id: UUID, keep: int) -> list[UUID]:
+        """Deletes the owner's sandboxes beyond the `keep` newest, returns their ids."""
+        newest = (
+            select(self.table.id)
+            .where(self.table.owner_id == owner_id)
+            .order_by(self.table.created_at.desc())
+            .limit(keep)
+        )
+        stmt = (
+            delete(self.table)
+            .where(self.table.owner_id == owner_id, self.table.id.not_in(newest))
+            .returning(self.table.id)
+        )
+        result: Result = await conn.execute(stmt)
+        return list(result.scalars())
+
+    async def delete_expired(self, conn: AsyncSession, batch_size: int) -> int:
+        """Deletes up to `batch_size` expired sandboxes, returns how many."""
+        expired = (
+            select(self.table.id)
+            .where(self.table.expires_at <= datetime.now(UTC))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)  # other workers purge other rows
+        )
+        result = await conn.execute(delete(self.table).where(self.table.id.in_(expired)))
+        return result.rowcount
@@ -1,3 +1,4 @@
+from typing import Iterable
 from uuid import UUID
 
 from sqlalchemy import select, Select, Result
@@ -73,6 +74,12 @@ class SkillRepository:
 
         return skill_list
 
+    async def get_skill_names(self, conn: AsyncSession, skill_ids: Iterable[UUID | str]) -> dict[str, str]:
+        """skill id (as str) -> name"""
+        stmt = select(self.table.id, self.table.name).where(self.table.id.in_(list(skill_ids)))
+        result = await conn.execute(stmt)
+        return {str(skill_id): name for skill_id, name in result.all()}
+
     async def get_available_skills(
         self, conn: AsyncSession, search_term: str | None = None
     ):
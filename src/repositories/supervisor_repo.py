@@ -1,14 +1,14 @@
 import uuid
 from uuid import UUID, uuid4
 
-from sqlalchemy import Select, select, Result
+from sqlalchemy import Select, select, Result, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from . import SkillRepository
 from ..common import UserType
 from ..models import User
-from ..models.app_models import Supervisor, Intern
+from ..models.app_models import Supervisor, Intern, UserSkill
 from ..schemas.supervisor_schemas import SupervisorInModel
 from ..utils import normalize_string
 
@@ -82,6 +82,30 @@ class SupervisorRepository:
         result: Result = await conn.execute(stmt)
         return result.scalars().all()
 
+    async def get_supervisor_matching_rows(self, conn: AsyncSession):
+        """(id, department_id, skill_ids, intern_count) of every supervisor, without ORM hydration"""
+        intern_count = (
+            select(func.count(Intern.id))
+            .where(Intern.supervisor_id == self.table.id)
+            .scalar_subquery()
+        )
+        stmt: Select = (
+            select(
+                self.table.id,
+                User.department_id,
+                func.array_agg(UserSkill.skill_id)
+                .filter(UserSkill.skill_id.is_not(None))
+                .label("skill_ids"),
+                intern_count.label("intern_count"),
+            )
+            .join(User, User.id == self.table.user_id)
+            .outerjoin(UserSkill, UserSkill.user_id == User.id)
+            .group_by(self.table.id, User.department_id)
+        )
+
+        result: Result = await conn.execute(stmt)
+        return result.all()
+
     async def get_supervisor_by_intern_user_id(
         self, conn: AsyncSession, intern_user_id: UUID
     ) -> Supervisor | None:
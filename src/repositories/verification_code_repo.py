@@ -1,10 +1,11 @@
+from datetime import UTC, datetime
 from uuid import UUID
 
 from sqlalchemy import select, Select, Result, Delete, delete
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models.app_models import VerificationCode
+from ..models.app_models import VERIFICATION_CODE_LIFETIME, VerificationCode
 
 
 class VerificationCodeRepository:
@@ -20,7 +21,10 @@ class VerificationCodeRepository:
         return verification_code
 
     async def get_code(self, conn: AsyncSession, value: str):
-        stmt: Select = select(self.table).where(self.table.value == value)
+        """The code with this value, unless it has expired."""
+        stmt: Select = select(self.table).where(
+            self.table.value == value, self.table.expires_at > datetime.now(UTC)
+        )
         result: Result = await conn.execute(stmt)
         return result.scalar_one_or_none()
 
@@ -32,13 +36,28 @@ class VerificationCodeRepository:
     async def upsert_code_with_user_id(
         self, conn: AsyncSession, user_id: UUID, value: str
     ):
-        stmt = insert(self.table).values(user_id=user_id, value=value)
+        now = datetime.now(UTC)
+        expires_at = now + VERIFICATION_CODE_LIFETIME
+        stmt = insert(self.table).values(
+            user_id=user_id, value=value, created_at=now, expires_at=expires_at
+        )
         stmt = stmt.on_conflict_do_update(
             index_elements=["user_id"],  # column with unique constraint
-            set_={"value": value},
+            set_={"value": value, "created_at": now, "expires_at": expires_at},  # a new code, a new lifetime
         )
         await conn.execute(stmt)
 
     async def delete_code(self, conn: AsyncSession, value: str) -> None:
         stmt: Delete = delete(self.table).where(self.table.value == value)
         await conn.execute(stmt)
+
+    async def delete_expired(self, conn: AsyncSession, batch_size: int) -> int:
+        """Deletes up to `batch_size` expired codes, returns how many."""
+        expired = (
+            select(self.table.id)
+            .where(self.table.expires_at <= datetime.now(UTC))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)  # other workers purge other rows
+        )
+        result = await conn.execute(delete(self.table).where(self.table.id.in_(expired)))
+        return result.rowcount
@@ -3,6 +3,7 @@ from typing import Annotated
 from fastapi import APIRouter
 from fastapi.params import Depends
 
+from ..infra.password_hasher import password_hasher
 from ..schemas.supervisor_schemas import SupervisorOutModel
 from ..services.intern_service import InternService
 from ..services.supervisor_service import SupervisorService
@@ -30,4 +31,11 @@ async def get_all_supervisors(
     _: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
     supervisor_service: Annotated[SupervisorService, Depends()]
 ):
-    return await supervisor_service.get_supervisors()
\ No newline at end of file
+    return await supervisor_service.get_supervisors()
+
+@router.get("/metrics/password-hashing")
+async def get_password_hashing_metrics(
+    _: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
+):
+    """Queue depth and latency of this worker's Argon2 threads"""
+    return password_hasher.metrics()
\ No newline at end of file
@@ -1,10 +1,14 @@
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, Query
 from fastapi.params import Depends
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.status import HTTP_202_ACCEPTED, HTTP_304_NOT_MODIFIED
 
+from ..schemas.matching_schemas import MatchingJobOutModel, SandboxScenarioIn
 from ..schemas.supervisor_schemas import SupervisorOutModel
+from ..services.matching_job_service import MatchingJobService
 from ..services.matching_service import MatchingService
 from ..utils import get_supervisor_user
 
@@ -14,16 +18,109 @@ router: APIRouter = APIRouter(prefix="/matching", tags=["Matching", "Admin"])
 @router.get("/display-matches")
 async def display_matches(
     matching_service: Annotated[MatchingService, Depends()],
+    capacity: Annotated[int | None, Query(ge=1)] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
-    return await matching_service.display_matches()
+    """
+    Pass a capacity to cap interns per supervisor and optimise total similarity.
+    Answers 304 while the proposals named by If-None-Match are still current.
+    """
+    etag, proposals = await matching_service.display_matches(
+        capacity=capacity, if_none_match=if_none_match
+    )
+    # no-cache: browsers may keep the proposals, but must revalidate them every time
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if proposals is None:
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(content=proposals, headers=headers)
 
 
-@router.post("/perform-matching",)
-async def perform_matches(
+@router.get("/display-matches/stream")
+async def stream_matches(
+    matching_service: Annotated[MatchingService, Depends()],
+    capacity: Annotated[int | None, Query(ge=1)] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    """
+    The proposals of /display-matches as NDJSON: one line per supervisor with its
+    department and proposed interns, sent as soon as that line is ready.
+    """
+    etag, lines = await matching_service.stream_matches(capacity=capacity, if_none_match=if_none_match)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if lines is None:
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+    return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+
+
+@router.get("/recommendations/{intern_id}")
+async def recommend_supervisors(
+    _: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
     matching_service: Annotated[MatchingService, Depends()],
+    intern_id: UUID,
+    k: Annotated[int, Query(ge=1, le=50)] = 5,
 ):
+    """The k best supervisors for one intern, scored against its department only."""
+    return await matching_service.recommend_supervisors(intern_id=intern_id, k=k)
+
+
+@router.post("/perform-matching", status_code=HTTP_202_ACCEPTED)
+async def perform_matches(
+    _: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
+    job_service: Annotated[MatchingJobService, Depends()],
+    response: Response,
+    capacity: Annotated[int | None, Query(ge=1)] = None,
+) -> MatchingJobOutModel:
+    """Starts bulk matching in the background. Poll the returned job until it succeeded or failed."""
     # Will refactor this to its own dedicated router.
-    return await matching_service.perform_bulk_matching()
+    job = await job_service.start_bulk_matching(capacity=capacity)
+    response.headers["Location"] = f"{router.prefix}/jobs/{job.job_id}"
+    return job
+
+
+@router.get("/jobs/{job_id}")
+async def get_matching_job(
+    _: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
+    job_service: Annotated[MatchingJobService, Depends()],
+    job_id: UUID,
+) -> MatchingJobOutModel:
+    """Status, per-department progress and, once done, assigned and skipped counts of a bulk matching job."""
+    return await job_service.get_job(job_id=job_id)
+
+
+@router.post("/sandboxes")
+async def create_matching_sandbox(
+    user: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
+    matching_service: Annotated[MatchingService, Depends()],
+    capacity: Annotated[int | None, Query(ge=1)] = None,
+):
+    """
+    Snapshots the matching inputs once for what-if scenarios, matched with the current
+    method (and capacity, if given) as the baseline. Nothing in a sandbox is committed.
+    A sandbox is private to the user who created it, and expires.
+    """
+    return await matching_service.create_sandbox(owner_id=UUID(user.user_id), capacity=capacity)
+
+
+@router.post("/sandboxes/{sandbox_id}/scenarios")
+async def try_matching_scenario(
+    user: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
+    matching_service: Annotated[MatchingService, Depends()],
+    sandbox_id: UUID,
+    scenario: SandboxScenarioIn,
+):
+    """Re-runs matching in memory with the scenario's edits, returns the changes against the baseline."""
+    return await matching_service.try_sandbox_scenario(
+        sandbox_id=sandbox_id, owner_id=UUID(user.user_id), scenario_in=scenario
+    )
+
+
+@router.delete("/sandboxes/{sandbox_id}")
+async def delete_matching_sandbox(
+    user: Annotated[SupervisorOutModel, Depends(get_supervisor_user)],
+    matching_service: Annotated[MatchingService, Depends()],
+    sandbox_id: UUID,
+):
+    return await matching_service.delete_sandbox(sandbox_id=sandbox_id, owner_id=UUID(user.user_id))
 
 
 @router.post("/assign-supervisor")
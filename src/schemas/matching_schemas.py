@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Annotated, Literal
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from src.common import DepartmentEnum, JobStatus
+from src.models.app_models import MatchingJob
+
+
+class MatchingJobOutModel(BaseModel):
+    job_id: str
+    status: JobStatus
+    capacity: int | None
+    progress: dict
+    result: dict | None
+    error: str | None
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+
+    @classmethod
+    def from_model(cls, job: MatchingJob) -> "MatchingJobOutModel":
+        return MatchingJobOutModel(
+            job_id=str(job.id),
+            status=JobStatus(job.status),
+            capacity=job.capacity,
+            progress=job.progress or {},
+            result=job.result,
+            error=job.error,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+        )
+
+
+class SandboxScenarioIn(BaseModel):
+    """Fields left out keep the sandbox baseline's; a null capacity means the greedy strategy."""
+    method: Literal["jaccard", "intern_ratio", "supervisor_ratio", "idf"] | None = None
+    capacity: Annotated[int, Field(ge=1)] | None = None
+    capacity_strategy: Literal["assignment", "stable"] | None = None
+    supervisor_capacities: dict[UUID, Annotated[int, Field(ge=0)]] = {}
+    moves: dict[UUID, DepartmentEnum] = {}  # supervisor id -> new department
+    removed_supervisors: list[UUID] = []
+    removed_interns: list[UUID] = []
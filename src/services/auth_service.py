@@ -25,6 +25,7 @@ from ..db import get_db_session
 from ..models.app_models import User, VerificationCode
 from ..repositories.general_user_repo import UserRepository
 from ..repositories.intern_repo import InternRepository
+from ..repositories.matching_repo import MatchingRepository
 from ..repositories.verification_code_repo import VerificationCodeRepository
 from ..schemas import InternInModel, UserInModel
 from ..schemas.user_schemas import UserOutModel
@@ -34,6 +35,7 @@ from ..utils import (
     hash_password,
     normalize_string,
     password_is_correct,
+    rehashed_password,
     set_custom_cookie,
 )
 
@@ -45,6 +47,7 @@ from ..infra.email.contexts import (
     VerifyEmailContext,
 )
 from ..logger import logger
+from ..matching_incremental import incremental_matcher
 from ..repositories import SkillRepository
 from ..repositories.supervisor_repo import SupervisorRepository
 from ..schemas.intern_schemas import InternOutModel
@@ -60,6 +63,7 @@ class AuthService:
         supervisor_repo: Annotated[SupervisorRepository, Depends()],
         code_repo: Annotated[VerificationCodeRepository, Depends()],
         skill_repo: Annotated[SkillRepository, Depends()],
+        matching_repo: Annotated[MatchingRepository, Depends()],
         background_task: BackgroundTasks,
     ):
         self.session = session
@@ -68,6 +72,7 @@ class AuthService:
         self.supervisor_repo = supervisor_repo
         self.code_repo = code_repo
         self.skill_repo = skill_repo
+        self.matching_repo = matching_repo
         self.background_task = background_task
 
     @staticmethod
@@ -85,6 +90,7 @@ class AuthService:
     async def create_unverified_new_user(
         self, new_user: UserInModel | InternInModel | SupervisorInModel
     ) -> dict[str, str]:
+        matching_users, data_version = [], None
         async with self.session.begin():  # Transactional, for atomicity
             existing_user: User = await self.user_repo.get_user_by_email_or_phone(
                 conn=self.session,
@@ -109,7 +115,7 @@ class AuthService:
 
             else:
                 # Hash password  when creating a new user
-                new_user.password = hash_password(password=new_user.password)
+                new_user.password = await hash_password(password=new_user.password)
 
                 unverified_base_user: User = await self.user_repo.create_new_user(
                     conn=self.session, new_user=new_user, skill_repo=self.skill_repo
@@ -127,6 +133,11 @@ class AuthService:
                             user=unverified_base_user,
                         )
                     )
+                    # Supervisors are matched from sign-up, verified or not, so the matching data changed
+                    data_version = await self.matching_repo.bump_data_version(conn=self.session)
+                    matching_users = await self.user_repo.get_users_for_matching(
+                        conn=self.session, user_ids=[unverified_user.id]
+                    )
 
                 code = generate_random_code()
                 await self.code_repo.create_code(
@@ -135,6 +146,9 @@ class AuthService:
                 send_code = code
                 user_email = normalize_string(unverified_user.email)
 
+        if matching_users:
+            incremental_matcher.apply_users(matching_users, data_version=data_version)
+
         # Send verification code to email
         self.background_task.add_task(
             send_email,
@@ -166,6 +180,10 @@ class AuthService:
                 )
 
             await self.code_repo.delete_code(conn=self.session, value=code)
+            data_version = await self.matching_repo.bump_data_version(conn=self.session)
+            matching_users = await self.user_repo.get_users_for_matching(
+                conn=self.session, user_ids=[verified_user.id]
+            )
 
             match verified_user.type:
                 case UserType.SUPERVISOR:
@@ -182,6 +200,8 @@ class AuthService:
                 conn=self.session, user_id=verified_user.id
             )
 
+        incremental_matcher.apply_users(matching_users, data_version=data_version)
+
         set_custom_cookie(
             response=response,
             key="refresh_token",
@@ -211,7 +231,7 @@ class AuthService:
                     detail="Invalid login credentials",
                 )
 
-            if not password_is_correct(existing_user.password, password):
+            if not await password_is_correct(existing_user.password, password):
                 raise HTTPException(
                     status_code=HTTP_401_UNAUTHORIZED,
                     detail="Invalid login credentials",
@@ -223,6 +243,12 @@ class AuthService:
                     detail="Invalid login credentials",
                 )
 
+            # Stored hashes move to the current Argon2 parameters without a password reset
+            if new_hash := await rehashed_password(existing_user.password, password):
+                await self.user_repo.update(
+                    conn=self.session, user_id=existing_user.id, values={"password": new_hash}
+                )
+
             access_token: str = await self._new_access_token_from_user(existing_user)
             refresh_token: str = await RefreshToken.new(
                 conn=self.session, user_id=existing_user.id
@@ -277,7 +303,7 @@ class AuthService:
                 raise HTTPException(
                     status_code=HTTP_401_UNAUTHORIZED, detail="Invalid token"
                 )
-            new_password: str = hash_password(new_password)
+            new_password: str = await hash_password(new_password)
             values_to_update: dict = {"password": new_password}
             updated_user: User = await self.user_repo.update(
                 conn=self.session,
@@ -302,7 +328,8 @@ class AuthService:
                     status_code=HTTP_401_UNAUTHORIZED, detail="Invalid token"
                 )
             try:
-                user_id: str = await RefreshToken.decode(self.session, token)
+                # Revokes this token and stores its replacement in one statement
+                user_id, refresh_token = await RefreshToken.rotate(self.session, token)
             except InvalidTokenError:
                 raise HTTPException(
                     status_code=HTTP_401_UNAUTHORIZED, detail="Invalid token"
@@ -311,14 +338,12 @@ class AuthService:
                 conn=self.session, user_id=UUID(user_id)
             )
             if not user:
+                # Rolls the rotation back along with the transaction
                 raise HTTPException(
                     status_code=HTTP_401_UNAUTHORIZED, detail="Invalid token"
                 )
 
             access_token: str = await self._new_access_token_from_user(user)
-            refresh_token: str = await RefreshToken.new(
-                conn=self.session, user_id=UUID(user_id)
-            )
 
         set_custom_cookie(
             response=response,
@@ -0,0 +1,185 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Annotated
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from fastapi import HTTPException
+from fastapi.params import Depends
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.status import HTTP_404_NOT_FOUND
+
+from ..common import JobStatus
+from ..db import SessionLocal, get_db_session
+from ..infra.jobs import job_runner
+from ..logger import logger
+from ..matching import SolverStats
+from ..models.app_models import MatchingJob
+from ..repositories.general_user_repo import UserRepository
+from ..repositories.intern_repo import InternRepository
+from ..repositories.matching_job_repo import MatchingJobRepository
+from ..repositories.matching_repo import MatchingRepository
+from ..repositories.matching_sandbox_repo import MatchingSandboxRepository
+from ..repositories.skill_repo import SkillRepository
+from ..repositories.supervisor_repo import SupervisorRepository
+from ..schemas.matching_schemas import MatchingJobOutModel
+from ..settings import settings
+from .matching_service import MatchingService
+
+STALE_JOB_ERROR = "The server running the job stopped, no match was committed"
+
+
+def _now() -> datetime:
+    return datetime.now(tz=ZoneInfo("UTC"))
+
+
+def _stale_before() -> datetime:
+    return _now() - timedelta(seconds=settings.MATCHING_JOB_STALE_SECONDS)
+
+
+class MatchingJobProgress:
+    """
+    Records a job's progress through its own session, so pollers see it while the
+    matching transaction is still open.
+    """
+
+    def __init__(self, job_id: UUID, session: AsyncSession, job_repo: MatchingJobRepository):
+        self.job_id = job_id
+        self.session = session
+        self.job_repo = job_repo
+        self.progress: dict = {"phase": "matching", "departments": {}}
+        self._lock = asyncio.Lock()  # departments finish concurrently, the session takes one at a time
+
+    async def _save(self, **values) -> None:
+        async with self._lock, self.session.begin():
+            await self.job_repo.update(
+                conn=self.session,
+                job_id=self.job_id,
+                values={"progress": self.progress, "updated_at": _now(), **values},
+            )
+
+    async def _beat(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._save()
+            except Exception as exc:
+                logger.error(f"Bulk matching job {self.job_id} heartbeat failed: {exc}")
+
+    @asynccontextmanager
+    async def heartbeat(self, interval: float):
+        """Keeps `updated_at` fresh while the body runs, so the job is not taken for a dead worker's."""
+        beat = asyncio.create_task(self._beat(interval))
+        try:
+            yield
+        finally:
+            beat.cancel()
+            with suppress(asyncio.CancelledError):
+                await beat
+
+    async def started(self) -> None:
+        await self._save(status=JobStatus.RUNNING, started_at=_now())
+
+    async def department_solved(self, stats: SolverStats) -> None:
+        self.progress["departments"][stats.department] = asdict(stats)
+        await self._save()
+
+    async def assigning(self, proposed: int) -> None:
+        self.progress.update(phase="assigning", proposed=proposed)
+        await self._save()
+
+    async def succeeded(self, result: dict) -> None:
+        self.progress["phase"] = "done"
+        await self._save(status=JobStatus.SUCCEEDED, result=result, finished_at=_now())
+
+    async def failed(self, error: str) -> None:
+        self.progress["phase"] = "failed"
+        await self._save(status=JobStatus.FAILED, error=error, finished_at=_now())
+
+
+async def run_bulk_matching_job(job_id: UUID, capacity: int | None) -> None:
+    async with SessionLocal() as status_session, SessionLocal() as session:
+        progress = MatchingJobProgress(job_id, status_session, MatchingJobRepository())
+        matching_service = MatchingService(
+            intern_repo=InternRepository(),
+            supervisor_repo=SupervisorRepository(),
+            user_repo=UserRepository(),
+            matching_repo=MatchingRepository(),
+            skill_repo=SkillRepository(),
+            sandbox_repo=MatchingSandboxRepository(),
+            session=session,
+        )
+        try:
+            await progress.started()
+            async with progress.heartbeat(settings.MATCHING_JOB_HEARTBEAT_SECONDS):
+                result = await matching_service.perform_bulk_matching(capacity, progress=progress)
+        except asyncio.CancelledError:
+            # The matching transaction rolled back with the cancellation
+            await status_session.rollback()
+            await progress.failed("Interrupted by a server shutdown, no match was committed")
+            raise
+        except HTTPException as exc:
+            await progress.failed(str(exc.detail))
+            return
+        except Exception as exc:
+            logger.error(f"Bulk matching job {job_id} failed: {exc}")
+            await status_session.rollback()
+            await progress.failed("Matching failed and no match was committed. Check server")
+            return
+
+        await progress.succeeded(result)
+
+
+async def fail_stale_jobs(session_factory: async_sessionmaker = SessionLocal) -> None:
+    """
+    Fails the jobs a killed worker left pending or running, at startup. Only those
+    without a heartbeat for MATCHING_JOB_STALE_SECONDS: other workers' jobs go on.
+    A failure is only logged, polling a stale job fails it then.
+    """
+    try:
+        async with session_factory() as session, session.begin():
+            failed = await MatchingJobRepository().fail_stale(
+                conn=session, stale_before=_stale_before(), error=STALE_JOB_ERROR
+            )
+    except Exception as exc:
+        logger.error(f"Could not fail the stale matching jobs: {exc}")
+        return
+    if failed:
+        logger.warning(f"Failed {failed} matching jobs left unfinished by a stopped server")
+
+
+class MatchingJobService:
+    def __init__(
+        self,
+        job_repo: Annotated[MatchingJobRepository, Depends()],
+        session: Annotated[AsyncSession, Depends(get_db_session)],
+    ):
+        self.job_repo = job_repo
+        self.session = session
+
+    async def start_bulk_matching(self, capacity: int | None = None) -> MatchingJobOutModel:
+        async with self.session.begin():
+            job: MatchingJob = await self.job_repo.create(conn=self.session, capacity=capacity)
+
+        # Submitted after the commit, so the runner and pollers find the job row
+        job_runner.submit(run_bulk_matching_job(job.id, capacity), name=f"bulk-matching-{job.id}")
+        return MatchingJobOutModel.from_model(job)
+
+    async def get_job(self, job_id: UUID) -> MatchingJobOutModel:
+        async with self.session.begin():
+            job: MatchingJob = await self.job_repo.get(conn=self.session, job_id=job_id)
+            if not job:
+                raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Matching job not found")
+
+            # Its worker died without a word: fail it now rather than let it run forever
+            stale_before = _stale_before()
+            unfinished = job.status in (JobStatus.PENDING, JobStatus.RUNNING)
+            if unfinished and (job.updated_at or job.created_at) < stale_before:
+                await self.job_repo.fail_stale(
+                    conn=self.session, stale_before=stale_before, error=STALE_JOB_ERROR, job_id=job.id
+                )
+                await self.session.refresh(job)
+
+        return MatchingJobOutModel.from_model(job)
@@ -1,114 +1,614 @@
+import asyncio
+import random
+import time
 from collections import defaultdict
-from typing import Annotated, TYPE_CHECKING
+from dataclasses import asdict
+from datetime import UTC, datetime, timedelta
+from typing import Annotated, AsyncIterator, Awaitable, Callable, NamedTuple, TYPE_CHECKING
 from uuid import UUID
 
+import orjson
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
 from fastapi.params import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_404_NOT_FOUND, HTTP_400_BAD_REQUEST, HTTP_409_CONFLICT
 
 from ..common import DepartmentEnum
-from ..db import get_db_session
+from ..db import SessionLocal, get_db_session
 from ..logger import logger
-from ..matching import matcher
+from ..matching import (
+    EncodedProfile,
+    SolverStats,
+    department_key,
+    partition_by_department,
+    rows_to_matching_details,
+)
+from ..matching_embeddings import get_skill_vectors
+from ..matching_incremental import IncrementalMatcher, incremental_matcher
+from ..matching_pool import embed_in_pool, match_by_embeddings_in_pool, pool_size, run_partitions_in_pool
+from ..matching_sandbox import MatchingSandbox, Scenario, diff_matches, sandboxes
+from ..matching_shared import SharedSnapshot, shared_snapshot
 from ..models.app_models import Supervisor, Intern
+from ..repositories.general_user_repo import UserRepository
 from ..repositories.intern_repo import InternRepository
+from ..repositories.matching_repo import MatchingRepository
+from ..repositories.matching_sandbox_repo import MatchingSandboxRepository
+from ..repositories.skill_repo import SkillRepository
 from ..repositories.supervisor_repo import SupervisorRepository
 from ..schemas.intern_schemas import BasicUserDetails, InternOutModel
+from ..schemas.matching_schemas import SandboxScenarioIn
+from ..settings import settings
+from ..utils import etag_matches
 
 if TYPE_CHECKING:
     from ..common import InternMatchDetail
+    from .matching_job_service import MatchingJobProgress
+
+# Rounds of claims on departments another node holds, the delay doubles each round
+_BUSY_RETRIES = 3
+_BUSY_BACKOFF_SECONDS = 1.0
+
+
+class MatchingInput(NamedTuple):
+    partitions: dict[str, tuple[list[EncodedProfile], list[EncodedProfile]]]
+    loads: dict[str, int]  # interns every supervisor already has
+    # Set when the greedy results are already kept up to date, nothing left to solve
+    score_tables: IncrementalMatcher | None
+    matches: dict | None = None  # already solved, by skill embeddings
+
 
 class MatchingService:
     def __init__(
         self,
         intern_repo: Annotated[InternRepository, Depends()],
         supervisor_repo: Annotated[SupervisorRepository, Depends()],
+        user_repo: Annotated[UserRepository, Depends()],
+        matching_repo: Annotated[MatchingRepository, Depends()],
+        skill_repo: Annotated[SkillRepository, Depends()],
+        sandbox_repo: Annotated[MatchingSandboxRepository, Depends()],
         session: Annotated[AsyncSession, Depends(get_db_session)],
     ):
         self.intern_repo = intern_repo
         self.supervisor_repo = supervisor_repo
+        self.user_repo = user_repo
+        self.matching_repo = matching_repo
+        self.skill_repo = skill_repo
+        self.sandbox_repo = sandbox_repo
         self.session = session
 
-    async def display_matches(self):
+    @staticmethod
+    def _strategy_for(capacity: int | None) -> str:
+        # A capacity turns the per-intern greedy argmax into a global assignment or stable matching
+        return "greedy" if capacity is None else settings.MATCHING_CAPACITY_STRATEGY
+
+    async def _sync_incremental(self) -> None:
+        await incremental_matcher.sync(
+            conn=self.session,
+            supervisor_repo=self.supervisor_repo,
+            intern_repo=self.intern_repo,
+            matching_repo=self.matching_repo,
+        )
+
+    async def _current_shared_snapshot(self) -> SharedSnapshot | None:
+        """The snapshot published for all workers, when it is at the current data version."""
+        snapshot = shared_snapshot.current()
+        if snapshot is None or snapshot.data_version != await self.matching_repo.get_data_version(conn=self.session):
+            return None
+        return snapshot
+
+    @staticmethod
+    def _uses_embeddings(capacity: int | None) -> bool:
+        # Capacitated strategies rank candidates by skill overlap, embeddings only drive the greedy one
+        return settings.USE_ML_MATCHING and capacity is None
+
+    async def _embedding_input(self) -> MatchingInput:
+        """Greedy matches by skill embeddings; only skills never seen before get embedded."""
+        supervisor_rows = await self.supervisor_repo.get_supervisor_matching_rows(conn=self.session)
+        intern_rows = await self.intern_repo.get_unmatched_intern_matching_rows(conn=self.session)
+        supervisors_details, interns_details = rows_to_matching_details(supervisor_rows, intern_rows)
+
+        skill_vectors = get_skill_vectors()
+        skill_ids = {str(skill) for person in supervisors_details + interns_details for skill in person["skills"]}
+        # Embedding and matching are CPU work for the pool, the vector file is read and written in threads
+        if missing := await asyncio.to_thread(skill_vectors.missing, skill_ids):
+            names = await self.skill_repo.get_skill_names(conn=self.session, skill_ids=missing)
+            if names:
+                embedded = await embed_in_pool(skill_vectors.backend, list(names.values()))
+                await asyncio.to_thread(skill_vectors.store, dict(zip(names, embedded)))
+
+        matches = await match_by_embeddings_in_pool(
+            supervisors_details,
+            interns_details,
+            skill_vectors.vectors,
+            skill_vectors.dimension or 1,  # no skill has a vector: every profile is zeros, of any size
+        )
+        return MatchingInput(
+            partition_by_department(supervisors_details, interns_details),
+            {s["id"]: s["intern_count"] for s in supervisors_details},
+            None,
+            matches,
+        )
+
+    async def _matching_input(self, capacity: int | None = None, embeddings: bool = True) -> MatchingInput:
+        """What to solve, from the warmest source available: a snapshot, else the matching rows."""
+        if embeddings and self._uses_embeddings(capacity):
+            return await self._embedding_input()
+
+        snapshot = None
+        if settings.MATCHING_SNAPSHOT == "shared":
+            snapshot = await self._current_shared_snapshot()
+        elif settings.INCREMENTAL_MATCHING:
+            await self._sync_incremental()
+            snapshot = incremental_matcher
+
+        if snapshot is not None:
+            score_tables = None
+            # IDF tables keep no per-intern results, their departments are solved in the pool
+            if snapshot is incremental_matcher and capacity is None and settings.MATCHING_METHOD != "idf":
+                score_tables = incremental_matcher
+            return MatchingInput(snapshot.partitions(), snapshot.loads(), score_tables)
+
+        supervisor_rows = await self.supervisor_repo.get_supervisor_matching_rows(conn=self.session)
+        intern_rows = await self.intern_repo.get_unmatched_intern_matching_rows(conn=self.session)
+        supervisors_details, interns_details = rows_to_matching_details(supervisor_rows, intern_rows)
+        return MatchingInput(
+            partition_by_department(supervisors_details, interns_details),
+            {s["id"]: s["intern_count"] for s in supervisors_details},
+            None,
+        )
+
+    async def _solve(
+        self,
+        matching_input: MatchingInput,
+        capacity: int | None = None,
+        departments: list[str] | None = None,
+        stats: list[SolverStats] | None = None,
+        on_department: Callable[[SolverStats], Awaitable[None]] | None = None,
+    ) -> dict:
+        """Matches of all departments, or of `departments` only."""
+        matches = matching_input.matches
+        if matches is None and matching_input.score_tables is not None:
+            matches = matching_input.score_tables.matches()
+        if matches is not None:
+            return matches if departments is None else {d: matches[d] for d in departments if d in matches}
+
+        partitions = matching_input.partitions
+        if departments is not None:
+            partitions = {d: partitions[d] for d in departments if d in partitions}
+        capacities = None
+        if capacity is not None:
+            capacities = {s_id: capacity - load for s_id, load in matching_input.loads.items()}
+        return await run_partitions_in_pool(
+            partitions,
+            settings.MATCHING_METHOD,
+            strategy=self._strategy_for(capacity),
+            capacities=capacities,
+            stats=stats,
+            on_department=on_department,
+        )
+
+    async def _compute_matches(
+        self,
+        capacity: int | None = None,
+        stats: list[SolverStats] | None = None,
+        on_department: Callable[[SolverStats], Awaitable[None]] | None = None,
+    ) -> dict:
+        return await self._solve(
+            await self._matching_input(capacity), capacity, stats=stats, on_department=on_department
+        )
+
+    @staticmethod
+    def _proposals_key(capacity: int | None) -> str:
+        strategy = "greedy" if capacity is None else f"{settings.MATCHING_CAPACITY_STRATEGY}:{capacity}"
+        if MatchingService._uses_embeddings(capacity):
+            return f"embeddings-{get_skill_vectors().backend.name}:{strategy}"
+        return f"{settings.MATCHING_METHOD}:{strategy}"
+
+    def _proposals_etag(self, capacity: int | None, data_version: int, ndjson: bool = False) -> str:
+        # The NDJSON stream is another representation of the same proposals, a strong ETag tells them apart
+        return f'"{self._proposals_key(capacity)}-{data_version}{"-ndjson" if ndjson else ""}"'
+
+    async def display_matches(
+        self, capacity: int | None = None, if_none_match: str | None = None
+    ) -> tuple[str, dict | None]:
+        """
+        Returns the ETag of the current proposals and the proposals themselves, or None
+        when `if_none_match` already names them. Proposals are stored per data version
+        and only recomputed once interns, supervisors, skills or matches changed.
+        """
+        key = self._proposals_key(capacity)
         async with self.session.begin():
-            supervisors_from_db: list[Supervisor] = \
-                await self.supervisor_repo.get_supervisors_details(conn=self.session)
+            # Read before the matching inputs, so a concurrent change can only make the
+            # stored proposals fresher than their version, never staler
+            data_version = await self.matching_repo.get_data_version(conn=self.session)
+            etag = self._proposals_etag(capacity, data_version)
+            if etag_matches(if_none_match, etag):
+                return etag, None
 
-            unmatched_interns_from_db: list[Intern] = \
-                await self.intern_repo.get_unmatched_interns(conn=self.session)
+            proposal = await self.matching_repo.get_proposal(conn=self.session, key=key)
+            if proposal is not None and proposal.data_version == data_version:
+                return etag, proposal.proposals
 
-            supervisor_map = {str(s.id): s for s in supervisors_from_db}
-            intern_map = {str(i.id): i for i in unmatched_interns_from_db}
+            proposals = jsonable_encoder(await self._build_match_details(capacity))
+            await self.matching_repo.save_proposal(
+                conn=self.session, key=key, data_version=data_version, proposals=proposals
+            )
 
-            match_details: dict[
-                str, list[tuple[BasicUserDetails, list[dict]]]
-            ] = defaultdict(list)
+        return etag, proposals
+
+    @staticmethod
+    def _format_match_group(
+        supervisor: Supervisor, intern_matches: list["InternMatchDetail"], intern_map: dict[str, Intern]
+    ) -> tuple[BasicUserDetails, list[dict]]:
+        formatted_supervisor: BasicUserDetails = BasicUserDetails(
+            firstname=supervisor.user.firstname,
+            lastname=supervisor.user.lastname,
+            department=DepartmentEnum(supervisor.user.department_id),
+            email=supervisor.user.email,
+            phone_number=supervisor.user.phone_number,
+            skills= [skill.name for skill in supervisor.user.skills]
+        )
+
+        formatted_intern_list: list[dict] = [
+            {
+                "firstname": intern_map[intern.intern_id].user.firstname,
+                "lastname": intern_map[intern.intern_id].user.lastname,
+                "department": DepartmentEnum(intern_map[intern.intern_id].user.department_id),
+                "email": intern_map[intern.intern_id].user.email,
+                "phone_number": intern_map[intern.intern_id].user.phone_number,
+                "skills": [
+                            skill.name
+                            for skill in intern_map[intern.intern_id].user.skills
+                        ],
+                "similarity": f"{(intern.similarity * 100):.2f}%"
+            }
+            for intern in intern_matches # type: InternMatchDetail
+        ]
+        return formatted_supervisor, formatted_intern_list
+
+    async def stream_matches(
+        self, capacity: int | None = None, if_none_match: str | None = None
+    ) -> tuple[str, AsyncIterator[bytes] | None]:
+        """
+        display_matches as NDJSON, one line per supervisor and its proposed interns. Only
+        the compact (id, similarity) matches are held; people's details are loaded one
+        department at a time while the lines go out.
+        """
+        async with self.session.begin():
+            data_version = await self.matching_repo.get_data_version(conn=self.session)
+            etag = self._proposals_etag(capacity, data_version, ndjson=True)
+            if etag_matches(if_none_match, etag):
+                return etag, None
+            matches: dict = await self._compute_matches(capacity)
 
-            matches: dict = matcher(supervisors_from_db, unmatched_interns_from_db)
+        return etag, self._iter_match_lines(matches)
 
+    async def _iter_match_lines(self, matches: dict) -> AsyncIterator[bytes]:
+        # Its own session: the request's one is closed once the response has started
+        async with SessionLocal() as session:
             for department, department_matches in matches.items():
+                supervisors: list[Supervisor] = await self.supervisor_repo.get_supervisors_by_ids(
+                    conn=session, ids=[UUID(s_id) for s_id in department_matches]
+                )
+                interns: list[Intern] = await self.intern_repo.get_interns_by_ids(
+                    conn=session,
+                    ids=[
+                        UUID(intern.intern_id)
+                        for intern_matches in department_matches.values()
+                        for intern in intern_matches
+                    ],
+                )
+                supervisor_map = {str(s.id): s for s in supervisors}
+                intern_map = {str(i.id): i for i in interns}
+
                 for supervisor_id, intern_matches in department_matches.items():
-                    supervisor_details = supervisor_map[supervisor_id]
-
-                    formatted_supervisor: BasicUserDetails = BasicUserDetails(
-                        firstname=supervisor_details.user.firstname,
-                        lastname=supervisor_details.user.lastname,
-                        department=DepartmentEnum(supervisor_details.user.department_id),
-                        email=supervisor_details.user.email,
-                        phone_number=supervisor_details.user.phone_number,
-                        skills= [skill.name for skill in supervisor_details.user.skills]
+                    # People deleted since the matches were computed are left out
+                    intern_matches = [intern for intern in intern_matches if intern.intern_id in intern_map]
+                    if supervisor_id not in supervisor_map or not intern_matches:
+                        continue
+                    formatted_supervisor, formatted_interns = self._format_match_group(
+                        supervisor_map[supervisor_id], intern_matches, intern_map
                     )
-
-                    formatted_intern_list: list[dict] = [
+                    yield orjson.dumps(
                         {
-                            "firstname": intern_map[intern.intern_id].user.firstname,
-                            "lastname": intern_map[intern.intern_id].user.lastname,
-                            "department": DepartmentEnum(intern_map[intern.intern_id].user.department_id),
-                            "email": intern_map[intern.intern_id].user.email,
-                            "phone_number": intern_map[intern.intern_id].user.phone_number,
-                            "skills": [
-                                        skill.name
-                                        for skill in intern_map[intern.intern_id].user.skills
-                                    ],
-                            "similarity": f"{(intern.similarity * 100):.2f}%"
+                            "department": department,
+                            "supervisor": formatted_supervisor.model_dump(mode="json"),
+                            "interns": formatted_interns,
                         }
-                        for intern in intern_matches # type: InternMatchDetail
-                    ]
+                    ) + b"\n"
+                # Let the department's people go before loading the next one
+                session.expunge_all()
 
-                    match_details[department].append(
-                        (formatted_supervisor, formatted_intern_list)
-                    )
+    async def _build_match_details(self, capacity: int | None = None):
+        matches: dict = await self._compute_matches(capacity)
+
+        # Only the matched people need their details loaded
+        supervisor_ids = [UUID(s_id) for dept in matches.values() for s_id in dept]
+        intern_ids = [
+            UUID(intern.intern_id)
+            for dept in matches.values()
+            for intern_matches in dept.values()
+            for intern in intern_matches
+        ]
+        supervisors_from_db: list[Supervisor] = await self.supervisor_repo.get_supervisors_by_ids(
+            conn=self.session, ids=supervisor_ids
+        )
+        unmatched_interns_from_db: list[Intern] = await self.intern_repo.get_interns_by_ids(
+            conn=self.session, ids=intern_ids
+        )
+
+        supervisor_map = {str(s.id): s for s in supervisors_from_db}
+        intern_map = {str(i.id): i for i in unmatched_interns_from_db}
+
+        match_details: dict[
+            str, list[tuple[BasicUserDetails, list[dict]]]
+        ] = defaultdict(list)
 
-            return match_details
+        for department, department_matches in matches.items():
+            for supervisor_id, intern_matches in department_matches.items():
+                match_details[department].append(
+                    self._format_match_group(supervisor_map[supervisor_id], intern_matches, intern_map)
+                )
+
+        return match_details
+
+    async def recommend_supervisors(self, intern_id: UUID, k: int = 5) -> list[dict]:
+        """The k supervisors of the intern's department that share the most skills with it, best first."""
+        async with self.session.begin():
+            # Recommendations may lag the shared snapshot's refresh, supervisor details are read fresh below
+            snapshot = shared_snapshot.current() if settings.MATCHING_SNAPSHOT == "shared" else None
+            if snapshot is None:
+                await self._sync_incremental()
+                snapshot = incremental_matcher
+
+            if (cached := snapshot.cached_intern(str(intern_id))) is not None:
+                department, profile = cached
+            else:
+                # Interns already matched (or not verified yet) are not kept warm
+                intern: Intern = await self.intern_repo.get_intern_by_id(
+                    conn=self.session, intern_id=intern_id
+                )
+                if not intern:
+                    raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Intern not found")
+                department = department_key(intern.user.department_id)
+                profile = snapshot.encode_intern(
+                    str(intern.id), [skill.id for skill in intern.user.skills]
+                )
+
+            recommendations = snapshot.recommend(department, profile, k)
+            supervisors: list[Supervisor] = await self.supervisor_repo.get_supervisors_by_ids(
+                conn=self.session, ids=[UUID(supervisor_id) for supervisor_id, _ in recommendations]
+            )
 
-    async def perform_bulk_matching(self):
+        supervisor_map = {str(s.id): s for s in supervisors}
+        return [
+            {
+                "supervisor_id": supervisor_id,
+                "firstname": supervisor_map[supervisor_id].user.firstname,
+                "lastname": supervisor_map[supervisor_id].user.lastname,
+                "department": DepartmentEnum(supervisor_map[supervisor_id].user.department_id),
+                "email": supervisor_map[supervisor_id].user.email,
+                "phone_number": supervisor_map[supervisor_id].user.phone_number,
+                "skills": [skill.name for skill in supervisor_map[supervisor_id].user.skills],
+                "similarity": f"{(similarity * 100):.2f}%",
+            }
+            for supervisor_id, similarity in recommendations
+            if supervisor_id in supervisor_map  # removed since the index was synced
+        ]
+
+    async def create_sandbox(self, owner_id: UUID, capacity: int | None = None) -> dict:
+        """
+        Snapshots the matching inputs for what-if scenarios, with the current settings as
+        baseline. Persisted for every worker, the owner's oldest beyond
+        MATCHING_SANDBOXES_PER_USER are dropped.
+        """
         async with self.session.begin():
-            supervisors: list[
-                Supervisor
-            ] = await self.supervisor_repo.get_supervisors_details(conn=self.session)
-            unmatched_interns: list[
-                Intern
-            ] = await self.intern_repo.get_unmatched_interns(conn=self.session)
+            data_version = await self.matching_repo.get_data_version(conn=self.session)
+            # Sandbox scenarios re-solve by skill overlap
+            matching_input = await self._matching_input(capacity, embeddings=False)
 
-            matches: dict = matcher(supervisors, unmatched_interns)
+        baseline = Scenario(
+            method=settings.MATCHING_METHOD,
+            capacity=capacity,
+            capacity_strategy=settings.MATCHING_CAPACITY_STRATEGY,
+        )
+        sandbox = MatchingSandbox(matching_input.partitions, matching_input.loads, baseline, solve=False)
+        sandbox.baseline = await self._run_scenario(sandbox, baseline)
+        async with self.session.begin():
+            saved = await self.sandbox_repo.create(
+                conn=self.session,
+                owner_id=owner_id,
+                inputs=sandbox.dump(),
+                expires_at=datetime.now(UTC) + timedelta(seconds=settings.MATCHING_SANDBOX_TTL_SECONDS),
+            )
+            dropped = await self.sandbox_repo.delete_all_but_newest(
+                conn=self.session, owner_id=owner_id, keep=settings.MATCHING_SANDBOXES_PER_USER
+            )
+        for sandbox_id in dropped:
+            sandboxes.remove(str(sandbox_id))
+        sandboxes.add(str(saved.id), sandbox)
+
+        placements = [
+            match
+            for department_matches in sandbox.baseline.values()
+            for intern_matches in department_matches.values()
+            for match in intern_matches
+        ]
+        return {
+            "sandbox_id": str(saved.id),
+            "data_version": data_version,
+            "method": baseline.method,
+            "capacity": baseline.capacity,
+            "matched": len(placements),
+            "similarity": sum(match.similarity for match in placements),
+            "expires_at": saved.expires_at,
+        }
+
+    @staticmethod
+    async def _run_scenario(sandbox: MatchingSandbox, scenario: Scenario) -> dict:
+        """The scenario's results, with the departments the memo does not answer solved in the pool."""
+        plan = sandbox.plan(scenario)
+        solved = await run_partitions_in_pool(
+            plan.unsolved, scenario.method, strategy=scenario.strategy, capacities=plan.capacities
+        )
+        return sandbox.settle(plan, solved)
+
+    async def _get_sandbox(self, sandbox_id: UUID, owner_id: UUID) -> MatchingSandbox:
+        """The owner's sandbox, from this worker's cache or else rebuilt from its persisted copy."""
+        async with self.session.begin():
+            # Checked even when cached: it may have been deleted or dropped through another worker
+            sandbox = sandboxes.get(str(sandbox_id))
+            if sandbox is not None and not await self.sandbox_repo.exists(
+                conn=self.session, sandbox_id=sandbox_id, owner_id=owner_id
+            ):
+                sandboxes.remove(str(sandbox_id))
+                sandbox = None
+            elif sandbox is None and (inputs := await self.sandbox_repo.get_inputs(
+                conn=self.session, sandbox_id=sandbox_id, owner_id=owner_id
+            )) is not None:
+                sandbox = MatchingSandbox.load(inputs)
+                sandboxes.add(str(sandbox_id), sandbox)
+        if sandbox is None:
+            raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Sandbox not found or expired")
+        return sandbox
 
+    async def try_sandbox_scenario(
+        self, sandbox_id: UUID, owner_id: UUID, scenario_in: SandboxScenarioIn
+    ) -> dict:
+        """Runs a scenario in the sandbox, returns how its placements differ from the baseline's."""
+        sandbox = await self._get_sandbox(sandbox_id, owner_id)
+        baseline = sandbox.baseline_scenario
+        scenario = Scenario(
+            method=scenario_in.method or baseline.method,
+            capacity=scenario_in.capacity if "capacity" in scenario_in.model_fields_set else baseline.capacity,
+            capacity_strategy=scenario_in.capacity_strategy or baseline.capacity_strategy,
+            supervisor_capacities={str(s_id): cap for s_id, cap in scenario_in.supervisor_capacities.items()},
+            moves={str(s_id): department.name for s_id, department in scenario_in.moves.items()},
+            removed_supervisors=frozenset(map(str, scenario_in.removed_supervisors)),
+            removed_interns=frozenset(map(str, scenario_in.removed_interns)),
+        )
+        start = time.perf_counter()
+        try:
+            results = await self._run_scenario(sandbox, scenario)
+        except ValueError as exc:
+            raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=str(exc))
+        diff = diff_matches(sandbox.baseline, results)
+        diff["duration_ms"] = (time.perf_counter() - start) * 1000
+        return diff
+
+    async def delete_sandbox(self, sandbox_id: UUID, owner_id: UUID) -> dict:
+        async with self.session.begin():
+            deleted = await self.sandbox_repo.delete(
+                conn=self.session, sandbox_id=sandbox_id, owner_id=owner_id
+            )
+        if not deleted:
+            raise HTTPException(status_code=HTTP_404_NOT_FOUND, detail="Sandbox not found or expired")
+        sandboxes.remove(str(sandbox_id))
+        return {"detail": "Sandbox deleted"}
+
+    async def perform_bulk_matching(
+        self, capacity: int | None = None, progress: "MatchingJobProgress | None" = None
+    ):
+        """
+        Matches and assigns every department this node can claim. A department is claimed
+        with a transaction-level advisory lock right before it is solved, so nodes running
+        at the same time split the departments between them instead of racing on them, and
+        the claims of a node that crashed vanish with its connection. The data version is
+        checked after every claim: a node that finished meanwhile changed the data, so the
+        input is reloaded before the department is solved. Departments busy on another node
+        are retried _BUSY_RETRIES times with a growing delay, then reported as busy.
+        """
+        stats: list[SolverStats] = []
+        matches: dict = {}
+        busy: list[str] = []
+        on_department = progress and progress.department_solved
+        claim_lock = asyncio.Lock()  # claims share the session, solving runs alongside
+
+        async with self.session.begin():
+            data_version = await self.matching_repo.get_data_version(conn=self.session)
+            matching_input = await self._matching_input(capacity)
+            # The input of the latest version seen, reloaded once per change
+            current = {"data_version": data_version, "input": matching_input}
+
+            async def claim_and_solve(queue: list[str]) -> None:
+                while queue:
+                    department = queue.pop()
+                    async with claim_lock:
+                        claimed = await self.matching_repo.try_lock_department(
+                            conn=self.session, department_id=DepartmentEnum[department].value
+                        )
+                        if claimed:
+                            version = await self.matching_repo.get_data_version(conn=self.session)
+                            if version != current["data_version"]:
+                                current["input"] = await self._matching_input(capacity)
+                                current["data_version"] = version
+                    if not claimed:
+                        busy.append(department)
+                        continue
+                    matches.update(await self._solve(
+                        current["input"], capacity, [department], stats=stats, on_department=on_department
+                    ))
+
+            queue = [dept for dept, (_, interns) in matching_input.partitions.items() if interns]
+            random.shuffle(queue)  # nodes starting together begin on different departments
+            await asyncio.gather(*(claim_and_solve(queue) for _ in range(pool_size())))
+
+            for attempt in range(_BUSY_RETRIES):
+                if not busy:
+                    break
+                # Claims of a node that finished or crashed since are free again
+                await asyncio.sleep(_BUSY_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+                queue, busy = busy, []
+                await asyncio.gather(*(claim_and_solve(queue) for _ in range(pool_size())))
+            if busy:
+                logger.info(f"Departments {', '.join(busy)} are being matched by another node")
+            timed_out = sorted(dept_stats.department for dept_stats in stats if dept_stats.timed_out)
+            if timed_out:
+                # Their leftover interns were placed wherever there was room
+                logger.warning(f"Departments {', '.join(timed_out)} ran out of matching time")
+
+            pairs: list[tuple[UUID, UUID]] = []
+            pair_departments: dict[UUID, str] = {}
             for department, department_match in matches.items():
                 logger.info(f"Matching for department: {department}")
 
                 for supervisor_id, intern_matches in department_match.items():
                     for intern in intern_matches: # type: InternMatchDetail
-                        try:
-                            await self.intern_repo.assign_supervisor_to_intern(
-                                conn=self.session,
-                                supervisor_id=UUID(supervisor_id),
-                                intern_id=UUID(intern.intern_id),
-                            )
-                        except ValueError:
-                            logger.info(f"Intern {intern.intern_id} does not exist")
-                            continue
-
-        return {"detail": "Matching performed successfully"}
+                        pairs.append((UUID(intern.intern_id), UUID(supervisor_id)))
+                        pair_departments[pairs[-1][0]] = department
+
+            if progress is not None:
+                await progress.assigning(len(pairs))
+            assigned_intern_ids = set()
+            if pairs:
+                assigned_intern_ids = await self.intern_repo.bulk_assign_supervisors(
+                    conn=self.session, pairs=pairs
+                )
+            if assigned_intern_ids:
+                data_version = await self.matching_repo.bump_data_version(conn=self.session)
+
+        skipped = [str(intern_id) for intern_id, _ in pairs if intern_id not in assigned_intern_ids]
+        if skipped:
+            logger.info(f"{len(skipped)} interns were removed or matched meanwhile and got skipped")
+
+        if assigned_intern_ids:
+            incremental_matcher.interns_matched(
+                [pair for pair in pairs if pair[0] in assigned_intern_ids], data_version=data_version
+            )
+
+        departments: dict[str, dict[str, int]] = defaultdict(lambda: {"assigned": 0, "skipped": 0})
+        for intern_id, department in pair_departments.items():
+            departments[department]["assigned" if intern_id in assigned_intern_ids else "skipped"] += 1
+        return {
+            "detail": "Matching performed successfully",
+            "assigned": len(assigned_intern_ids),
+            "skipped": skipped,
+            "departments": dict(departments),
+            "busy_departments": sorted(busy),
+            "timed_out_departments": timed_out,
+            "stats": [asdict(department_stats) for department_stats in stats],
+        }
 
     async def manually_match_supervisor_to_intern(self, supervisor_id: UUID, intern_id: UUID):
         async with self.session.begin():
@@ -149,8 +649,10 @@ class MatchingService:
                 interns_to_assign=[intern],
                 conn=self.session
             )
+            data_version = await self.matching_repo.bump_data_version(conn=self.session)
 
-            return [InternOutModel.from_model(intern) for intern in assigned_interns]
+        incremental_matcher.interns_matched([(intern_id, supervisor_id)], data_version=data_version)
+        return [InternOutModel.from_model(intern) for intern in assigned_interns]
 
     async def unmatch_supervisor_from_intern(self, intern_id: UUID):
         async with self.session.begin():
@@ -165,9 +667,20 @@ class MatchingService:
                     detail="Intern has not been assigned a supervisor yet"
                 )
 
+            previous_supervisor_id = intern.supervisor_id
             await self.intern_repo.unassign_supervisor(
                 conn=self.session,
                 intern_id=intern_id
             )
+            data_version = await self.matching_repo.bump_data_version(conn=self.session)
 
-            return {"detail": "Successfully unmatched intern from supervisor"}
\ No newline at end of file
+        incremental_matcher.intern_unmatched(
+            {
+                "id": str(intern.id),
+                "department": department_key(intern.user.department_id),
+                "skills": [skill.id for skill in intern.user.skills],
+            },
+            supervisor_id=previous_supervisor_id,
+            data_version=data_version,
+        )
+        return {"detail": "Successfully unmatched intern from supervisor"}
\ No newline at end of file
@@ -9,8 +9,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.status import HTTP_409_CONFLICT
 
 from src.db import get_db_session
+from src.matching_incremental import incremental_matcher
 from src.models import User
 from src.repositories import SkillRepository, UserRepository
+from src.repositories.matching_repo import MatchingRepository
 from src.schemas.skill_schemas import SkillCreate, SkillRes
 
 
@@ -20,16 +22,23 @@ class SkillService:
         session: Annotated[AsyncSession, Depends(get_db_session)],
         repo: Annotated[SkillRepository, Depends()],
         user_repo: Annotated[UserRepository, Depends()],
+        matching_repo: Annotated[MatchingRepository, Depends()],
     ):
         self.session = session
         self.skill_repo = repo
         self.user_repo = user_repo
+        self.matching_repo = matching_repo
 
     async def add_skills_to_user(self, user_id: uuid.UUID, skills: list[SkillCreate]):
         async with self.session.begin():
             await self.skill_repo.attach_skills_to_user(
                 conn=self.session, user_id=user_id, skills=skills
             )
+            data_version = await self.matching_repo.bump_data_version(conn=self.session)
+            matching_users = await self.user_repo.get_users_for_matching(
+                conn=self.session, user_ids=[user_id]
+            )
+        incremental_matcher.apply_users(matching_users, data_version=data_version)
 
         return {"message": "Skills added successfully"}
 
@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import EmailStr
-from typing import Annotated
+from typing import Annotated, Literal
 
 
 class Settings(BaseSettings):
@@ -18,9 +18,42 @@ class Settings(BaseSettings):
     SMTP_PORT: int
     SMTP_PASSWORD: str
 
-    USE_ML_MATCHING: bool
+    USE_ML_MATCHING: bool  # greedy matching by skill embeddings instead of skill overlap
+    EMBEDDING_BACKEND: Literal["hashing", "sentence_transformers"] = "hashing"
+    EMBEDDING_DIMENSION: int = 256  # of the hashing backend
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_CACHE_PATH: str = ".cache/skill-vectors"  # empty keeps vectors in memory only
+    MATCHING_METHOD: Literal["jaccard", "intern_ratio", "supervisor_ratio", "idf"] = "jaccard"
+    # Solver used when matching with a supervisor capacity
+    MATCHING_CAPACITY_STRATEGY: Literal["assignment", "stable"] = "assignment"
+    INCREMENTAL_MATCHING: bool = True
+    MATCHING_WORKERS: int = 0  # matching processes, 0 means one per CPU
+    MATCHING_RECONCILE_SECONDS: int = 600  # snapshot vs database check, 0 disables it
+    # "shared": one worker publishes the snapshot to MATCHING_SNAPSHOT_PATH, every worker maps it
+    MATCHING_SNAPSHOT: Literal["process", "shared"] = "process"
+    MATCHING_SNAPSHOT_PATH: str = "/dev/shm/intern-compass-matching.snapshot"
+    MATCHING_SNAPSHOT_REFRESH_SECONDS: float = 2
+    # A running job's heartbeat; unfinished jobs silent for MATCHING_JOB_STALE_SECONDS are failed
+    MATCHING_JOB_HEARTBEAT_SECONDS: float = 15
+    MATCHING_JOB_STALE_SECONDS: float = 120
+    MATCHING_SANDBOXES_PER_USER: int = 3  # creating one more drops the user's oldest
+    MATCHING_SANDBOX_TTL_SECONDS: int = 1800
     RATE_LIMIT_ENABLED: bool
 
+    ACCESS_TOKEN_CACHE_SIZE: int = 10_000  # verified access tokens kept per worker, 0 disables
+    # Expired tokens, verification codes and matching sandboxes are deleted this often, 0 disables
+    EXPIRED_ROWS_PURGE_SECONDS: float = 900
+    EXPIRED_ROWS_PURGE_BATCH_SIZE: int = 500
+
+    # Argon2 runs in its own threads: excess calls queue up to the limit, then get a 503
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 64
+    PASSWORD_HASH_TIMEOUT_SECONDS: float = 5
+    # Pick them with `python -m src.infra.argon2_calibration`; older hashes migrate on login
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+
     model_config = SettingsConfigDict(
         env_file=".env",
     )
@@ -1,42 +1,66 @@
 import random
+import re
 from datetime import timedelta
 from enum import StrEnum
 from typing import Annotated
 
-import argon2
-from argon2 import PasswordHasher
 from fastapi import HTTPException
 from fastapi.params import Depends
 from fastapi.security import OAuth2PasswordBearer
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from starlette.responses import Response
-from starlette.status import HTTP_403_FORBIDDEN, HTTP_401_UNAUTHORIZED
+from starlette.status import HTTP_403_FORBIDDEN, HTTP_401_UNAUTHORIZED, HTTP_503_SERVICE_UNAVAILABLE
 
 from .logger import logger
 from .schemas.user_schemas import UserOutModel, UserType
+from .infra.password_hasher import PasswordHashingBusy, password_hasher
 from .infra.token import InvalidTokenError, AccessToken
 from .settings import settings
 
-ph: PasswordHasher = PasswordHasher()
-
 
 class TokenType(StrEnum):
     ACCESS = "access"
     PASSWORD_RESET = "password_reset"
 
 
-def password_is_correct(user_password: str, supplied_password: str) -> bool:
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many requests at once, please try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def password_is_correct(user_password: str, supplied_password: str) -> bool:
     try:
-        if ph.verify(user_password, supplied_password):
-            return True
-    except argon2.exceptions.VerifyMismatchError as e:
-        logger.error(f"Invalid Password: {e}")
-    return False
+        return await password_hasher.verify(user_password, supplied_password)
+    except PasswordHashingBusy as e:
+        logger.error(e)
+        raise _hashing_busy()
 
 
-def hash_password(password: str) -> str:
-    return ph.hash(password)
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHashingBusy as e:
+        logger.error(e)
+        raise _hashing_busy()
+
+
+async def rehashed_password(password_hash: str, password: str) -> str | None:
+    """
+    A hash of the (verified) password with the current Argon2 parameters when
+    `password_hash` was made with older ones. None when it is current, or when hashing
+    is too busy right now: it migrates on a later login then.
+    """
+    if not password_hasher.needs_rehash(password_hash):
+        return None
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHashingBusy as e:
+        logger.error(e)
+        return None
 
 
 def generate_random_code() -> str:
@@ -88,6 +112,23 @@ def normalize_string(string: str) -> str:
     return string.lower().strip()
 
 
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Whether an If-None-Match header names `etag`, by the weak comparison of RFC 9110
+    (section 13.1.2): `W/` prefixes are ignored, the header may list several entity
+    tags, and `*` matches any current representation.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(tag == opaque_tag for tag in _ENTITY_TAG.findall(if_none_match))
+
+
 limiter = Limiter(
     key_func=get_remote_address,
     default_limits=["100/hour"],
@@ -0,0 +1,79 @@
+"""Tests for purging expired tokens and verification codes"""
+
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.infra.maintenance import purge_expired
+from src.infra.token import delete_expired_tokens
+from src.repositories.verification_code_repo import VerificationCodeRepository
+
+pytestmark = pytest.mark.asyncio
+
+
+def sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+class FakeSession:
+    transactions = 0
+
+    def begin(self):
+        @asynccontextmanager
+        async def transaction():
+            FakeSession.transactions += 1
+            yield
+
+        return transaction()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        return False
+
+
+class TestPurgeExpired:
+    async def test_deletes_in_batches_until_one_comes_short(self):
+        FakeSession.transactions = 0
+        tokens = AsyncMock(side_effect=[3, 3, 1])
+        codes = AsyncMock(return_value=0)
+
+        deleted = await purge_expired(3, FakeSession, {"token": tokens, "verification_code": codes})
+
+        assert deleted == {"token": 7, "verification_code": 0}
+        assert tokens.await_count == 3 and codes.await_count == 1
+        assert FakeSession.transactions == 4  # one short transaction per batch
+
+    async def test_batches_are_limited_and_skip_locked_rows(self):
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock(rowcount=2)
+
+        assert await delete_expired_tokens(conn, 500) == 2
+        assert await VerificationCodeRepository().delete_expired(conn, 500) == 2
+
+        for call in conn.execute.call_args_list:
+            statement = sql(call.args[0])
+            assert "expires_at <=" in statement and "LIMIT" in statement
+            assert "FOR UPDATE SKIP LOCKED" in statement
+
+
+class TestVerificationCodeExpiry:
+    async def test_get_code_ignores_expired_codes(self):
+        conn = AsyncMock()
+        conn.execute.return_value = MagicMock()
+
+        await VerificationCodeRepository().get_code(conn, "123456")
+
+        assert "verification_code.expires_at >" in sql(conn.execute.call_args.args[0])
+
+    async def test_resending_a_code_renews_its_expiry(self):
+        conn = AsyncMock()
+
+        await VerificationCodeRepository().upsert_code_with_user_id(conn, user_id=MagicMock(), value="123456")
+
+        statement = sql(conn.execute.call_args.args[0])
+        assert "ON CONFLICT (user_id) DO UPDATE SET" in statement
+        assert "expires_at =" in statement.split("DO UPDATE SET")[1]
@@ -0,0 +1,902 @@
+"""Tests for the matching engine"""
+
+import itertools
+import json
+import math
+import random
+import uuid
+from array import array
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import Executor
+from concurrent.futures.process import BrokenProcessPool
+
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from src.common import DepartmentEnum, InternMatchDetail
+from src.matching import (
+    IdfWeights,
+    SkillIndex,
+    SkillVocabulary,
+    SolverStats,
+    bitset_similarity,
+    encode_profiles,
+    match_interns_to_supervisors,
+    match_partitions,
+    partition_by_department,
+    rows_to_matching_details,
+    run_matching,
+    supervisor_capacities,
+    skills_similarity,
+    top_supervisors,
+)
+import src.matching_assignment as matching_assignment
+from src.matching_assignment import EPSILON_SCHEDULE, assign_with_capacity
+from src.matching_embeddings import (
+    HashingBackend,
+    SkillVectorCache,
+    cosine_scores,
+    match_by_embeddings,
+    profile_vector,
+    unpack_rows,
+)
+from src.matching_incremental import IncrementalMatcher
+from src.matching_lsh import LshIndex, MinHasher
+import src.matching_pool as matching_pool
+from src.matching_pool import embed_in_pool, match_by_embeddings_in_pool, run_partitions_in_pool, shutdown_pool
+import src.matching_sandbox as matching_sandbox
+from src.matching_sandbox import MatchingSandbox, Scenario, diff_matches
+import src.matching_shared as matching_shared
+from src.matching_shared import SharedSnapshotReader, remove_stale_temporaries, write_snapshot
+from src.matching_stable import stable_match
+
+SKILLS = [f"skill-{i}" for i in range(40)]
+DEPARTMENTS = ["FINANCE", "INFORMATION_TECHNOLOGY", "MARKETING"]
+
+
+def reference_match(supervisors_list: list, interns_list: list, method: str = "jaccard"):
+    """The original O(interns x supervisors) set-based loop."""
+    matches_ = defaultdict(list)
+    for intern in interns_list:
+        best_supervisor = None
+        best_score = -1
+        for supervisor in supervisors_list:
+            score = skills_similarity(intern["skills"], supervisor["skills"], method)
+            if score > best_score:
+                best_score = score
+                best_supervisor = supervisor["id"]
+
+        if best_supervisor is not None:
+            matches_[best_supervisor].append(
+                InternMatchDetail(intern_id=intern["id"], similarity=best_score)
+            )
+    return dict(matches_)
+
+
+def make_people(prefix: str, count: int, rng: random.Random) -> list[dict]:
+    return [
+        {
+            "id": f"{prefix}-{i}",
+            "department": rng.choice(DEPARTMENTS),
+            "skills": rng.sample(SKILLS, rng.randint(0, 6)),
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("method", ["jaccard", "intern_ratio", "supervisor_ratio"])
+def test_bitset_similarity_matches_set_similarity(method):
+    rng = random.Random(1)
+    vocabulary = SkillVocabulary()
+    for _ in range(500):
+        a = rng.sample(SKILLS, rng.randint(0, 8))
+        b = rng.sample(SKILLS, rng.randint(0, 8))
+        a_bits, b_bits = vocabulary.encode(a), vocabulary.encode(b)
+        assert bitset_similarity(
+            a_bits, a_bits.bit_count(), b_bits, b_bits.bit_count(), method
+        ) == skills_similarity(a, b, method)
+
+
+@pytest.mark.parametrize("method", ["jaccard", "intern_ratio", "supervisor_ratio"])
+def test_match_interns_to_supervisors_matches_reference(method):
+    rng = random.Random(2)
+    supervisors = make_people("s", 30, rng)
+    interns = make_people("i", 200, rng)
+
+    assert match_interns_to_supervisors(
+        supervisors, interns, method
+    ) == reference_match(supervisors, interns, method)
+
+
+def test_run_matching_partitions_by_department():
+    rng = random.Random(3)
+    supervisors = make_people("s", 20, rng)
+    interns = make_people("i", 100, rng)
+
+    results = run_matching(supervisors, interns)
+
+    for dept in DEPARTMENTS:
+        dept_supervisors = [s for s in supervisors if s["department"] == dept]
+        dept_interns = [i for i in interns if i["department"] == dept]
+        assert results[dept] == reference_match(dept_supervisors, dept_interns)
+
+
+def test_skill_index_only_returns_supervisors_sharing_a_skill():
+    vocabulary = SkillVocabulary()
+    supervisors = [
+        {"id": "s-0", "skills": ["python", "sql"]},
+        {"id": "s-1", "skills": ["excel"]},
+        {"id": "s-2", "skills": ["sql"]},
+    ]
+    index = SkillIndex(encode_profiles(supervisors, vocabulary))
+
+    candidates = index.candidates(vocabulary.encode(["sql", "go"]))
+
+    assert [c.id for c in candidates] == ["s-0", "s-2"]
+    assert index.candidates(vocabulary.encode(["go"])) == []
+
+
+def test_intern_without_overlap_falls_back_to_first_supervisor():
+    supervisors = [{"id": "s-0", "skills": ["python"]}, {"id": "s-1", "skills": ["sql"]}]
+    interns = [{"id": "i-0", "skills": ["excel"]}, {"id": "i-1", "skills": []}]
+
+    assert match_interns_to_supervisors(supervisors, interns) == reference_match(
+        supervisors, interns
+    )
+
+
+def brute_force_best_total(supervisors, interns, capacity):
+    """Max total similarity over every capacity-respecting assignment (tiny inputs only)."""
+    options = [None] + [s["id"] for s in supervisors]
+    skills = {s["id"]: s["skills"] for s in supervisors}
+    best = 0.0
+    for choice in itertools.product(options, repeat=len(interns)):
+        load = Counter(c for c in choice if c is not None)
+        if any(count > capacity for count in load.values()):
+            continue
+        total = sum(
+            skills_similarity(intern["skills"], skills[c])
+            for intern, c in zip(interns, choice)
+            if c is not None
+        )
+        best = max(best, total)
+    return best
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_assignment_strategy_is_near_optimal_and_respects_capacity(seed):
+    rng = random.Random(seed)
+    supervisors = [
+        {"id": f"s-{i}", "department": "FINANCE", "skills": rng.sample(SKILLS[:8], rng.randint(1, 5))}
+        for i in range(3)
+    ]
+    interns = [
+        {"id": f"i-{i}", "department": "FINANCE", "skills": rng.sample(SKILLS[:8], rng.randint(1, 4))}
+        for i in range(6)
+    ]
+    stats = []
+
+    results = run_matching(supervisors, interns, strategy="assignment", capacity=2, stats=stats)
+
+    matches = results["FINANCE"]
+    assert all(len(assigned) <= 2 for assigned in matches.values())
+    assert sum(len(assigned) for assigned in matches.values()) == len(interns)
+    total = sum(m.similarity for assigned in matches.values() for m in assigned)
+    # an auction at a given eps is within interns * eps of the optimum
+    assert total >= brute_force_best_total(supervisors, interns, 2) - len(interns) * EPSILON_SCHEDULE[-1]
+    assert stats[0].strategy == "assignment" and not stats[0].timed_out
+
+
+def test_assignment_strategy_places_everybody_within_capacity_when_out_of_time():
+    rng = random.Random(7)
+    supervisors = make_people("s", 20, rng)
+    interns = make_people("i", 150, rng)
+    (dept_supervisors, dept_interns), = partition_by_department(
+        [{**s, "department": "FINANCE"} for s in supervisors],
+        [{**i, "department": "FINANCE"} for i in interns],
+    ).values()
+    stats = SolverStats(department="FINANCE", strategy="assignment")
+
+    matches = assign_with_capacity(
+        dept_supervisors, dept_interns, {s["id"]: 8 for s in supervisors}, time_budget=0, stats=stats
+    )
+
+    assert all(len(assigned) <= 8 for assigned in matches.values())
+    assert sum(len(assigned) for assigned in matches.values()) == len(interns)
+    assert stats.timed_out and stats.phases == 0
+
+
+def test_assignment_time_budget_leaves_out_candidate_generation(monkeypatch):
+    rng = random.Random(9)
+    (dept_supervisors, dept_interns), = partition_by_department(
+        [{**s, "department": "FINANCE"} for s in make_people("s", 10, rng)],
+        [{**i, "department": "FINANCE"} for i in make_people("i", 60, rng)],
+    ).values()
+    # A clock that only moves while candidates are generated, by far more than the budget
+    clock = [0.0]
+    monkeypatch.setattr(matching_assignment.time, "perf_counter", lambda: clock[0])
+
+    def slow_top_supervisors(*args):
+        clock[0] += 10
+        return top_supervisors(*args)
+
+    monkeypatch.setattr(matching_assignment, "top_supervisors", slow_top_supervisors)
+    stats = SolverStats(department="FINANCE", strategy="assignment")
+
+    assign_with_capacity(
+        dept_supervisors, dept_interns, {s.id: 8 for s in dept_supervisors}, "idf", stats=stats
+    )
+
+    assert not stats.timed_out and stats.phases == len(EPSILON_SCHEDULE)
+
+
+def test_assignment_strategy_spreads_interns_off_the_broadest_supervisor():
+    supervisors = [
+        {"id": "broad", "department": "NETWORK", "skills": SKILLS[:10], "intern_count": 1},
+        {"id": "narrow", "department": "NETWORK", "skills": SKILLS[:2]},
+    ]
+    interns = [{"id": f"i-{i}", "department": "NETWORK", "skills": SKILLS[:2]} for i in range(3)]
+
+    greedy = run_matching(supervisors, interns)["NETWORK"]
+    assigned = run_matching(supervisors, interns, strategy="assignment", capacity=2)["NETWORK"]
+
+    assert len(greedy["narrow"]) == 3
+    assert len(assigned["broad"]) == 1  # one slot left after its existing intern
+    assert len(assigned["narrow"]) == 2
+
+
+def test_incremental_matcher_tracks_full_recompute():
+    rng = random.Random(4)
+    supervisors = make_people("s", 15, rng)
+    interns = make_people("i", 80, rng)
+    incremental = IncrementalMatcher()
+    incremental.load(supervisors, interns)
+    assert incremental.matches() == run_matching(supervisors, interns)
+
+    new_intern = {"id": "i-new", "department": "FINANCE", "skills": SKILLS[:3]}
+    interns.append(new_intern)
+    incremental.upsert_intern(new_intern)
+
+    supervisors[0] = {**supervisors[0], "skills": SKILLS[:4]}
+    incremental.upsert_supervisor(supervisors[0])
+
+    matched = interns.pop(5)
+    incremental.interns_matched([(matched["id"], supervisors[0]["id"])])
+
+    assert incremental.matches() == run_matching(supervisors, interns)
+
+
+def test_snapshot_applies_the_next_version_and_drops_itself_after_a_gap():
+    rng = random.Random(11)
+    supervisors = make_people("s", 5, rng)
+    interns = make_people("i", 20, rng)
+    incremental = IncrementalMatcher()
+    incremental.load(supervisors, interns, data_version=3)
+
+    incremental.interns_matched([(interns[0]["id"], supervisors[0]["id"])], data_version=4)
+    assert incremental.cached_intern(interns[0]["id"]) is None
+    assert incremental.intern_counts[supervisors[0]["id"]] == 1
+
+    # Already covered by the snapshot, e.g. a sync reloaded it before this call ran
+    incremental.intern_unmatched(interns[0], supervisors[0]["id"], data_version=4)
+    assert incremental.cached_intern(interns[0]["id"]) is None
+
+    incremental.intern_unmatched(interns[0], supervisors[0]["id"], data_version=6)
+    assert not incremental.loaded
+
+
+def test_snapshot_partitions_run_like_the_database_input():
+    rng = random.Random(12)
+    supervisors = [
+        {**supervisor, "intern_count": rng.randint(0, 2)} for supervisor in make_people("s", 20, rng)
+    ]
+    interns = make_people("i", 100, rng)
+    incremental = IncrementalMatcher()
+    incremental.load(supervisors, interns)
+
+    assert match_partitions(
+        incremental.partitions(), strategy="assignment", capacities=incremental.capacities(3)
+    ) == run_matching(supervisors, interns, strategy="assignment", capacity=3)
+    assert match_partitions(incremental.partitions(), method="idf") == run_matching(
+        supervisors, interns, method="idf"
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_pool_matches_in_process_run():
+    rng = random.Random(5)
+    supervisors = make_people("s", 20, rng)
+    interns = make_people("i", 150, rng)
+    stats = []
+
+    try:
+        results = await run_partitions_in_pool(partition_by_department(supervisors, interns), stats=stats)
+        assigned = await run_partitions_in_pool(
+            partition_by_department(supervisors, interns),
+            strategy="assignment",
+            capacities=supervisor_capacities(supervisors, "assignment", 10),
+        )
+    finally:
+        shutdown_pool()
+
+    assert results == run_matching(supervisors, interns)
+    assert assigned == run_matching(supervisors, interns, strategy="assignment", capacity=10)
+    assert sorted(s.department for s in stats) == sorted(results)
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_swapped_out_once_and_the_matching_still_runs(monkeypatch):
+    class BrokenPool(Executor):
+        def __init__(self):
+            self.shutdowns = []
+
+        def submit(self, fn, *args, **kwargs):
+            raise BrokenProcessPool("a worker died")
+
+        def shutdown(self, wait=True, *, cancel_futures=False):
+            self.shutdowns.append(wait)
+
+    rng = random.Random(6)
+    supervisors = make_people("s", 10, rng)
+    interns = make_people("i", 60, rng)
+    broken = BrokenPool()
+    monkeypatch.setattr(matching_pool, "_pool", broken)
+
+    results = await run_partitions_in_pool(partition_by_department(supervisors, interns))
+
+    assert results == run_matching(supervisors, interns)
+    assert matching_pool._pool is None
+    assert broken.shutdowns == [False]
+
+    # A caller that saw the same failure late must leave the pool that replaced it alone
+    replacement = BrokenPool()
+    monkeypatch.setattr(matching_pool, "_pool", replacement)
+    matching_pool._discard_broken_pool(broken)
+
+    assert matching_pool._pool is replacement
+    assert broken.shutdowns == [False] and replacement.shutdowns == []
+
+
+def test_shared_snapshot_maps_the_published_file_and_swaps_atomically(tmp_path):
+    rng = random.Random(13)
+    supervisors = [
+        {**supervisor, "intern_count": rng.randint(0, 2)} for supervisor in make_people("s", 20, rng)
+    ]
+    interns = make_people("i", 100, rng)
+    path = str(tmp_path / "matching.snapshot")
+    reader = SharedSnapshotReader(path)
+    assert reader.current() is None
+
+    write_snapshot(path, supervisors, interns, data_version=1)
+    snapshot = reader.current()
+    assert snapshot.data_version == 1
+    assert match_partitions(snapshot.partitions()) == run_matching(supervisors, interns)
+    assert match_partitions(
+        snapshot.partitions(), strategy="assignment", capacities=snapshot.capacities(3)
+    ) == run_matching(supervisors, interns, strategy="assignment", capacity=3)
+
+    incremental = IncrementalMatcher()
+    incremental.load(supervisors, interns)
+    for intern in interns:  # "i-1" must not be found inside "i-10"
+        department, profile = snapshot.cached_intern(intern["id"])
+        assert department == intern["department"]
+        assert snapshot.recommend(department, profile, 5) == incremental.recommend(
+            *incremental.cached_intern(intern["id"]), 5
+        )
+    assert snapshot.cached_intern(supervisors[0]["id"]) is None
+
+    write_snapshot(path, supervisors, interns[1:], data_version=2)
+    assert reader.current().data_version == 2
+    assert reader.current().cached_intern(interns[0]["id"]) is None
+    # Calls still holding the previous snapshot keep reading it
+    assert snapshot.cached_intern(interns[0]["id"]) is not None
+
+
+def test_shared_snapshot_recommends_by_idf_and_cleans_up_temporaries(tmp_path, monkeypatch):
+    rng = random.Random(15)
+    supervisors = make_people("s", 20, rng)
+    interns = make_people("i", 80, rng)
+    path = str(tmp_path / "matching.snapshot")
+    (tmp_path / "matching.snapshot.4242.tmp").write_bytes(b"left by a dead publisher")
+
+    remove_stale_temporaries(path)
+    write_snapshot(path, supervisors, interns, data_version=1)
+    with monkeypatch.context() as patched:
+        patched.setattr(matching_shared.os, "replace", Mock(side_effect=OSError("disk full")))
+        with pytest.raises(OSError):
+            write_snapshot(path, supervisors, interns, data_version=2)
+
+    assert [file.name for file in tmp_path.iterdir()] == ["matching.snapshot"]
+    snapshot = SharedSnapshotReader(path, "idf").current()
+    incremental = IncrementalMatcher("idf")
+    incremental.load(supervisors, interns)
+    for intern in interns:
+        department, profile = snapshot.cached_intern(intern["id"])
+        expected = incremental.recommend(*incremental.cached_intern(intern["id"]), 5)
+        recommended = snapshot.recommend(department, profile, 5)
+        assert [s_id for s_id, _ in recommended] == [s_id for s_id, _ in expected]
+        assert [score for _, score in recommended] == pytest.approx([score for _, score in expected])
+
+
+SupervisorRow = namedtuple("SupervisorRow", "id department_id skill_ids intern_count")
+InternRow = namedtuple("InternRow", "id department_id skill_ids")
+
+
+def test_matching_rows_match_dict_input():
+    rng = random.Random(6)
+    supervisors = make_people("s", 20, rng)
+    interns = make_people("i", 120, rng)
+    skill_ids = {skill: uuid.uuid4() for skill in SKILLS}
+
+    supervisor_rows = [
+        SupervisorRow(s["id"], DepartmentEnum[s["department"]].value, [skill_ids[k] for k in s["skills"]] or None, 0)
+        for s in supervisors
+    ]
+    intern_rows = [
+        InternRow(i["id"], DepartmentEnum[i["department"]].value, [skill_ids[k] for k in i["skills"]] or None)
+        for i in interns
+    ]
+
+    details = rows_to_matching_details(supervisor_rows, intern_rows)
+    assert run_matching(*details) == run_matching(supervisors, interns)
+
+
+@pytest.mark.asyncio
+async def test_reconcile_reloads_a_drifted_snapshot():
+    supervisor_rows = [
+        SupervisorRow("s-1", DepartmentEnum.FINANCE.value, ["a", "b"], 1),
+        SupervisorRow("s-2", DepartmentEnum.FINANCE.value, ["c"], 0),
+    ]
+    intern_rows = [InternRow("i-1", DepartmentEnum.FINANCE.value, ["c"])]
+    supervisor_repo, intern_repo, matching_repo = AsyncMock(), AsyncMock(), AsyncMock()
+    supervisor_repo.get_supervisor_matching_rows.return_value = supervisor_rows
+    intern_repo.get_unmatched_intern_matching_rows.return_value = intern_rows
+    matching_repo.get_data_version.return_value = 5
+    repos = {"supervisor_repo": supervisor_repo, "intern_repo": intern_repo, "matching_repo": matching_repo}
+
+    incremental = IncrementalMatcher()
+    await incremental.sync(conn=None, **repos)
+    assert await incremental.reconcile(conn=None, **repos) == 0
+
+    # A write path that forgot to report its change
+    incremental.upsert_intern({"id": "i-2", "department": "FINANCE", "skills": ["a"]})
+    assert await incremental.reconcile(conn=None, **repos) == 1
+    assert incremental.matches() == run_matching(*rows_to_matching_details(supervisor_rows, intern_rows))
+
+
+def reference_idf_similarity(people: list):
+    """Weighted Jaccard over sets, with the IDF of the people passed in."""
+    counts = Counter(skill for person in people for skill in set(person["skills"]))
+    weight = {skill: math.log((1 + len(people)) / (1 + count)) + 1 for skill, count in counts.items()}
+
+    def similarity(a, b):
+        shared = sum(weight[skill] for skill in set(a) & set(b))
+        return shared / sum(weight[skill] for skill in set(a) | set(b)) if shared else 0
+
+    return similarity
+
+
+def reference_idf_match(supervisors_list: list, interns_list: list):
+    similarity = reference_idf_similarity(supervisors_list + interns_list)
+    matches_ = defaultdict(list)
+    for intern in interns_list:
+        scores = [similarity(intern["skills"], supervisor["skills"]) for supervisor in supervisors_list]
+        best = max(range(len(scores)), key=lambda position: (scores[position], -position))
+        matches_[supervisors_list[best]["id"]].append((intern["id"], scores[best]))
+    return dict(matches_)
+
+
+def test_idf_method_matches_weighted_reference():
+    rng = random.Random(7)
+    supervisors = make_people("s", 40, rng)
+    interns = make_people("i", 200, rng)
+
+    results = run_matching(supervisors, interns, method="idf")
+
+    for dept in DEPARTMENTS:
+        dept_supervisors = [s for s in supervisors if s["department"] == dept]
+        dept_interns = [i for i in interns if i["department"] == dept]
+        expected = reference_idf_match(dept_supervisors, dept_interns)
+        assert results[dept].keys() == expected.keys()
+        for supervisor_id, matched in results[dept].items():
+            assert [m.intern_id for m in matched] == [intern_id for intern_id, _ in expected[supervisor_id]]
+            assert [m.similarity for m in matched] == pytest.approx([score for _, score in expected[supervisor_id]])
+
+
+def test_idf_method_prefers_rare_shared_skills():
+    supervisors = [
+        {"id": "common", "skills": ["communication", "excel"]},
+        {"id": "rare", "skills": ["kubernetes", "terraform"]},
+    ]
+    interns = [{"id": f"i-{i}", "skills": ["communication", "excel"]} for i in range(6)]
+    interns.append({"id": "devops", "skills": ["communication", "kubernetes"]})
+
+    jaccard = match_interns_to_supervisors(supervisors, interns)
+    idf = match_interns_to_supervisors(supervisors, interns, method="idf")
+
+    assert "devops" in [m.intern_id for m in jaccard["common"]]  # a 1/3 tie, the first one wins
+    assert [m.intern_id for m in idf["rare"]] == ["devops"]
+
+
+def test_assignment_strategy_supports_idf():
+    rng = random.Random(8)
+    supervisors = make_people("s", 10, rng)
+    interns = make_people("i", 60, rng)
+
+    results = run_matching(supervisors, interns, method="idf", strategy="assignment", capacity=3)
+
+    for dept, matches in results.items():
+        assert all(len(assigned) <= 3 for assigned in matches.values())
+
+
+def test_lsh_always_finds_identical_profiles_and_rescores_exactly():
+    rng = random.Random(9)
+    vocabulary = SkillVocabulary()
+    supervisors = make_people("s", 50, rng)
+    index = LshIndex(encode_profiles(supervisors, vocabulary), MinHasher(bands=4, rows=4))
+
+    for position, supervisor in enumerate(supervisors):
+        if not supervisor["skills"]:
+            continue
+        bits = vocabulary.encode(supervisor["skills"])
+        assert index.candidate_mask(bits) >> position & 1  # equal signatures share every band
+        intern = encode_profiles([{"id": "i", "skills": supervisor["skills"]}], vocabulary)[0]
+        score, _ = index.top_candidates(intern, 1)[0]
+        assert score == 1.0
+
+
+def test_lsh_strategy_matches_every_intern_close_to_the_exact_search():
+    rng = random.Random(10)
+    supervisors = make_people("s", 60, rng)
+    interns = make_people("i", 400, rng)
+
+    results = run_matching(supervisors, interns, strategy="lsh")
+    exact = run_matching(supervisors, interns)
+
+    def best_scores(matches):
+        return {m.intern_id: m.similarity for dept in matches.values() for ms in dept.values() for m in ms}
+
+    approximate, expected = best_scores(results), best_scores(exact)
+    assert approximate.keys() == expected.keys()
+    assert all(approximate[intern_id] <= score for intern_id, score in expected.items())
+    recall = sum(approximate[intern_id] == score for intern_id, score in expected.items()) / len(expected)
+    assert recall >= 0.9
+
+
+def test_idf_top_supervisors_equal_a_full_scan():
+    rng = random.Random(16)
+    supervisors = make_people("s", 150, rng)
+    interns = make_people("i", 300, rng)
+
+    for dept_supervisors, dept_interns in partition_by_department(supervisors, interns).values():
+        index = SkillIndex(dept_supervisors)
+        weights = IdfWeights(dept_supervisors + dept_interns)
+        allowed = rng.getrandbits(len(dept_supervisors))  # some supervisors are full
+        for intern in dept_interns:
+            best = top_supervisors(intern, index, "idf", 5, allowed, weights)
+
+            expected = sorted(
+                (
+                    weights.similarity(intern.bits, supervisor.bits)
+                    for position, supervisor in enumerate(dept_supervisors)
+                    if allowed >> position & 1 and intern.bits & supervisor.bits
+                ),
+                reverse=True,
+            )[:5]
+            assert sorted((score for score, _ in best), reverse=True) == expected
+            assert all(allowed >> position & 1 for _, position in best)
+
+
+@pytest.mark.parametrize("method", ["jaccard", "intern_ratio", "supervisor_ratio"])
+def test_recommend_returns_the_best_k_supervisors(method):
+    rng = random.Random(11)
+    supervisors = make_people("s", 60, rng)
+    interns = make_people("i", 40, rng)
+    incremental = IncrementalMatcher(method)
+    incremental.load(supervisors, interns)
+
+    for intern in interns:
+        if not intern["skills"]:
+            continue
+        department, profile = incremental.cached_intern(intern["id"])
+        recommended = incremental.recommend(department, profile, 5)
+
+        expected = sorted(
+            (
+                skills_similarity(intern["skills"], s["skills"], method)
+                for s in supervisors
+                if s["department"] == department and set(s["skills"]) & set(intern["skills"])
+            ),
+            reverse=True,
+        )[:5]
+        assert [score for _, score in recommended] == expected
+
+
+def test_incremental_matcher_ranks_by_idf_like_bulk_matching():
+    rng = random.Random(12)
+    supervisors = make_people("s", 30, rng)
+    interns = make_people("i", 120, rng)
+    incremental = IncrementalMatcher("idf")
+    incremental.load(supervisors, interns[:-1])
+    incremental.upsert_intern(interns[-1])  # moves the weights of its department
+
+    bulk = run_matching(supervisors, interns, method="idf")
+    best = {m.intern_id: m.similarity for dept in bulk.values() for ms in dept.values() for m in ms}
+
+    assert incremental.matches() == without_empty(bulk)
+    for intern in interns:
+        department, profile = incremental.cached_intern(intern["id"])
+        if recommended := incremental.recommend(department, profile, 3):
+            assert recommended[0][1] == pytest.approx(best[intern["id"]])
+
+
+def without_empty(results: dict) -> dict:
+    return {dept: matches for dept, matches in results.items() if matches}
+
+
+def test_sandbox_scenario_equals_a_rerun_on_the_edited_inputs():
+    rng = random.Random(14)
+    supervisors = make_people("s", 15, rng)
+    interns = make_people("i", 90, rng)
+    for supervisor in supervisors:
+        supervisor["intern_count"] = rng.randint(0, 2)
+    loads = {s["id"]: s["intern_count"] for s in supervisors}
+    sandbox = MatchingSandbox(partition_by_department(supervisors, interns), loads, Scenario())
+
+    moved = supervisors[0]
+    target = next(dept for dept in DEPARTMENTS if dept != moved["department"])
+    scenario = Scenario(moves={moved["id"]: target}, removed_interns=frozenset({"i-0", "i-1"}))
+    # A moved supervisor comes last in its new department
+    edited_supervisors = supervisors[1:] + [{**moved, "department": target}]
+    edited_interns = [i for i in interns if i["id"] not in scenario.removed_interns]
+
+    expected = without_empty(run_matching(edited_supervisors, edited_interns))
+    assert sandbox.baseline == without_empty(run_matching(supervisors, interns))
+    assert sandbox.run(scenario) == expected
+    diff = sandbox.try_scenario(scenario)
+    assert diff == {**diff_matches(sandbox.baseline, expected), "duration_ms": diff["duration_ms"]}
+    assert {"i-0", "i-1"} <= {change["intern_id"] for change in diff["changes"]}
+
+    capped = Scenario(capacity=3)
+    assert sandbox.run(capped) == without_empty(
+        run_matching(supervisors, interns, strategy="assignment", capacity=3)
+    )
+    with pytest.raises(ValueError):
+        sandbox.run(Scenario(removed_supervisors=frozenset({"nobody"})))
+
+
+def test_sandbox_only_solves_the_departments_a_scenario_touches(monkeypatch):
+    rng = random.Random(15)
+    supervisors = make_people("s", 15, rng)
+    interns = make_people("i", 60, rng)
+    sandbox = MatchingSandbox(partition_by_department(supervisors, interns), {}, Scenario())
+
+    solved = []
+    original = matching_sandbox.match_department
+
+    def counting(dept, *args):
+        solved.append(dept)
+        return original(dept, *args)
+
+    monkeypatch.setattr(matching_sandbox, "match_department", counting)
+    intern = interns[0]
+    diff = sandbox.try_scenario(Scenario(removed_interns=frozenset({intern["id"]})))
+
+    assert solved == [intern["department"]]
+    assert set(diff["departments"]) <= {intern["department"]}
+
+
+def test_sandbox_rebuilt_from_its_dump_runs_scenarios_without_solving_the_baseline(monkeypatch):
+    rng = random.Random(16)
+    supervisors = make_people("s", 15, rng)
+    interns = make_people("i", 60, rng)
+    loads = {s["id"]: rng.randint(0, 1) for s in supervisors}
+    sandbox = MatchingSandbox(partition_by_department(supervisors, interns), loads, Scenario(capacity=3))
+    removed = frozenset({interns[0]["id"]})
+    expected = sandbox.try_scenario(Scenario(capacity=3, removed_interns=removed))
+
+    solved = []
+    original = matching_sandbox.match_department
+
+    def counting(dept, *args):
+        solved.append(dept)
+        return original(dept, *args)
+
+    monkeypatch.setattr(matching_sandbox, "match_department", counting)
+    # Through JSON, as it is persisted
+    loaded = MatchingSandbox.load(json.loads(json.dumps(sandbox.dump())))
+    diff = loaded.try_scenario(Scenario(capacity=3, removed_interns=removed))
+
+    assert loaded.baseline == sandbox.baseline
+    assert loaded.baseline_scenario == sandbox.baseline_scenario
+    assert {**diff, "duration_ms": 0} == {**expected, "duration_ms": 0}
+    assert solved == [interns[0]["department"]]
+
+
+def test_sandbox_move_to_its_own_department_changes_nothing():
+    supervisors = [{"id": f"s-{n}", "department": "FINANCE", "skills": ["skill-1"]} for n in range(2)]
+    interns = [{"id": "i-0", "department": "FINANCE", "skills": ["skill-1"]}]
+    sandbox = MatchingSandbox(partition_by_department(supervisors, interns), {}, Scenario())
+
+    # The supervisors tie, so the intern would follow whichever comes first
+    diff = sandbox.try_scenario(Scenario(moves={"s-0": "FINANCE"}))
+
+    assert diff["changes"] == []
+    assert sandbox.baseline["FINANCE"]["s-0"][0].intern_id == "i-0"
+
+
+def assert_no_blocking_pair(supervisors, interns, results, capacity, similarity=skills_similarity):
+    """No intern and supervisor sharing a skill would both rather be together, ties to the earliest."""
+    assigned = {
+        match.intern_id: supervisor_id
+        for matches in results.values()
+        for supervisor_id, intern_matches in matches.items()
+        for match in intern_matches
+    }
+    for dept in DEPARTMENTS:
+        dept_supervisors = [s for s in supervisors if s["department"] == dept]
+        dept_interns = [i for i in interns if i["department"] == dept]
+        position = {person["id"]: p for p, person in enumerate(dept_supervisors + dept_interns)}
+        skills = {person["id"]: person["skills"] for person in dept_supervisors + dept_interns}
+        held = defaultdict(list)
+        for intern in dept_interns:
+            if intern["id"] in assigned:
+                held[assigned[intern["id"]]].append(intern["id"])
+        assert all(len(held_) <= capacity for held_ in held.values())
+        # The held intern each supervisor likes least, when it is full
+        least_held = {
+            supervisor_id: min(
+                (similarity(skills[other], skills[supervisor_id]), -position[other]) for other in held_
+            )
+            for supervisor_id, held_ in held.items()
+            if len(held_) == capacity
+        }
+
+        for intern in dept_interns:
+            current = assigned.get(intern["id"])
+            current_rank = (-1, 0)
+            if current:
+                current_rank = (similarity(intern["skills"], skills[current]), -position[current])
+            for supervisor in dept_supervisors:
+                if not set(intern["skills"]) & set(supervisor["skills"]):
+                    continue
+                score = similarity(intern["skills"], supervisor["skills"])
+                if (score, -position[supervisor["id"]]) <= current_rank:
+                    continue  # the intern does not prefer this supervisor
+                # The supervisor must be full of interns it prefers
+                assert least_held.get(supervisor["id"], (math.inf, 0)) > (score, -position[intern["id"]])
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_stable_strategy_leaves_no_blocking_pair(seed):
+    rng = random.Random(seed)
+    supervisors = make_people("s", 12, rng)
+    interns = make_people("i", 70, rng)
+    stats = []
+
+    results = run_matching(supervisors, interns, strategy="stable", capacity=2, stats=stats)
+
+    assert_no_blocking_pair(supervisors, interns, results, 2)
+    assert {s.strategy for s in stats} == {"stable"}
+    solved = [s for s in stats if s.interns and s.supervisors]
+    # Every proposal goes down a preference list, so there are at most as many as list entries
+    assert all(s.phases == 1 and 0 < s.iterations <= s.candidate_pairs for s in solved)
+
+
+def test_stable_strategy_with_idf_leaves_no_blocking_pair_at_scale(monkeypatch):
+    rng = random.Random(17)
+    supervisors = [{**s, "department": "FINANCE"} for s in make_people("s", 60, rng)]
+    interns = [{**i, "department": "FINANCE"} for i in make_people("i", 600, rng)]
+    # Building the preference lists takes far longer than the budget, which must not count
+    clock = [0.0]
+    monkeypatch.setattr(matching_assignment.time, "perf_counter", lambda: clock[0])
+
+    def slow_top_supervisors(*args):
+        clock[0] += 10
+        return top_supervisors(*args)
+
+    monkeypatch.setattr(matching_assignment, "top_supervisors", slow_top_supervisors)
+    stats = []
+
+    results = run_matching(supervisors, interns, method="idf", strategy="stable", capacity=12, stats=stats)
+
+    assert_no_blocking_pair(supervisors, interns, results, 12, reference_idf_similarity(supervisors + interns))
+    assert not stats[0].timed_out and not stats[0].unassigned
+
+
+def test_stable_strategy_places_everybody_within_capacity_when_out_of_time():
+    rng = random.Random(8)
+    supervisors = make_people("s", 20, rng)
+    interns = make_people("i", 150, rng)
+    (dept_supervisors, dept_interns), = partition_by_department(
+        [{**s, "department": "FINANCE"} for s in supervisors],
+        [{**i, "department": "FINANCE"} for i in interns],
+    ).values()
+    stats = SolverStats(department="FINANCE", strategy="stable")
+
+    matches = stable_match(
+        dept_supervisors, dept_interns, {s["id"]: 8 for s in supervisors}, time_budget=0, stats=stats
+    )
+
+    assert all(len(assigned) <= 8 for assigned in matches.values())
+    assert sum(len(assigned) for assigned in matches.values()) == len(interns)
+    # Not a single proposal was made past the deadline
+    assert stats.timed_out and stats.iterations == 0
+
+
+def test_stable_strategy_needs_a_capacity():
+    rng = random.Random(16)
+    with pytest.raises(ValueError):
+        run_matching(make_people("s", 5, rng), make_people("i", 10, rng), strategy="stable")
+
+
+def test_hashing_backend_is_deterministic_and_close_for_similar_skills():
+    backend = HashingBackend(128)
+    python, python3, accounting = backend.embed(["Python", "python 3", "Accounting"])
+
+    assert backend.embed(["Python"])[0] == python
+    assert math.isclose(math.sumprod(python, python), 1.0, rel_tol=1e-5)
+    assert math.sumprod(python, python3) > math.sumprod(python, accounting)
+
+
+def test_skill_vector_cache_embeds_every_skill_once(tmp_path):
+    class CountingBackend(HashingBackend):
+        embedded = []
+
+        def embed(self, texts):
+            self.embedded.extend(texts)
+            return super().embed(texts)
+
+    backend = CountingBackend(64)
+    cache = SkillVectorCache(backend, str(tmp_path / "vectors"))
+    assert cache.missing({"s-1", "s-2"}) == {"s-1", "s-2"}
+    cache.add({"s-1": "python", "s-2": "excel"})
+
+    restarted = SkillVectorCache(backend, str(tmp_path / "vectors"))
+    assert restarted.missing({"s-1", "s-2", "s-3"}) == {"s-3"}
+    assert restarted.vectors == cache.vectors
+    assert cache.dimension == restarted.dimension == 64
+    assert backend.embedded == ["python", "excel"]
+
+
+def test_embedding_matching_takes_the_closest_supervisor():
+    rng = random.Random(17)
+    backend = HashingBackend(64)
+    vectors = dict(zip(SKILLS, backend.embed(SKILLS)))
+    supervisors = make_people("s", 12, rng)
+    interns = make_people("i", 60, rng)
+
+    results = match_by_embeddings(supervisors, interns, vectors, 64)
+
+    for dept in DEPARTMENTS:
+        dept_supervisors = [s for s in supervisors if s["department"] == dept]
+        placed = {m.intern_id: (s_id, m.similarity) for s_id, ms in results.get(dept, {}).items() for m in ms}
+        for intern in (i for i in interns if i["department"] == dept and dept_supervisors):
+            query = profile_vector(intern["skills"], vectors, 64)
+            scores = [math.sumprod(query, profile_vector(s["skills"], vectors, 64)) for s in dept_supervisors]
+            best = scores.index(max(scores))
+            supervisor_id, similarity = placed[intern["id"]]
+            assert supervisor_id == dept_supervisors[best]["id"] and similarity == pytest.approx(scores[best])
+
+    matrix = array("f", itertools.chain.from_iterable(vectors[skill] for skill in SKILLS[:3]))
+    rows = unpack_rows(matrix, 64)
+    assert rows == [tuple(vectors[skill]) for skill in SKILLS[:3]]
+    assert cosine_scores(rows[1], rows)[1] == pytest.approx(1.0, rel=1e-5)
+
+
+@pytest.mark.asyncio
+async def test_embedding_matching_in_the_pool_matches_in_process_run():
+    rng = random.Random(18)
+    backend = HashingBackend(64)
+    supervisors = make_people("s", 12, rng)
+    interns = make_people("i", 60, rng)
+
+    try:
+        vectors = dict(zip(SKILLS, await embed_in_pool(backend, SKILLS)))
+        results = await match_by_embeddings_in_pool(supervisors, interns, vectors, 64)
+    finally:
+        shutdown_pool()
+
+    assert vectors == dict(zip(SKILLS, backend.embed(SKILLS)))
+    assert results == match_by_embeddings(supervisors, interns, vectors, 64)
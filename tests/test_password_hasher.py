@@ -0,0 +1,109 @@
+"""Tests for the password hashing service"""
+
+import asyncio
+import threading
+
+import pytest
+from argon2 import PasswordHasher
+
+from src.infra.argon2_calibration import calibrate, calibrate_parallelism, latency_target, parallelism_candidates
+from src.infra.password_hasher import PasswordHashingBusy, PasswordHashingService
+
+
+def cheap_service(workers: int = 1, queue_limit: int = 1, timeout: float = 5) -> PasswordHashingService:
+    return PasswordHashingService(
+        PasswordHasher(time_cost=1, memory_cost=8, parallelism=1), workers, queue_limit, timeout
+    )
+
+
+@pytest.mark.asyncio
+class TestPasswordHashingService:
+    async def test_hashes_and_verifies_off_the_event_loop(self):
+        service = cheap_service()
+
+        password_hash = await service.hash("Str0ng!Password")
+
+        assert await service.verify(password_hash, "Str0ng!Password")
+        assert not await service.verify(password_hash, "wrong password")
+        metrics = service.metrics()
+        assert metrics["completed"] == 3 and metrics["queued"] == 0 and metrics["running"] == 0
+        service.shutdown()
+
+    async def test_refuses_work_beyond_the_queue_limit(self):
+        service = cheap_service(workers=1, queue_limit=1)
+        release = threading.Event()
+        running = asyncio.create_task(service._run(release.wait))
+        queued = asyncio.create_task(service._run(lambda: True))
+        await asyncio.sleep(0.05)
+
+        with pytest.raises(PasswordHashingBusy):
+            await service.hash("Str0ng!Password")
+
+        assert service.metrics()["queued"] == 1 and service.metrics()["rejected"] == 1
+        release.set()
+        assert await running and await queued
+        service.shutdown()
+
+    async def test_drops_calls_still_queued_after_the_timeout(self):
+        service = cheap_service(workers=1, queue_limit=4, timeout=0.05)
+        release = threading.Event()
+        blocking = asyncio.create_task(service._run(release.wait))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(PasswordHashingBusy):
+            await service.hash("Str0ng!Password")
+
+        release.set()
+        with pytest.raises(PasswordHashingBusy):
+            await blocking  # outlived the timeout too, though it ran to the end
+        await asyncio.sleep(0.05)
+        metrics = service.metrics()
+        assert metrics["timed_out"] == 2 and metrics["completed"] == 1 and metrics["queued"] == 0
+        service.shutdown()
+
+    async def test_needs_rehash_only_for_other_parameters(self):
+        old = cheap_service()
+        current = PasswordHashingService(PasswordHasher(time_cost=2, memory_cost=8, parallelism=1), 1, 1, 5)
+
+        password_hash = await old.hash("Str0ng!Password")
+
+        assert current.needs_rehash(password_hash)
+        assert not current.needs_rehash(await current.hash("Str0ng!Password"))
+        old.shutdown()
+        current.shutdown()
+
+
+class TestArgon2Calibration:
+    @staticmethod
+    def linear_cost(time_cost: int, memory_cost: int, parallelism: int) -> float:
+        return 0.05 * time_cost * memory_cost / 65536  # 50 ms per pass over 64 MiB
+
+    def test_keeps_the_memory_and_adds_passes_up_to_the_target(self):
+        chosen = calibrate(0.25, 65536, 4, measure=self.linear_cost)
+
+        assert (chosen.time_cost, chosen.memory_cost, chosen.parallelism) == (5, 65536, 4)
+
+    def test_halves_the_memory_when_one_pass_is_too_slow(self):
+        tried = []
+
+        chosen = calibrate(0.25, 1024 * 1024, 4, measure=self.linear_cost, report=tried.append)
+
+        assert (chosen.time_cost, chosen.memory_cost) == (1, 262144)
+        assert [p.memory_cost for p in tried] == [1048576, 524288, 262144]
+
+    def test_login_rate_lowers_the_target_to_what_the_cores_sustain(self):
+        assert latency_target(0.25, 4, None, cores=8) == 0.25
+        assert latency_target(0.25, 4, 20, cores=8) == pytest.approx(0.1)
+
+    def test_measures_the_lanes_against_the_login_rate_and_the_cores(self):
+        def scaling_cost(time_cost: int, memory_cost: int, parallelism: int) -> float:
+            return self.linear_cost(time_cost, memory_cost, parallelism) / parallelism
+
+        assert parallelism_candidates(8) == [1, 2, 4, 8]
+        assert parallelism_candidates(6) == [1, 2, 4]
+        # Alone, more lanes buy more passes until the passes cap out
+        chosen = calibrate_parallelism(0.25, 65536, cores=8, measure=scaling_cost)
+        assert (chosen.time_cost, chosen.parallelism) == (16, 4)
+        # At 20 logins/s every lane takes a core from the others: 2 lanes already reach the same work
+        chosen = calibrate_parallelism(0.25, 65536, cores=8, logins_per_second=20, measure=scaling_cost)
+        assert (chosen.time_cost, chosen.parallelism) == (8, 2)
@@ -0,0 +1,78 @@
+"""Tests for the refresh and password reset tokens"""
+
+from unittest.mock import AsyncMock
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from src.infra.token import InvalidTokenError, PasswordResetToken, RefreshToken
+
+pytestmark = pytest.mark.asyncio
+
+
+def sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def mock_conn(returned=None) -> AsyncMock:
+    conn = AsyncMock()
+    conn.scalar.return_value = returned
+    return conn
+
+
+class TestRevocableToken:
+    async def test_issuing_replaces_the_users_tokens_in_one_statement(self):
+        conn = mock_conn()
+
+        await RefreshToken.new(conn, uuid4())
+
+        conn.execute.assert_awaited_once()
+        statement = sql(conn.execute.call_args.args[0])
+        assert statement.startswith("WITH revoked AS \n(DELETE FROM token WHERE token.user_id")
+        assert "INSERT INTO token" in statement
+
+    async def test_decoding_checks_and_revokes_in_one_statement(self):
+        user_id = uuid4()
+        token = await PasswordResetToken.new(mock_conn(), user_id)
+        conn = mock_conn(returned=uuid4())
+
+        assert await PasswordResetToken.decode(conn, token) == str(user_id)
+
+        conn.scalar.assert_awaited_once()
+        statement = sql(conn.scalar.call_args.args[0])
+        assert statement.startswith("DELETE FROM token") and statement.endswith("RETURNING token.jti")
+
+    async def test_decoding_a_revoked_token_fails(self):
+        token = await RefreshToken.new(mock_conn(), uuid4())
+
+        with pytest.raises(InvalidTokenError):
+            await RefreshToken.decode(mock_conn(returned=None), token)
+
+    async def test_rotation_consumes_and_issues_in_one_statement(self):
+        user_id = uuid4()
+        token = await RefreshToken.new(mock_conn(), user_id)
+        conn = mock_conn(returned=uuid4())
+
+        rotated_user_id, new_token = await RefreshToken.rotate(conn, token)
+
+        conn.scalar.assert_awaited_once()
+        conn.execute.assert_not_awaited()
+        statement = sql(conn.scalar.call_args.args[0])
+        assert "WITH used AS" in statement and "revoked AS" in statement
+        assert "INSERT INTO token" in statement and "FROM used" in statement
+        assert rotated_user_id == str(user_id) and new_token != token
+
+    async def test_rotating_a_used_token_fails(self):
+        token = await RefreshToken.new(mock_conn(), uuid4())
+
+        with pytest.raises(InvalidTokenError):
+            await RefreshToken.rotate(mock_conn(returned=None), token)
+
+    async def test_tokens_of_another_type_are_refused_before_the_database(self):
+        token = await PasswordResetToken.new(mock_conn(), uuid4())
+        conn = mock_conn(returned=uuid4())
+
+        with pytest.raises(InvalidTokenError):
+            await RefreshToken.rotate(conn, token)
+        conn.scalar.assert_not_awaited()
@@ -5,10 +5,15 @@ from fastapi import BackgroundTasks
 
 from src.repositories.general_user_repo import UserRepository
 from src.repositories.intern_repo import InternRepository
+from src.repositories.matching_job_repo import MatchingJobRepository
+from src.repositories.matching_repo import MatchingRepository
+from src.repositories.matching_sandbox_repo import MatchingSandboxRepository
 from src.repositories.skill_repo import SkillRepository
 from src.repositories.supervisor_repo import SupervisorRepository
 from src.repositories.verification_code_repo import VerificationCodeRepository
 from src.services.auth_service import AuthService
+from src.services.matching_job_service import MatchingJobService
+from src.services.matching_service import MatchingService
 from sqlalchemy.ext.asyncio import AsyncSession
 from contextlib import asynccontextmanager
 
@@ -53,6 +58,16 @@ def mock_skill_repo() -> AsyncMock:
     return AsyncMock(spec=SkillRepository)
 
 
+@pytest.fixture
+def mock_matching_repo() -> AsyncMock:
+    return AsyncMock(spec=MatchingRepository)
+
+
+@pytest.fixture
+def mock_sandbox_repo() -> AsyncMock:
+    return AsyncMock(spec=MatchingSandboxRepository)
+
+
 @pytest.fixture
 def mock_background_tasks() -> AsyncMock:
     return AsyncMock(spec=BackgroundTasks)
@@ -66,6 +81,7 @@ def auth_service(
     mock_supervisor_repo: AsyncMock,
     mock_code_repo: AsyncMock,
     mock_skill_repo: AsyncMock,
+    mock_matching_repo: AsyncMock,
     mock_background_tasks: AsyncMock,
 ) -> AuthService:
     return AuthService(
@@ -75,5 +91,40 @@ def auth_service(
         supervisor_repo=mock_supervisor_repo,
         code_repo=mock_code_repo,
         skill_repo=mock_skill_repo,
+        matching_repo=mock_matching_repo,
         background_task=mock_background_tasks,
     )
+
+
+@pytest.fixture
+def matching_service(
+    mock_session: AsyncMock,
+    mock_user_repo: AsyncMock,
+    mock_intern_repo: AsyncMock,
+    mock_supervisor_repo: AsyncMock,
+    mock_matching_repo: AsyncMock,
+    mock_skill_repo: AsyncMock,
+    mock_sandbox_repo: AsyncMock,
+) -> MatchingService:
+    return MatchingService(
+        session=mock_session,
+        skill_repo=mock_skill_repo,
+        user_repo=mock_user_repo,
+        intern_repo=mock_intern_repo,
+        supervisor_repo=mock_supervisor_repo,
+        matching_repo=mock_matching_repo,
+        sandbox_repo=mock_sandbox_repo,
+    )
+
+
+@pytest.fixture
+def mock_matching_job_repo() -> AsyncMock:
+    return AsyncMock(spec=MatchingJobRepository)
+
+
+@pytest.fixture
+def matching_job_service(
+    mock_session: AsyncMock,
+    mock_matching_job_repo: AsyncMock,
+) -> MatchingJobService:
+    return MatchingJobService(session=mock_session, job_repo=mock_matching_job_repo)
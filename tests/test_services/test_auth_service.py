@@ -1,14 +1,16 @@
 """Test for Auth Service"""
 
-from unittest.mock import AsyncMock, patch, ANY
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock, patch, ANY
 from uuid import uuid4
 
 import pytest
 from fastapi import HTTPException
 
-from src.common import UserType
+from src.common import DepartmentEnum, UserType
+from src.infra.token import InvalidTokenError
 from src.schemas.intern_schemas import InternOutModel
-from src.schemas.supervisor_schemas import SupervisorOutModel
+from src.schemas.supervisor_schemas import SupervisorInModel, SupervisorOutModel
 from src.services.auth_service import AuthService
 from tests.utils.utils import (
     create_mock_user,
@@ -193,6 +195,42 @@ class TestCreateUnverifiedNewUser:
         )
 
 
+class TestSupervisorSignUpMatchingData:
+    """Supervisors are matching candidates from sign-up on, before they are verified."""
+
+    async def test_creating_a_supervisor_bumps_the_matching_data_version(
+        self, auth_service, mock_user_repo, mock_supervisor_repo, mock_matching_repo
+    ):
+        new_supervisor_data = SupervisorInModel(
+            firstname="Test",
+            lastname="User",
+            phone_number="1234567890",
+            email="test@example.com",
+            password="Str0ng!password",
+            skills=[],
+            date_of_birth=date(2000, 1, 1),
+            department=DepartmentEnum.INFORMATION_TECHNOLOGY,
+            work_location="Remote",
+            type=UserType.SUPERVISOR,
+            position="Manager Emerging Technologies",
+        )
+        created_user_mock = create_mock_user(verified=False)
+        mock_user_repo.get_user_by_email_or_phone.return_value = None
+        mock_user_repo.create_new_user.return_value = created_user_mock
+        mock_supervisor_repo.create_new_supervisor.return_value = create_mock_supervisor(created_user_mock)
+        mock_user_repo.get_users_for_matching.return_value = [created_user_mock]
+        mock_matching_repo.bump_data_version.return_value = 7
+
+        with (
+            patch("src.services.auth_service.hash_password", AsyncMock(return_value="hashed")),
+            patch("src.services.auth_service.incremental_matcher") as mock_matcher,
+        ):
+            await auth_service.create_unverified_new_user(new_supervisor_data)
+
+        mock_matching_repo.bump_data_version.assert_awaited_once_with(conn=auth_service.session)
+        mock_matcher.apply_users.assert_called_once_with([created_user_mock], data_version=7)
+
+
 class TestVerifyUser:
     """Tests for the verify_user method of the AuthService."""
 
@@ -286,7 +324,7 @@ class TestLogin:
         ],
     )
     @patch("src.services.auth_service.AccessToken")
-    @patch("src.services.auth_service.password_is_correct", return_value=True)
+    @patch("src.services.auth_service.password_is_correct", new_callable=AsyncMock, return_value=True)
     async def test_login_success_for_all_types(
         self,
         mock_password_check,
@@ -334,7 +372,7 @@ class TestLogin:
         assert exc_info.value.status_code == 401
         assert "Invalid login credentials" in exc_info.value.detail
 
-    @patch("src.services.auth_service.password_is_correct", return_value=False)
+    @patch("src.services.auth_service.password_is_correct", new_callable=AsyncMock, return_value=False)
     async def test_login_fails_for_incorrect_password(
         self, mock_password_check, auth_service, mock_user_repo
     ):
@@ -350,7 +388,7 @@ class TestLogin:
         assert "Invalid login credentials" in exc_info.value.detail
         mock_password_check.assert_called_once()
 
-    @patch("src.services.auth_service.password_is_correct", return_value=True)
+    @patch("src.services.auth_service.password_is_correct", new_callable=AsyncMock, return_value=True)
     async def test_login_fails_for_unverified_user(
         self, mock_password_check, auth_service, mock_user_repo
     ):
@@ -366,6 +404,78 @@ class TestLogin:
         assert "Invalid login credentials" in exc_info.value.detail
 
 
+class TestRehashOnLogin:
+    """Tests for migrating password hashes to the current Argon2 parameters on login."""
+
+    @pytest.mark.parametrize("new_hash", ["rehashed_password", None])
+    @patch("src.services.auth_service.set_custom_cookie")
+    @patch("src.services.auth_service.RefreshToken")
+    @patch.object(AuthService, "_new_access_token_from_user", AsyncMock(return_value="fake.access.token"))
+    @patch("src.services.auth_service.password_is_correct", new_callable=AsyncMock, return_value=True)
+    async def test_stores_the_new_hash_only_when_rehashed(
+        self,
+        _mock_password_check,
+        mock_refresh_token,
+        _mock_set_cookie,
+        auth_service,
+        mock_user_repo,
+        new_hash,
+    ):
+        existing_user = create_mock_user(verified=True)
+        mock_user_repo.get_user_by_email_or_phone.return_value = existing_user
+        mock_refresh_token.new = AsyncMock(return_value="fake.refresh.token")
+
+        with patch(
+            "src.services.auth_service.rehashed_password", new_callable=AsyncMock, return_value=new_hash
+        ) as mock_rehash:
+            result = await auth_service.login(
+                username="test@example.com", password="correct_password", response=MagicMock()
+            )
+
+        mock_rehash.assert_awaited_once_with(existing_user.password, "correct_password")
+        if new_hash:
+            mock_user_repo.update.assert_awaited_once_with(
+                conn=auth_service.session, user_id=existing_user.id, values={"password": new_hash}
+            )
+        else:
+            mock_user_repo.update.assert_not_awaited()
+        assert result["access_token"] == "fake.access.token"
+
+
+class TestRefreshToken:
+    """Tests for the refresh_token method."""
+
+    @patch("src.services.auth_service.set_custom_cookie")
+    @patch("src.services.auth_service.RefreshToken")
+    @patch.object(AuthService, "_new_access_token_from_user", AsyncMock(return_value="fake.access.token"))
+    async def test_rotates_the_token_in_one_call(
+        self, mock_refresh_token, mock_set_cookie, auth_service, mock_user_repo
+    ):
+        existing_user = create_mock_user(verified=True)
+        mock_user_repo.get_user_by_id.return_value = existing_user
+        mock_refresh_token.rotate = AsyncMock(return_value=(str(existing_user.id), "new.refresh.token"))
+        request = MagicMock(cookies={"refresh_token": "old.refresh.token"})
+
+        result = await auth_service.refresh_token(request=request, response=MagicMock())
+
+        mock_refresh_token.rotate.assert_awaited_once_with(auth_service.session, "old.refresh.token")
+        mock_refresh_token.decode.assert_not_called()
+        mock_refresh_token.new.assert_not_called()
+        assert mock_set_cookie.call_args.kwargs["value"] == "new.refresh.token"
+        assert result["access_token"] == "fake.access.token"
+
+    @patch("src.services.auth_service.RefreshToken")
+    async def test_refuses_a_token_already_used(self, mock_refresh_token, auth_service, mock_user_repo):
+        mock_refresh_token.rotate = AsyncMock(side_effect=InvalidTokenError)
+        request = MagicMock(cookies={"refresh_token": "old.refresh.token"})
+
+        with pytest.raises(HTTPException) as exc_info:
+            await auth_service.refresh_token(request=request, response=MagicMock())
+
+        assert exc_info.value.status_code == 401
+        mock_user_repo.get_user_by_id.assert_not_awaited()
+
+
 class TestRequestResetPassword:
     """Tests for the request_reset_password method."""
 
@@ -420,7 +530,7 @@ class TestVerifyCodeAndResetPassword:
     """Tests for the verify_code_and_reset_password method."""
 
     @patch(
-        "src.services.auth_service.hash_password", return_value="new_hashed_password"
+        "src.services.auth_service.hash_password", new_callable=AsyncMock, return_value="new_hashed_password"
     )
     async def test_reset_password_success(
         self, mock_hash_password, auth_service, mock_user_repo, mock_background_tasks
@@ -0,0 +1,141 @@
+"""Test for Matching Job Service"""
+
+import asyncio
+from datetime import datetime, timedelta, UTC
+from unittest.mock import AsyncMock, MagicMock, patch
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from src.common import JobStatus
+from src.matching import SolverStats
+from src.models.app_models import MatchingJob
+from src.services.matching_job_service import STALE_JOB_ERROR, MatchingJobProgress, MatchingJobService
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestStartBulkMatching:
+    """Tests for the start_bulk_matching method."""
+
+    async def test_returns_the_pending_job_and_runs_it_in_the_background(
+        self,
+        matching_job_service: MatchingJobService,
+        mock_matching_job_repo: AsyncMock,
+    ):
+        job = MatchingJob(
+            id=uuid4(), status=JobStatus.PENDING, capacity=3, progress={}, created_at=datetime.now(UTC)
+        )
+        mock_matching_job_repo.create.return_value = job
+
+        with (
+            patch("src.services.matching_job_service.job_runner") as runner,
+            patch("src.services.matching_job_service.run_bulk_matching_job", MagicMock()) as run,
+        ):
+            result = await matching_job_service.start_bulk_matching(capacity=3)
+
+        assert result.job_id == str(job.id)
+        assert result.status == JobStatus.PENDING
+        run.assert_called_once_with(job.id, 3)
+        runner.submit.assert_called_once()
+
+
+class TestGetJob:
+    """Tests for the get_job method."""
+
+    async def test_unknown_job_is_not_found(
+        self,
+        matching_job_service: MatchingJobService,
+        mock_matching_job_repo: AsyncMock,
+    ):
+        mock_matching_job_repo.get.return_value = None
+
+        with pytest.raises(HTTPException) as exc_info:
+            await matching_job_service.get_job(job_id=uuid4())
+
+        assert exc_info.value.status_code == 404
+
+
+class TestMatchingJobProgress:
+    """Tests for the progress a running job records."""
+
+    async def test_records_departments_as_they_finish_then_the_result(
+        self,
+        mock_session: AsyncMock,
+        mock_matching_job_repo: AsyncMock,
+    ):
+        job_id = uuid4()
+        progress = MatchingJobProgress(job_id, mock_session, mock_matching_job_repo)
+
+        await progress.started()
+        await progress.department_solved(SolverStats(department="FINANCE", strategy="greedy", interns=4))
+        await progress.assigning(proposed=4)
+        await progress.succeeded({"assigned": 4})
+
+        values = mock_matching_job_repo.update.await_args.kwargs["values"]
+        assert values["status"] == JobStatus.SUCCEEDED
+        assert values["result"] == {"assigned": 4}
+        assert values["progress"]["phase"] == "done"
+        assert values["progress"]["departments"]["FINANCE"]["interns"] == 4
+        assert mock_matching_job_repo.update.await_count == 4
+
+    async def test_heartbeat_keeps_the_job_fresh_until_the_body_ends(
+        self,
+        mock_session: AsyncMock,
+        mock_matching_job_repo: AsyncMock,
+    ):
+        progress = MatchingJobProgress(uuid4(), mock_session, mock_matching_job_repo)
+
+        async with progress.heartbeat(0.01):
+            await asyncio.sleep(0.05)
+        beats = mock_matching_job_repo.update.await_count
+        await asyncio.sleep(0.03)
+
+        assert beats >= 2
+        assert mock_matching_job_repo.update.await_count == beats
+        assert "updated_at" in mock_matching_job_repo.update.await_args.kwargs["values"]
+
+
+class TestStaleJobs:
+    """Tests for jobs a stopped server left unfinished."""
+
+    async def test_polling_a_job_without_a_recent_heartbeat_fails_it(
+        self,
+        matching_job_service: MatchingJobService,
+        mock_matching_job_repo: AsyncMock,
+        mock_session: AsyncMock,
+    ):
+        long_ago = datetime.now(UTC) - timedelta(hours=1)
+        job = MatchingJob(
+            id=uuid4(), status=JobStatus.RUNNING, progress={}, created_at=long_ago, updated_at=long_ago
+        )
+        mock_matching_job_repo.get.return_value = job
+
+        async def refresh(model):
+            model.status, model.error = JobStatus.FAILED, STALE_JOB_ERROR
+
+        mock_session.refresh.side_effect = refresh
+        result = await matching_job_service.get_job(job_id=job.id)
+
+        assert mock_matching_job_repo.fail_stale.await_args.kwargs["job_id"] == job.id
+        assert result.status == JobStatus.FAILED
+
+    async def test_polling_a_running_job_with_a_recent_heartbeat_leaves_it(
+        self,
+        matching_job_service: MatchingJobService,
+        mock_matching_job_repo: AsyncMock,
+    ):
+        job = MatchingJob(
+            id=uuid4(),
+            status=JobStatus.RUNNING,
+            progress={},
+            created_at=datetime.now(UTC) - timedelta(hours=1),
+            updated_at=datetime.now(UTC),
+        )
+        mock_matching_job_repo.get.return_value = job
+
+        result = await matching_job_service.get_job(job_id=job.id)
+
+        mock_matching_job_repo.fail_stale.assert_not_awaited()
+        assert result.status == JobStatus.RUNNING
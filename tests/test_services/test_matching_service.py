@@ -0,0 +1,416 @@
+"""Test for Matching Service"""
+
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, patch
+from types import SimpleNamespace
+from uuid import uuid4
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from src.common import DepartmentEnum, InternMatchDetail
+from src.matching import EncodedProfile, SolverStats
+from src.matching_embeddings import HashingBackend, SkillVectorCache
+from src.matching_sandbox import MatchingSandbox, SandboxRegistry, Scenario
+from src.schemas.matching_schemas import SandboxScenarioIn
+from src.services.matching_service import _BUSY_RETRIES, MatchingInput, MatchingService
+
+pytestmark = pytest.mark.asyncio
+
+
+def matching_input(department: str) -> MatchingInput:
+    """One department with one unmatched intern, so there is something to claim."""
+    return MatchingInput({department: ([], [EncodedProfile("i-1", 0, 0)])}, {}, None)
+
+
+class TestPerformBulkMatching:
+    """Tests for the perform_bulk_matching method."""
+
+    async def test_assigns_all_pairs_in_one_statement_and_reports_skipped(
+        self,
+        matching_service: MatchingService,
+        mock_intern_repo: AsyncMock,
+        mock_matching_repo: AsyncMock,
+    ):
+        supervisor_id = uuid4()
+        intern_ids = [uuid4() for _ in range(3)]
+        matches = {
+            "FINANCE": {
+                str(supervisor_id): [
+                    InternMatchDetail(intern_id=str(intern_id), similarity=0.5)
+                    for intern_id in intern_ids
+                ]
+            }
+        }
+        # The last intern got matched manually in the meantime
+        mock_intern_repo.bulk_assign_supervisors.return_value = set(intern_ids[:2])
+        mock_matching_repo.try_lock_department.return_value = True
+
+        with (
+            patch.object(MatchingService, "_matching_input", AsyncMock(return_value=matching_input("FINANCE"))),
+            patch.object(MatchingService, "_solve", AsyncMock(return_value=matches)),
+        ):
+            result = await matching_service.perform_bulk_matching()
+
+        mock_intern_repo.bulk_assign_supervisors.assert_awaited_once_with(
+            conn=matching_service.session,
+            pairs=[(intern_id, supervisor_id) for intern_id in intern_ids],
+        )
+        mock_intern_repo.assign_supervisor_to_intern.assert_not_awaited()
+        assert result["assigned"] == 2
+        assert result["skipped"] == [str(intern_ids[2])]
+        assert result["departments"] == {"FINANCE": {"assigned": 2, "skipped": 1}}
+        mock_matching_repo.bump_data_version.assert_awaited_once()
+        mock_matching_repo.try_lock_department.assert_awaited_once_with(
+            conn=matching_service.session, department_id=DepartmentEnum.FINANCE.value
+        )
+
+    async def test_leaves_departments_claimed_by_another_node(
+        self,
+        matching_service: MatchingService,
+        mock_intern_repo: AsyncMock,
+        mock_matching_repo: AsyncMock,
+    ):
+        mock_matching_repo.try_lock_department.return_value = False
+        mock_matching_repo.get_data_version.return_value = 3
+
+        with (
+            patch.object(MatchingService, "_matching_input", AsyncMock(return_value=matching_input("NETWORK"))),
+            patch.object(MatchingService, "_solve", AsyncMock()) as solve,
+            patch("src.services.matching_service._BUSY_BACKOFF_SECONDS", 0),
+        ):
+            result = await matching_service.perform_bulk_matching()
+
+        solve.assert_not_awaited()
+        # Tried again after the first pass, in case its node finished or crashed
+        assert mock_matching_repo.try_lock_department.await_count == 1 + _BUSY_RETRIES
+        mock_intern_repo.bulk_assign_supervisors.assert_not_awaited()
+        mock_matching_repo.bump_data_version.assert_not_awaited()
+        assert result["assigned"] == 0
+        assert result["busy_departments"] == ["NETWORK"]
+
+    async def test_reports_departments_that_ran_out_of_time(
+        self,
+        matching_service: MatchingService,
+        mock_matching_repo: AsyncMock,
+    ):
+        mock_matching_repo.try_lock_department.return_value = True
+
+        async def solve(matching_input, capacity, departments, stats, on_department):
+            stats.append(SolverStats(department=departments[0], strategy="assignment", timed_out=True))
+            return {}
+
+        with (
+            patch.object(MatchingService, "_matching_input", AsyncMock(return_value=matching_input("FINANCE"))),
+            patch.object(MatchingService, "_solve", side_effect=solve),
+        ):
+            result = await matching_service.perform_bulk_matching()
+
+        assert result["timed_out_departments"] == ["FINANCE"]
+        assert result["stats"][0]["timed_out"]
+
+    async def test_reloads_the_input_when_the_data_changed_before_a_claim(
+        self,
+        matching_service: MatchingService,
+        mock_intern_repo: AsyncMock,
+        mock_matching_repo: AsyncMock,
+    ):
+        stale, fresh = matching_input("FINANCE"), matching_input("FINANCE")
+        mock_matching_repo.try_lock_department.return_value = True
+        # Another node committed its departments between the first read and the claim
+        mock_matching_repo.get_data_version.side_effect = [3, 4]
+
+        with (
+            patch.object(MatchingService, "_matching_input", AsyncMock(side_effect=[stale, fresh])),
+            patch.object(MatchingService, "_solve", AsyncMock(return_value={})) as solve,
+        ):
+            await matching_service.perform_bulk_matching()
+
+        assert solve.await_args.args[0] is fresh
+
+
+class TestDisplayMatches:
+    """Tests for the display_matches method."""
+
+    @pytest.mark.parametrize(
+        "if_none_match",
+        [
+            '"jaccard:greedy-7"',
+            'W/"jaccard:greedy-7"',
+            '"jaccard:greedy-6", W/"jaccard:greedy-7"',
+            '"a,b",  "jaccard:greedy-7"',
+            "*",
+        ],
+    )
+    async def test_not_modified_when_etag_is_current(
+        self,
+        matching_service: MatchingService,
+        mock_matching_repo: AsyncMock,
+        if_none_match: str,
+    ):
+        mock_matching_repo.get_data_version.return_value = 7
+
+        etag, proposals = await matching_service.display_matches(if_none_match=if_none_match)
+
+        assert etag == '"jaccard:greedy-7"'
+        assert proposals is None
+        mock_matching_repo.get_proposal.assert_not_awaited()
+
+    async def test_serves_stored_proposals_of_the_current_version(
+        self,
+        matching_service: MatchingService,
+        mock_matching_repo: AsyncMock,
+    ):
+        mock_matching_repo.get_data_version.return_value = 7
+        mock_matching_repo.get_proposal.return_value = MagicMock(
+            data_version=7, proposals={"FINANCE": []}
+        )
+
+        with patch.object(MatchingService, "_build_match_details", AsyncMock()) as build:
+            etag, proposals = await matching_service.display_matches(capacity=2)
+
+        assert etag == '"jaccard:assignment:2-7"'
+        assert proposals == {"FINANCE": []}
+        build.assert_not_awaited()
+        mock_matching_repo.save_proposal.assert_not_awaited()
+
+    async def test_recomputes_and_stores_stale_proposals(
+        self,
+        matching_service: MatchingService,
+        mock_matching_repo: AsyncMock,
+    ):
+        mock_matching_repo.get_data_version.return_value = 8
+        mock_matching_repo.get_proposal.return_value = MagicMock(
+            data_version=7, proposals={"FINANCE": []}
+        )
+
+        with patch.object(
+            MatchingService, "_build_match_details", AsyncMock(return_value={"NETWORK": []})
+        ):
+            etag, proposals = await matching_service.display_matches(
+                if_none_match='W/"jaccard:greedy-7", "jaccard:greedy-8-ndjson"'
+            )
+
+        assert etag == '"jaccard:greedy-8"'
+        assert proposals == {"NETWORK": []}
+        mock_matching_repo.save_proposal.assert_awaited_once_with(
+            conn=matching_service.session, key="jaccard:greedy", data_version=8, proposals={"NETWORK": []}
+        )
+
+
+class TestRecommendSupervisors:
+    """Tests for the recommend_supervisors method."""
+
+    async def test_unknown_intern_is_not_found(
+        self,
+        matching_service: MatchingService,
+        mock_intern_repo: AsyncMock,
+        mock_supervisor_repo: AsyncMock,
+    ):
+        mock_intern_repo.get_intern_by_id.return_value = None
+
+        with patch.object(MatchingService, "_sync_incremental", AsyncMock()):
+            with pytest.raises(HTTPException) as exc_info:
+                await matching_service.recommend_supervisors(intern_id=uuid4(), k=3)
+
+        assert exc_info.value.status_code == 404
+        mock_supervisor_repo.get_supervisors_by_ids.assert_not_awaited()
+
+
+class TestEmbeddingMatching:
+    """Tests for matching by skill embeddings."""
+
+    async def test_only_embeds_skills_not_cached_yet(
+        self,
+        matching_service: MatchingService,
+        mock_intern_repo: AsyncMock,
+        mock_supervisor_repo: AsyncMock,
+        mock_skill_repo: AsyncMock,
+    ):
+        python, excel = uuid4(), uuid4()
+        supervisor_id, intern_id = uuid4(), uuid4()
+        department_id = DepartmentEnum.FINANCE.value
+        mock_supervisor_repo.get_supervisor_matching_rows.return_value = [
+            SimpleNamespace(id=supervisor_id, department_id=department_id, skill_ids=[python, excel], intern_count=0)
+        ]
+        mock_intern_repo.get_unmatched_intern_matching_rows.return_value = [
+            SimpleNamespace(id=intern_id, department_id=department_id, skill_ids=[python])
+        ]
+        skill_vectors = SkillVectorCache(HashingBackend(32))
+        skill_vectors.add({str(python): "python"})
+        mock_skill_repo.get_skill_names.return_value = {str(excel): "excel"}
+
+        with (
+            patch("src.services.matching_service.settings.USE_ML_MATCHING", True),
+            patch("src.services.matching_service.get_skill_vectors", return_value=skill_vectors),
+        ):
+            matches = await matching_service._compute_matches()
+
+        mock_skill_repo.get_skill_names.assert_awaited_once_with(
+            conn=matching_service.session, skill_ids={str(excel)}
+        )
+        [match] = matches["FINANCE"][str(supervisor_id)]
+        assert match.intern_id == str(intern_id) and 0 < match.similarity < 1
+
+
+class TestStreamMatches:
+    """Tests for the stream_matches method."""
+
+    async def test_streams_one_line_per_supervisor_group(
+        self,
+        matching_service: MatchingService,
+        mock_session: AsyncMock,
+        mock_matching_repo: AsyncMock,
+        mock_supervisor_repo: AsyncMock,
+        mock_intern_repo: AsyncMock,
+    ):
+        def person(department: DepartmentEnum, name: str) -> MagicMock:
+            user = MagicMock(
+                firstname=name, lastname="Doe", department_id=department.value,
+                email=f"{name}@example.com", phone_number="0800", skills=[],
+            )
+            return MagicMock(id=uuid4(), user=user)
+
+        departments = (DepartmentEnum.FINANCE, DepartmentEnum.NETWORK)
+        supervisors = {dept: person(dept, f"sup-{dept.name}") for dept in departments}
+        interns = {dept: person(dept, f"intern-{dept.name}") for dept in supervisors}
+        matches = {
+            dept.name: {str(supervisors[dept].id): [InternMatchDetail(str(interns[dept].id), 0.5)]}
+            for dept in supervisors
+        }
+        mock_matching_repo.get_data_version.return_value = 4
+        mock_supervisor_repo.get_supervisors_by_ids.side_effect = lambda conn, ids: [
+            s for s in supervisors.values() if s.id in ids
+        ]
+        mock_intern_repo.get_interns_by_ids.side_effect = lambda conn, ids: [
+            i for i in interns.values() if i.id in ids
+        ]
+
+        @asynccontextmanager
+        async def session_local():
+            yield mock_session
+
+        with (
+            patch.object(MatchingService, "_compute_matches", AsyncMock(return_value=matches)),
+            patch("src.services.matching_service.SessionLocal", session_local),
+        ):
+            etag, lines = await matching_service.stream_matches()
+            body = [orjson.loads(line) async for line in lines]
+
+        assert etag == '"jaccard:greedy-4-ndjson"'
+        assert [line["department"] for line in body] == ["FINANCE", "NETWORK"]
+        assert body[0]["supervisor"]["firstname"] == "sup-FINANCE"
+        assert body[1]["interns"][0]["firstname"] == "intern-NETWORK"
+        assert body[1]["interns"][0]["similarity"] == "50.00%"
+        # Details are loaded department by department
+        assert mock_supervisor_repo.get_supervisors_by_ids.await_count == 2
+
+    async def test_skips_supervisors_deleted_since_the_matches_were_computed(
+        self,
+        matching_service: MatchingService,
+        mock_session: AsyncMock,
+        mock_supervisor_repo: AsyncMock,
+        mock_intern_repo: AsyncMock,
+    ):
+        intern = MagicMock(id=uuid4())
+        matches = {"FINANCE": {str(uuid4()): [InternMatchDetail(str(intern.id), 0.5)]}}
+        mock_supervisor_repo.get_supervisors_by_ids.return_value = []
+        mock_intern_repo.get_interns_by_ids.return_value = [intern]
+
+        @asynccontextmanager
+        async def session_local():
+            yield mock_session
+
+        with patch("src.services.matching_service.SessionLocal", session_local):
+            body = [line async for line in matching_service._iter_match_lines(matches)]
+
+        assert body == []
+
+    async def test_not_modified_for_a_weak_etag_in_a_list(
+        self,
+        matching_service: MatchingService,
+        mock_matching_repo: AsyncMock,
+    ):
+        mock_matching_repo.get_data_version.return_value = 4
+
+        with patch.object(MatchingService, "_compute_matches", AsyncMock()) as compute:
+            etag, lines = await matching_service.stream_matches(
+                if_none_match='"jaccard:greedy-4", W/"jaccard:greedy-4-ndjson"'
+            )
+
+        assert etag == '"jaccard:greedy-4-ndjson"'
+        assert lines is None
+        compute.assert_not_awaited()
+
+
+class TestSandboxes:
+    """Tests for the matching sandbox methods."""
+
+    async def test_create_persists_the_sandbox_and_drops_the_owners_oldest(
+        self,
+        matching_service: MatchingService,
+        mock_matching_repo: AsyncMock,
+        mock_sandbox_repo: AsyncMock,
+    ):
+        owner_id, old_id = uuid4(), uuid4()
+        saved = SimpleNamespace(id=uuid4(), expires_at=None)
+        mock_matching_repo.get_data_version.return_value = 2
+        mock_sandbox_repo.create.return_value = saved
+        mock_sandbox_repo.delete_all_but_newest.return_value = [old_id]
+        partitions = {"FINANCE": ([EncodedProfile("s-1", 1, 1)], [EncodedProfile("i-1", 1, 1)])}
+        matching_input = MatchingInput(partitions, {}, None)
+
+        with (
+            patch.object(MatchingService, "_matching_input", AsyncMock(return_value=matching_input)),
+            patch("src.services.matching_service.sandboxes", SandboxRegistry()) as cache,
+        ):
+            cache.add(str(old_id), MagicMock())
+            result = await matching_service.create_sandbox(owner_id=owner_id)
+
+            assert cache.get(str(old_id)) is None
+            assert cache.get(str(saved.id)) is not None
+        assert result["sandbox_id"] == str(saved.id)
+        assert result["matched"] == 1
+        assert mock_sandbox_repo.create.await_args.kwargs["owner_id"] == owner_id
+        inputs = mock_sandbox_repo.create.await_args.kwargs["inputs"]
+        assert inputs["baseline"]["FINANCE"] == {"s-1": [["i-1", 1.0]]}
+
+    async def test_another_worker_rebuilds_the_sandbox_from_its_persisted_copy(
+        self,
+        matching_service: MatchingService,
+        mock_sandbox_repo: AsyncMock,
+    ):
+        intern_id = uuid4()
+        partitions = {"FINANCE": ([EncodedProfile("s-1", 1, 1)], [EncodedProfile(str(intern_id), 1, 1)])}
+        mock_sandbox_repo.get_inputs.return_value = MatchingSandbox(partitions, {}, Scenario()).dump()
+        sandbox_id, owner_id = uuid4(), uuid4()
+
+        with patch("src.services.matching_service.sandboxes", SandboxRegistry()):
+            diff = await matching_service.try_sandbox_scenario(
+                sandbox_id=sandbox_id,
+                owner_id=owner_id,
+                scenario_in=SandboxScenarioIn(removed_interns=[intern_id]),
+            )
+
+        mock_sandbox_repo.get_inputs.assert_awaited_once_with(
+            conn=matching_service.session, sandbox_id=sandbox_id, owner_id=owner_id
+        )
+        assert diff["matched_before"] == 1 and diff["matched_after"] == 0
+
+    async def test_a_cached_sandbox_of_another_user_is_not_found(
+        self,
+        matching_service: MatchingService,
+        mock_sandbox_repo: AsyncMock,
+    ):
+        sandbox_id = uuid4()
+        mock_sandbox_repo.exists.return_value = False
+
+        with patch("src.services.matching_service.sandboxes", SandboxRegistry()) as cache:
+            cache.add(str(sandbox_id), MagicMock())
+            with pytest.raises(HTTPException) as exc_info:
+                await matching_service.try_sandbox_scenario(
+                    sandbox_id=sandbox_id, owner_id=uuid4(), scenario_in=SandboxScenarioIn()
+                )
+
+        assert exc_info.value.status_code == 404
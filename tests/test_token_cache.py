@@ -0,0 +1,110 @@
+"""Tests for the verified access token cache"""
+
+import time
+from unittest.mock import patch
+
+import jwt
+import pytest
+
+import src.infra.token as token_module
+from src.common import DepartmentEnum, UserType
+from src.infra.token import AccessToken, InvalidTokenError, VerifiedTokenCache
+from src.schemas import UserOutModel
+
+
+def admin(user_id: str = "user") -> UserOutModel:
+    return UserOutModel.model_validate({
+        "firstname": "Ada",
+        "lastname": "Admin",
+        "phone_number": "08000000000",
+        "email": "ada@example.com",
+        "date_of_birth": "1990-01-01",
+        "department": DepartmentEnum.COMPANY_SECRETARIAT.value,
+        "work_location": "Lagos",
+        "type": UserType.ADMIN,
+        "user_id": user_id,
+    })
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    token_module.verified_access_tokens.clear()
+    yield
+    token_module.verified_access_tokens.clear()
+
+
+class TestVerifiedTokenCache:
+    def test_returns_copies_of_the_cached_user(self):
+        cache = VerifiedTokenCache(4)
+        cache.put("token", admin(), time.time() + 60)
+
+        first = cache.get("token")
+        first.firstname = "Changed"
+
+        assert cache.get("token").firstname == "Ada"
+
+    def test_copies_nested_fields_too(self):
+        class TaggedUser(UserOutModel):
+            tags: list[str]
+
+        cache = VerifiedTokenCache(4)
+        user = TaggedUser(**admin().model_dump(), tags=["reviewer"])
+        cache.put("token", user, time.time() + 60)
+        user.tags.append("put-side")
+
+        cache.get("token").tags.append("get-side")
+
+        assert cache.get("token").tags == ["reviewer"]
+
+    def test_evicts_entries_at_their_expiry(self):
+        cache = VerifiedTokenCache(4)
+        cache.put("token", admin(), time.time() + 60)
+
+        with patch.object(token_module.time, "time", return_value=time.time() + 61):
+            assert cache.get("token") is None
+        assert "token" not in cache._users
+
+    def test_drops_the_least_recently_used_past_the_size(self):
+        cache = VerifiedTokenCache(2)
+        expires_at = time.time() + 60
+        cache.put("a", admin("a"), expires_at)
+        cache.put("b", admin("b"), expires_at)
+        cache.get("a")
+
+        cache.put("c", admin("c"), expires_at)
+
+        assert cache.get("b") is None
+        assert cache.get("a").user_id == "a" and cache.get("c").user_id == "c"
+
+    def test_keeps_nothing_when_disabled(self):
+        cache = VerifiedTokenCache(0)
+        cache.put("token", admin(), time.time() + 60)
+
+        assert cache.get("token") is None
+
+
+@pytest.mark.asyncio
+class TestAccessTokenDecode:
+    async def test_verifies_a_token_once(self):
+        token = await AccessToken.new(admin())
+
+        with patch.object(token_module, "decode", wraps=token_module.decode) as jwt_decode:
+            first = await AccessToken.decode(token)
+            second = await AccessToken.decode(token)
+
+        assert jwt_decode.call_count == 1
+        assert first == second and first.user_id == "user"
+
+    async def test_expired_tokens_are_checked_again(self):
+        token = await AccessToken.new(admin())
+        await AccessToken.decode(token)
+        expires_at = jwt.decode(token, options={"verify_signature": False})["exp"]
+
+        with patch.object(token_module.time, "time", return_value=expires_at):
+            assert token_module.verified_access_tokens.get(token) is None
+
+    async def test_invalid_tokens_are_not_cached(self):
+        with pytest.raises(InvalidTokenError):
+            await AccessToken.decode("not a token")
+
+        assert not token_module.verified_access_tokens._users